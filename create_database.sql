@@ -55,9 +55,11 @@ CREATE TABLE IF NOT EXISTS `cards` (
   `is_active` BOOLEAN NOT NULL DEFAULT TRUE,
   `registered_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
   `last_used` DATETIME NULL,
+  `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
   PRIMARY KEY (`id`),
   UNIQUE INDEX `idx_card_id` (`card_id`),
-  INDEX `idx_is_active` (`is_active`)
+  INDEX `idx_is_active` (`is_active`),
+  INDEX `idx_updated_at` (`updated_at`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
 -- Tabel system_config: Konfigurasi sistem
@@ -103,6 +105,29 @@ CREATE TABLE IF NOT EXISTS `payments` (
   INDEX `idx_created_at` (`created_at`)
 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
 
+-- Tabel parking_sessions: Sesi parkir GateCoordinator (write-behind dari central hub)
+CREATE TABLE IF NOT EXISTS `parking_sessions` (
+  `id` INT NOT NULL AUTO_INCREMENT,
+  `session_id` VARCHAR(32) NOT NULL,
+  `card_id` VARCHAR(100) NOT NULL,
+  `license_plate` VARCHAR(20) NULL,
+  `vehicle_type` VARCHAR(50) NULL,
+  `zone` VARCHAR(50) NULL,
+  `status` VARCHAR(20) NOT NULL COMMENT 'parked, completed, force_exited',
+  `entry_time` DATETIME NOT NULL,
+  `entry_gate` VARCHAR(50) NULL,
+  `exit_time` DATETIME NULL,
+  `exit_gate` VARCHAR(50) NULL,
+  `payment_amount` FLOAT NULL,
+  `payment_method` VARCHAR(50) NULL,
+  `reason` TEXT NULL,
+  `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
+  PRIMARY KEY (`id`),
+  UNIQUE INDEX `idx_session_id` (`session_id`),
+  INDEX `idx_card_id` (`card_id`),
+  INDEX `idx_status` (`status`)
+) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci;
+
 -- Tabel system_alerts: Alert sistem
 CREATE TABLE IF NOT EXISTS `system_alerts` (
   `id` INT NOT NULL AUTO_INCREMENT,
@@ -1,13 +1,18 @@
-from fastapi import APIRouter, Depends, HTTPException
+from fastapi import APIRouter, Depends, HTTPException, Response
 from sqlalchemy.orm import Session
 from sqlalchemy import func, desc
 from app.database.database import get_db
 from app.database.model import ParkingLog, Vehicle, Card, SystemConfig
 from datetime import datetime, timedelta
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
+from revocation_filter import RevocationFilter
+from occupancy import occupancy_service
 
 router = APIRouter()
 
+# Blob revocation filter terakhir yang dibangun, dipakai ulang selama versi tidak berubah
+_revocation_filter_cache: Dict[str, Any] = {"version": None, "blob": None}
+
 @router.get("/health", tags=["System"])
 async def health_check():
     """
@@ -32,21 +37,26 @@ async def get_system_stats(db: Session = Depends(get_db)):
             ParkingLog.event_type == "ENTRY"
         ).count()
         
-        # Hitung occupancy saat ini (simulasi)
-        current_occupancy = db.query(ParkingLog).filter(
-            ParkingLog.event_type == "ENTRY"
-        ).count() - db.query(ParkingLog).filter(
-            ParkingLog.event_type == "EXIT"
-        ).count()
-        
-        if current_occupancy < 0:
-            current_occupancy = 0
+        if occupancy_service.loaded:
+            # Counter okupansi milik central hub (O(1), tidak menghitung parking_log)
+            current_occupancy = occupancy_service.total
+            capacity = occupancy_service.capacity_total
+        else:
+            # Hitung occupancy saat ini (simulasi)
+            current_occupancy = db.query(ParkingLog).filter(
+                ParkingLog.event_type == "ENTRY"
+            ).count() - db.query(ParkingLog).filter(
+                ParkingLog.event_type == "EXIT"
+            ).count()
             
-        # Ambil kapasitas dari konfigurasi
-        capacity_config = db.query(SystemConfig).filter(
-            SystemConfig.config_key == "max_parking_capacity"
-        ).first()
-        capacity = int(capacity_config.config_value) if capacity_config else 100
+            if current_occupancy < 0:
+                current_occupancy = 0
+                
+            # Ambil kapasitas dari konfigurasi
+            capacity_config = db.query(SystemConfig).filter(
+                SystemConfig.config_key == "max_parking_capacity"
+            ).first()
+            capacity = int(capacity_config.config_value) if capacity_config else 100
         
         return {
             "totalVehicles": total_vehicles,
@@ -180,4 +190,84 @@ async def get_cards(active_only: bool = True, db: Session = Depends(get_db)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"Error getting cards: {str(e)}")
 
+@router.get("/cards/sync", tags=["Cards"])
+async def sync_cards(since: Optional[str] = None, db: Session = Depends(get_db)):
+    """
+    Sinkronisasi index kartu untuk controller.
+    Tanpa `since`: bulk load semua kartu. Dengan `since` (watermark ISO): hanya kartu yang
+    berubah sejak watermark, termasuk kartu yang dinonaktifkan.
+    """
+    try:
+        query = db.query(Card)
+        if since:
+            # >= agar perubahan dengan timestamp yang sama dengan watermark tidak terlewat;
+            # controller menerapkan delta secara idempotent
+            query = query.filter(Card.updated_at >= datetime.fromisoformat(since))
+        
+        cards = query.order_by(Card.updated_at).all()
+        watermark = cards[-1].updated_at.isoformat() if cards else since
+        
+        return {
+            "full": since is None,
+            "watermark": watermark,
+            "cards": [
+                {
+                    "card_id": card.card_id,
+                    "card_type": card.card_type,
+                    "owner_name": card.owner_name,
+                    "is_active": card.is_active
+                }
+                for card in cards
+            ]
+        }
+    except ValueError:
+        raise HTTPException(status_code=400, detail=f"Invalid watermark: {since}")
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error syncing cards: {str(e)}")
+
+@router.get("/cards/revocation-filter", tags=["Cards"])
+async def get_revocation_filter(version: Optional[int] = None, db: Session = Depends(get_db)):
+    """
+    Bloom filter berversi untuk kartu yang dicabut (is_active == False), sebagai satu blob biner.
+    Controller mengirim `version` yang sudah dimiliki; 304 jika tidak ada perubahan.
+    """
+    try:
+        # Versi = updated_at terbaru dari semua kartu (ms), berubah setiap ada kartu yang diubah
+        latest_update = db.query(func.max(Card.updated_at)).scalar()
+        current_version = int(latest_update.timestamp() * 1000) if latest_update else 0
+        
+        if version is not None and version == current_version:
+            return Response(status_code=304, headers={"X-Filter-Version": str(current_version)})
+        
+        if _revocation_filter_cache["version"] != current_version:
+            revoked = db.query(Card.card_id).filter(Card.is_active == False).all()
+            revocation_filter = RevocationFilter.build((row.card_id for row in revoked), version=current_version)
+            _revocation_filter_cache["version"] = current_version
+            _revocation_filter_cache["blob"] = revocation_filter.to_blob()
+        
+        return Response(
+            content=_revocation_filter_cache["blob"],
+            media_type="application/octet-stream",
+            headers={"X-Filter-Version": str(current_version)}
+        )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"Error building revocation filter: {str(e)}")
+
+@router.get("/cards/{card_id}", tags=["Cards"])
+async def get_card(card_id: str, db: Session = Depends(get_db)):
+    """
+    Lookup exact satu kartu (konfirmasi hasil positif revocation filter)
+    """
+    card = db.query(Card).filter(Card.card_id == card_id).first()
+    if not card:
+        raise HTTPException(status_code=404, detail=f"Card not found: {card_id}")
+    
+    return {
+        "card_id": card.card_id,
+        "card_type": card.card_type,
+        "owner_name": card.owner_name,
+        "is_active": card.is_active,
+        "last_used": card.last_used.isoformat() if card.last_used else None
+    }
+
 # Camera endpoints akan dipindahkan ke main.py untuk menghindari circular import 
\ No newline at end of file
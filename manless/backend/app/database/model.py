@@ -43,6 +43,7 @@ class Card(Base):
     is_active = Column(Boolean, default=True, nullable=False, index=True)
     registered_at = Column(DateTime, default=datetime.utcnow, nullable=False)
     last_used = Column(DateTime, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False, index=True)  # Watermark sinkronisasi ke controller
 
 class SystemConfig(Base):
     """Model untuk konfigurasi sistem"""
@@ -54,6 +55,26 @@ class SystemConfig(Base):
     description = Column(Text, nullable=True)
     updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
 
+class ParkingSession(Base):
+    """Model untuk sesi parkir aktif/selesai milik GateCoordinator (write-behind dari memori)"""
+    __tablename__ = "parking_sessions"
+    
+    id = Column(Integer, primary_key=True, index=True, autoincrement=True)
+    session_id = Column(String(32), unique=True, nullable=False, index=True)
+    card_id = Column(String(100), nullable=False, index=True)
+    license_plate = Column(String(20), nullable=True)
+    vehicle_type = Column(String(50), nullable=True)  # car, motorcycle, truck, etc.
+    zone = Column(String(50), nullable=True)
+    status = Column(String(20), nullable=False, index=True)  # parked, completed, force_exited
+    entry_time = Column(DateTime, nullable=False)
+    entry_gate = Column(String(50), nullable=True)
+    exit_time = Column(DateTime, nullable=True)
+    exit_gate = Column(String(50), nullable=True)
+    payment_amount = Column(Float, nullable=True)
+    payment_method = Column(String(50), nullable=True)
+    reason = Column(Text, nullable=True)
+    updated_at = Column(DateTime, default=datetime.utcnow, onupdate=datetime.utcnow, nullable=False)
+
 # Additional models untuk future features
 
 class ParkingSlot(Base):
@@ -9,16 +9,21 @@ Frontend ←→ Backend (Central Hub) ←→ Gate Controllers
                                    └── Gate OUT (port 8002)
 """
 
-from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException
+from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends, Header
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.responses import StreamingResponse
 from pydantic import BaseModel
 import uvicorn
-from app.database.database import engine, Base, init_database
+from sqlalchemy.orm import Session
+from app.database.database import engine, Base, init_database, get_db
+from app.database.model import Card
 from app.api.routes import router
 import sys
 import os
 from gate_coordinator import gate_coordinator
+from broadcaster import STATUS, Broadcaster
+from hub_bus import BusClient, LeaderProxy
+from topics import TopicIndex, MULTI
 import asyncio
 import json
 from datetime import datetime
@@ -38,6 +43,13 @@ class ParkingRequest(BaseModel):
     license_plate: str | None = None
     payment_method: str = "card"
 
+class GateRegistration(BaseModel):
+    gate_id: str
+    url: str
+    type: str  # "entry" atau "exit"
+    lane: str | None = None
+    zone: str | None = None
+
 # Setup logging
 logging.basicConfig(
     level=logging.INFO,
@@ -72,20 +84,57 @@ app.include_router(router)
 # Initialize database
 init_database()
 
-# WebSocket connections store
-active_connections: List[WebSocket] = []
+# WebSocket clients: antrean keluar terbatas + writer per client
+broadcaster = Broadcaster(
+    "hub",
+    max_queue=int(os.getenv("WS_SEND_QUEUE", "256")),
+    send_timeout=float(os.getenv("WS_SEND_TIMEOUT", "5")),
+    # Window coalescing untuk client batch (?batch=1), dibatasi 20-100 ms
+    coalesce_window=min(max(int(os.getenv("WS_COALESCE_WINDOW_MS", "50")), 20), 100) / 1000
+)
+
+# Topic status yang saling menggantikan; dalam satu window hanya yang terbaru dikirim
+COLLAPSIBLE_CAMERA_TOPICS = ("frame", "status_update")
+
+# Bus antar worker (HUB_BUS_PATH, lihat hub_bus.py): broadcast diteruskan ke worker lain dan
+# pemanggilan coordinator dijalankan di worker leader. Tanpa HUB_BUS_PATH: satu proses seperti biasa.
+hub_bus = BusClient(
+    os.getenv("HUB_BUS_PATH", ""),
+    call_timeout=float(os.getenv("HUB_BUS_CALL_TIMEOUT", "30"))
+)
+COORDINATOR_METHODS = (
+    "process_parking_entry", "process_parking_exit", "manual_gate_control", "capture_image",
+    "get_camera_stream_url", "get_system_status", "get_parking_capacity", "force_exit_session",
+    "get_merged_logs", "read_journal", "list_gates", "add_gate", "remove_gate", "push_card_invalidation"
+)
+coordinator = LeaderProxy(hub_bus, gate_coordinator, COORDINATOR_METHODS)
+
+# Subscription topic per client, mis. "gate.*.status", "gate.gate_in.events", "camera.gate_out.thumb".
+# Client tanpa subscription eksplisit menerima semua topic ("#") seperti sebelumnya.
+topic_index = TopicIndex()
+firehose_clients = set()  # Client yang masih memakai subscription default "#"
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """Main WebSocket endpoint untuk frontend"""
     await websocket.accept()
-    active_connections.append(websocket)
-    logger.info("WebSocket client connected to Central Hub")
+    broadcaster.add(websocket)
+    if websocket.query_params.get("batch") in ("1", "true"):
+        broadcaster.set_batching(websocket)  # Client menerima frame berupa array pesan
+    topics = [t for t in websocket.query_params.get("topics", "").split(",") if t]
+    try:
+        subscribe_topics(websocket, topics)
+    except ValueError as e:
+        broadcaster.send(websocket, {"type": "error", "payload": {"message": str(e)}})
+    if not topic_index.patterns(websocket):
+        topic_index.subscribe(websocket, MULTI)
+        firehose_clients.add(websocket)
+    logger.info(f"WebSocket client connected to Central Hub (topics: {topic_index.patterns(websocket)})")
     
     # Send welcome message with system status
     try:
-        system_status = await gate_coordinator.get_system_status()
-        await websocket.send_json({
+        system_status = await coordinator.get_system_status()
+        broadcaster.send(websocket, {
             "type": "system_status",
             "payload": system_status
         })
@@ -102,8 +151,18 @@ async def websocket_endpoint(websocket: WebSocket):
     except Exception as e:
         logger.error(f"WebSocket error: {e}")
     finally:
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+        broadcaster.remove(websocket)
+        topic_index.unsubscribe_all(websocket)
+        firehose_clients.discard(websocket)
+
+def subscribe_topics(websocket: WebSocket, topics: List[str]) -> List[str]:
+    """Tambah subscription; subscription eksplisit pertama menggantikan default "#" """
+    for topic in topics:
+        topic_index.subscribe(websocket, topic)  # ValueError jika pattern tidak valid
+    if topics and websocket in firehose_clients and MULTI not in topics:
+        topic_index.unsubscribe(websocket, MULTI)
+        firehose_clients.discard(websocket)
+    return topic_index.patterns(websocket)
 
 async def handle_websocket_message(message: str, websocket: WebSocket):
     """Handle incoming WebSocket messages dan route ke gate controller yang tepat"""
@@ -114,43 +173,69 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
         
         logger.info(f"Received message: {message_type}")
         
-        if message_type == "parking_entry":
+        if message_type == "subscribe":
+            # {"topics": ["gate.*.status", "gate.gate_in.events"]}
+            try:
+                topics = subscribe_topics(websocket, payload.get("topics", []))
+            except ValueError as e:
+                broadcaster.send(websocket, {"type": "error", "payload": {"message": str(e)}})
+                return
+            broadcaster.send(websocket, {"type": "subscribed", "payload": {"topics": topics}})
+            
+        elif message_type == "unsubscribe":
+            for topic in payload.get("topics", []):
+                topic_index.unsubscribe(websocket, topic)
+                if topic == MULTI:
+                    firehose_clients.discard(websocket)
+            broadcaster.send(websocket, {
+                "type": "subscribed",
+                "payload": {"topics": topic_index.patterns(websocket)}
+            })
+            
+        elif message_type == "batch":
+            # {"enabled": true} -> pesan dikirim per window sebagai array JSON
+            enabled = broadcaster.set_batching(websocket, bool(payload.get("enabled", True)))
+            broadcaster.send(websocket, {"type": "batch", "payload": {"enabled": enabled}})
+            
+        elif message_type == "parking_entry":
             # Route to Gate IN controller
-            result = await gate_coordinator.process_parking_entry(payload)
-            await websocket.send_json({
+            result = await coordinator.process_parking_entry(payload)
+            broadcaster.send(websocket, {
                 "type": "parking_entry_result",
                 "payload": result
             })
             
-            # Broadcast to all connected clients
-            await broadcast_to_all({
-                "type": "parking_event",
-                "payload": {
-                    "event": "entry",
-                    "gate": "gate_in",
-                    "result": result,
-                    "timestamp": datetime.now().isoformat()
-                }
-            })
+            # Broadcast to all connected clients (retry idempotent tidak disiarkan ulang)
+            if not result.get("idempotent_replay"):
+                await broadcast_to_all({
+                    "type": "parking_event",
+                    "payload": {
+                        "event": "entry",
+                        "gate": result.get("gate"),
+                        "result": result,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                })
             
         elif message_type == "parking_exit":
             # Route to Gate OUT controller
-            result = await gate_coordinator.process_parking_exit(payload)
-            await websocket.send_json({
+            result = await coordinator.process_parking_exit(payload)
+            broadcaster.send(websocket, {
                 "type": "parking_exit_result",
                 "payload": result
             })
             
-            # Broadcast to all connected clients
-            await broadcast_to_all({
-                "type": "parking_event",
-                "payload": {
-                    "event": "exit",
-                    "gate": "gate_out",
-                    "result": result,
-                    "timestamp": datetime.now().isoformat()
-                }
-            })
+            # Broadcast to all connected clients (retry idempotent tidak disiarkan ulang)
+            if not result.get("idempotent_replay"):
+                await broadcast_to_all({
+                    "type": "parking_event",
+                    "payload": {
+                        "event": "exit",
+                        "gate": result.get("gate"),
+                        "result": result,
+                        "timestamp": datetime.now().isoformat()
+                    }
+                })
             
         elif message_type == "gate_control":
             # Manual gate control
@@ -158,8 +243,8 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
             action = payload.get("action", "open")
             duration = payload.get("duration", 10)
             
-            result = await gate_coordinator.manual_gate_control(gate_id, action, duration)
-            await websocket.send_json({
+            result = await coordinator.manual_gate_control(gate_id, action, duration)
+            broadcaster.send(websocket, {
                 "type": "gate_control_result",
                 "payload": result
             })
@@ -170,14 +255,14 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
             command = payload.get("command")
             
             if command == "capture_image":
-                result = await gate_coordinator.capture_image(gate_id)
-                await websocket.send_json({
+                result = await coordinator.capture_image(gate_id)
+                broadcaster.send(websocket, {
                     "type": "image_captured",
                     "payload": result
                 })
             elif command == "get_stream_url":
-                stream_url = await gate_coordinator.get_camera_stream_url(gate_id)
-                await websocket.send_json({
+                stream_url = await coordinator.get_camera_stream_url(gate_id)
+                broadcaster.send(websocket, {
                     "type": "camera_stream_url",
                     "payload": {
                         "gate_id": gate_id,
@@ -187,16 +272,16 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
             
         elif message_type == "request_system_status":
             # Get comprehensive system status
-            status = await gate_coordinator.get_system_status()
-            await websocket.send_json({
+            status = await coordinator.get_system_status()
+            broadcaster.send(websocket, {
                 "type": "system_status",
                 "payload": status
             })
             
         elif message_type == "request_parking_capacity":
             # Get parking capacity info
-            capacity = await gate_coordinator.get_parking_capacity()
-            await websocket.send_json({
+            capacity = await coordinator.get_parking_capacity()
+            broadcaster.send(websocket, {
                 "type": "parking_capacity",
                 "payload": capacity
             })
@@ -206,8 +291,8 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
             card_id = payload.get("card_id")
             reason = payload.get("reason", "manual")
             
-            result = await gate_coordinator.force_exit_session(card_id, reason)
-            await websocket.send_json({
+            result = await coordinator.force_exit_session(card_id, reason)
+            broadcaster.send(websocket, {
                 "type": "force_exit_result",
                 "payload": result
             })
@@ -227,11 +312,16 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
             gate_id = payload.get("gate_id")  # None = all gates
             limit = payload.get("limit", 50)
             
-            logs = await gate_coordinator.get_gate_logs(gate_id, limit)
-            await websocket.send_json({
+            result = await coordinator.get_merged_logs(
+                gate_id, limit,
+                cursor=payload.get("cursor"),
+                event_type=payload.get("event_type"),
+                card_id=payload.get("card_id")
+            )
+            broadcaster.send(websocket, {
                 "type": "system_logs",
                 "payload": {
-                    "logs": logs,
+                    **result,
                     "gate_id": gate_id,
                     "limit": limit
                 }
@@ -239,7 +329,7 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
             
         else:
             logger.warning(f"Unknown message type: {message_type}")
-            await websocket.send_json({
+            broadcaster.send(websocket, {
                 "type": "error",
                 "payload": {
                     "message": f"Unknown message type: {message_type}",
@@ -249,7 +339,7 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
             
     except Exception as e:
         logger.error(f"Error handling WebSocket message: {e}")
-        await websocket.send_json({
+        broadcaster.send(websocket, {
             "type": "error",
             "payload": {
                 "message": f"Error processing message: {str(e)}",
@@ -257,30 +347,60 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
             }
         })
 
-async def broadcast_to_all(message: dict):
-    """Broadcast message to all connected WebSocket clients"""
-    if not active_connections:
-        return
-    
-    disconnected_connections = []
+def topic_for(message: dict) -> str:
+    """Topic publish untuk pesan broadcast hub"""
+    message_type = message.get("type")
+    payload = message.get("payload") or {}
     
-    for connection in active_connections:
-        try:
-            await connection.send_json(message)
-        except Exception as e:
-            logger.error(f"Error broadcasting to connection: {e}")
-            disconnected_connections.append(connection)
-    
-    # Remove disconnected connections
-    for connection in disconnected_connections:
-        active_connections.remove(connection)
+    if message_type == "parking_event":
+        return f"gate.{payload.get('gate') or 'unknown'}.events"
+    if message_type == "gate_status_changed":
+        return f"gate.{payload.get('gate')}.status"
+    if message_type == "gate_event":
+        # Event yang di-push gate controller: status hardware, kamera, atau event gate
+        gate_id = message.get("gate")
+        event_type = payload.get("type") or ""
+        if event_type.startswith("camera_"):
+            return f"camera.{gate_id}.{event_type[len('camera_'):]}"
+        if event_type in ("hardware_status", "gate_status"):
+            return f"gate.{gate_id}.status"
+        return f"gate.{gate_id}.events"
+    if message_type == "emergency_event":
+        return "system.emergency"
+    return f"system.{message_type}"
+
+async def broadcast_to_all(message: dict, topic: str = None):
+    """Publish message ke client yang subscribe topic-nya (antre per client, tidak menunggu pengiriman)
+
+    Client di worker lain menerimanya lewat hub bus.
+    """
+    topic = topic or topic_for(message)
+    segments = topic.split(".")
+    if segments[-1] == "status" or (segments[0] == "camera" and segments[-1] in COLLAPSIBLE_CAMERA_TOPICS):
+        # Status per topic: boleh dibuang saat antrean penuh dan diciutkan dalam satu window
+        message_class = STATUS
+        key = f"{topic}:{message.get('type')}:{(message.get('payload') or {}).get('type', '')}"
+    else:
+        message_class, key = broadcaster.classify(message), None
+    if hub_bus.connected:
+        data = broadcaster.encode(message)  # Sekali untuk client lokal dan worker lain
+        hub_bus.publish(topic, data, message_class, key)
+    else:
+        data = message
+    broadcaster.broadcast(data, message_class, targets=topic_index.match(topic), key=key)
+
+def on_bus_publish(frame: dict):
+    """Broadcast dari worker lain: kirim ke client lokal yang subscribe topic-nya"""
+    broadcaster.broadcast(frame["data"], frame.get("class"), targets=topic_index.match(frame["topic"]),
+                          key=frame.get("key"))
 
 # Central Hub API endpoints
 @app.get("/api/status")
-async def get_system_status():
-    """Get comprehensive system status"""
+async def get_system_status(refresh: bool = False):
+    """Get comprehensive system status (status gate dari cache; refresh=true untuk data live)"""
     try:
-        status = await gate_coordinator.get_system_status()
+        status = await coordinator.get_system_status(refresh)
+        status["websocket"] = {**broadcaster.get_status(), "topics": topic_index.get_status(), "bus": hub_bus.get_status()}
         return status
     except Exception as e:
         logger.error(f"Error getting system status: {e}")
@@ -290,28 +410,31 @@ async def get_system_status():
 async def get_parking_capacity():
     """Get parking capacity information"""
     try:
-        capacity = await gate_coordinator.get_parking_capacity()
+        capacity = await coordinator.get_parking_capacity()
         return capacity
     except Exception as e:
         logger.error(f"Error getting parking capacity: {e}")
         raise HTTPException(status_code=500, detail=f"Capacity error: {str(e)}")
 
 @app.post("/api/parking/entry")
-async def parking_entry(payload: dict):
-    """Process parking entry"""
+async def parking_entry(payload: dict, idempotency_key: str | None = Header(default=None)):
+    """Process parking entry (header Idempotency-Key: retry mendapat hasil pertama)"""
     try:
-        result = await gate_coordinator.process_parking_entry(payload)
+        if idempotency_key:
+            payload.setdefault("idempotency_key", idempotency_key)
+        result = await coordinator.process_parking_entry(payload)
         
-        # Broadcast event
-        await broadcast_to_all({
-            "type": "parking_event",
-            "payload": {
-                "event": "entry",
-                "gate": "gate_in",
-                "result": result,
-                "timestamp": datetime.now().isoformat()
-            }
-        })
+        # Broadcast event (retry idempotent tidak disiarkan ulang)
+        if not result.get("idempotent_replay"):
+            await broadcast_to_all({
+                "type": "parking_event",
+                "payload": {
+                    "event": "entry",
+                    "gate": result.get("gate"),
+                    "result": result,
+                    "timestamp": datetime.now().isoformat()
+                }
+            })
         
         return result
     except Exception as e:
@@ -319,21 +442,24 @@ async def parking_entry(payload: dict):
         raise HTTPException(status_code=500, detail=f"Entry error: {str(e)}")
 
 @app.post("/api/parking/exit")
-async def parking_exit(payload: dict):
-    """Process parking exit"""
+async def parking_exit(payload: dict, idempotency_key: str | None = Header(default=None)):
+    """Process parking exit (header Idempotency-Key: retry mendapat hasil pertama)"""
     try:
-        result = await gate_coordinator.process_parking_exit(payload)
+        if idempotency_key:
+            payload.setdefault("idempotency_key", idempotency_key)
+        result = await coordinator.process_parking_exit(payload)
         
-        # Broadcast event
-        await broadcast_to_all({
-            "type": "parking_event",
-            "payload": {
-                "event": "exit",
-                "gate": "gate_out",
-                "result": result,
-                "timestamp": datetime.now().isoformat()
-            }
-        })
+        # Broadcast event (retry idempotent tidak disiarkan ulang)
+        if not result.get("idempotent_replay"):
+            await broadcast_to_all({
+                "type": "parking_event",
+                "payload": {
+                    "event": "exit",
+                    "gate": result.get("gate"),
+                    "result": result,
+                    "timestamp": datetime.now().isoformat()
+                }
+            })
         
         return result
     except Exception as e:
@@ -347,7 +473,7 @@ async def gate_control(gate_id: str, payload: dict):
         action = payload.get("action", "open")
         duration = payload.get("duration", 10)
         
-        result = await gate_coordinator.manual_gate_control(gate_id, action, duration)
+        result = await coordinator.manual_gate_control(gate_id, action, duration)
         return result
     except Exception as e:
         logger.error(f"Error controlling gate {gate_id}: {e}")
@@ -357,7 +483,7 @@ async def gate_control(gate_id: str, payload: dict):
 async def get_camera_stream_url(gate_id: str):
     """Get camera stream URL for specific gate"""
     try:
-        stream_url = await gate_coordinator.get_camera_stream_url(gate_id)
+        stream_url = await coordinator.get_camera_stream_url(gate_id)
         if stream_url is not None:
             return {"stream_url": stream_url, "gate_id": gate_id}
         else:
@@ -370,22 +496,37 @@ async def get_camera_stream_url(gate_id: str):
 async def capture_image(gate_id: str):
     """Capture image from specific gate camera"""
     try:
-        result = await gate_coordinator.capture_image(gate_id)
+        result = await coordinator.capture_image(gate_id)
         return result
     except Exception as e:
         logger.error(f"Error capturing image from {gate_id}: {e}")
         raise HTTPException(status_code=500, detail=f"Capture error: {str(e)}")
 
 @app.get("/api/logs")
-async def get_logs(gate_id: str = None, limit: int = 50):
-    """Get system logs"""
+async def get_logs(gate_id: str = None, limit: int = 50, cursor: str = None,
+                   event_type: str = None, card_id: str = None):
+    """Get system logs (gabungan semua gate; kirim next_cursor untuk halaman berikutnya)"""
     try:
-        logs = await gate_coordinator.get_gate_logs(gate_id, limit)
-        return {"logs": logs, "gate_id": gate_id, "limit": limit}
+        result = await coordinator.get_merged_logs(gate_id, limit, cursor, event_type, card_id)
+        return {**result, "gate_id": gate_id, "limit": limit}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
     except Exception as e:
         logger.error(f"Error getting logs: {e}")
         raise HTTPException(status_code=500, detail=f"Logs error: {str(e)}")
 
+@app.get("/api/journal")
+async def read_journal(from_seq: int = None, to_seq: int = None, since: str = None, until: str = None,
+                       event_type: str = None, limit: int = 1000):
+    """Range read event journal berdasarkan seq atau waktu (lanjutkan dengan from_seq=next_seq)"""
+    try:
+        return await coordinator.read_journal(from_seq, to_seq, since, until, event_type, limit)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error reading journal: {e}")
+        raise HTTPException(status_code=500, detail=f"Journal error: {str(e)}")
+
 @app.post("/api/emergency/force-exit")
 async def force_exit_session(payload: dict):
     """Force exit parking session (emergency)"""
@@ -396,7 +537,7 @@ async def force_exit_session(payload: dict):
         if not card_id:
             raise HTTPException(status_code=400, detail="Card ID is required")
         
-        result = await gate_coordinator.force_exit_session(card_id, reason)
+        result = await coordinator.force_exit_session(card_id, reason)
         
         # Broadcast emergency event
         await broadcast_to_all({
@@ -413,18 +554,126 @@ async def force_exit_session(payload: dict):
         logger.error(f"Error force exit session: {e}")
         raise HTTPException(status_code=500, detail=f"Force exit error: {str(e)}")
 
+@app.get("/api/gates")
+async def list_gates():
+    """Daftar gate controller yang terdaftar beserta health-nya"""
+    return await coordinator.list_gates()
+
+@app.post("/api/gates")
+async def register_gate(request: GateRegistration):
+    """Tambah/update gate controller saat runtime"""
+    try:
+        gate_info = await coordinator.add_gate(request.gate_id, request.url, request.type, request.lane, request.zone)
+        return {"status": "registered", "gate_id": request.gate_id, "gate": gate_info}
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    except Exception as e:
+        logger.error(f"Error registering gate {request.gate_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Gate registry error: {str(e)}")
+
+@app.delete("/api/gates/{gate_id}")
+async def unregister_gate(gate_id: str):
+    """Hapus gate controller saat runtime"""
+    gate_info = await coordinator.remove_gate(gate_id)
+    if gate_info is None:
+        raise HTTPException(status_code=404, detail=f"Gate not found: {gate_id}")
+    return {"status": "removed", "gate_id": gate_id}
+
+@app.post("/api/cards/{card_id}/revoke")
+async def revoke_card(card_id: str, db: Session = Depends(get_db)):
+    """Nonaktifkan kartu dan push invalidasi ke card cache di setiap gate"""
+    try:
+        card = db.query(Card).filter(Card.card_id == card_id).first()
+        if not card:
+            raise HTTPException(status_code=404, detail=f"Card not found: {card_id}")
+        
+        card.is_active = False
+        db.commit()
+        
+        # Delta sync juga akan membawa perubahan ini; push membuatnya berlaku seketika
+        delivered = await coordinator.push_card_invalidation([card_id])
+        
+        return {
+            "status": "revoked",
+            "card_id": card_id,
+            "pushed_to": delivered,
+            "timestamp": datetime.now().isoformat()
+        }
+    except HTTPException:
+        raise
+    except Exception as e:
+        db.rollback()
+        logger.error(f"Error revoking card {card_id}: {e}")
+        raise HTTPException(status_code=500, detail=f"Revoke error: {str(e)}")
+
+def on_gate_status_change(event: dict):
+    """Push perubahan status gate (online/offline/timeout) ke semua client"""
+    asyncio.create_task(broadcast_to_all({
+        "type": "gate_status_changed",
+        "payload": event
+    }))
+
+def on_gate_event(gate_id: str, message: dict):
+    """Teruskan event yang di-push gate controller lewat link persisten ke semua client"""
+    asyncio.create_task(broadcast_to_all({
+        "type": "gate_event",
+        "gate": gate_id,
+        "payload": message
+    }))
+    gate = gate_coordinator.gate_controllers.get(gate_id, {})
+    if message.get("type") == "card_detected" and gate.get("type") == "entry":
+        asyncio.create_task(process_card_tap(gate_id, message.get("payload") or {}))
+
+async def process_card_tap(gate_id: str, event: dict):
+    """Tap kartu di entry gate: entry lewat GateCoordinator (sesi, okupansi, lock per kartu)"""
+    card_id = event.get("card_id")
+    if not card_id:
+        return
+    try:
+        result = await gate_coordinator.process_parking_entry({
+            "card_id": card_id,
+            "gate_id": gate_id,
+            # Event yang sama terkirim ulang (reconnect link) tidak memproses entry dua kali
+            "idempotency_key": f"tap:{event.get('timestamp')}"
+        })
+    except Exception as e:
+        logger.error(f"Error processing card tap {card_id} at {gate_id}: {e}")
+        return
+    if not result.get("idempotent_replay"):
+        await broadcast_to_all({
+            "type": "parking_event",
+            "payload": {
+                "event": "entry",
+                "gate": result.get("gate") or gate_id,
+                "source": "card_tap",
+                "result": result,
+                "timestamp": datetime.now().isoformat()
+            }
+        })
+
+async def on_leadership(is_leader: bool):
+    """Worker leader memiliki GateCoordinator; worker lain meneruskan pemanggilan ke leader"""
+    try:
+        if is_leader:
+            await gate_coordinator.initialize()
+            logger.info("Gate Coordinator initialized successfully")
+            logger.info("Central Hub ready to coordinate gate controllers")
+        else:
+            await gate_coordinator.cleanup()
+            logger.info("Coordinator leadership moved to another worker")
+    except Exception as e:
+        logger.error(f"Failed to {'initialize' if is_leader else 'clean up'} Gate Coordinator: {e}")
+
 @app.on_event("startup")
 async def startup_event():
-    """Initialize gate coordinator on startup"""
+    """Initialize gate coordinator on startup (di worker leader)"""
     logger.info("Starting Parking System Central Hub...")
     
-    try:
-        await gate_coordinator.initialize()
-        logger.info("Gate Coordinator initialized successfully")
-        logger.info("Central Hub ready to coordinate gate controllers")
-        
-    except Exception as e:
-        logger.error(f"Failed to initialize Gate Coordinator: {e}")
+    gate_coordinator.add_status_listener(on_gate_status_change)
+    gate_coordinator.add_event_listener(on_gate_event)
+    hub_bus.on_publish = on_bus_publish
+    hub_bus.on_leadership = on_leadership
+    await hub_bus.start()
 
 @app.on_event("shutdown")
 async def shutdown_event():
@@ -432,8 +681,10 @@ async def shutdown_event():
     logger.info("Shutting down Central Hub...")
     
     try:
-        await gate_coordinator.cleanup()
-        logger.info("Gate Coordinator cleaned up successfully")
+        if hub_bus.is_leader:
+            await gate_coordinator.cleanup()
+            logger.info("Gate Coordinator cleaned up successfully")
+        await hub_bus.stop()
         
     except Exception as e:
         logger.error(f"Error during cleanup: {e}")
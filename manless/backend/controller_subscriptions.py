@@ -0,0 +1,219 @@
+"""
+Controller Subscriptions - Sistem Parkir Manless
+Satu koneksi WebSocket yang diawasi per gate controller terdaftar, dengan routing per tipe pesan.
+
+- Setiap gate punya satu task supervisor: connect, baca pesan (async for, tanpa polling), dan
+  reconnect dengan exponential backoff + full jitter agar banyak backend tidak reconnect serentak
+- Pesan di-dispatch lewat tabel routing tipe -> handler(subscription, message); tipe yang tidak
+  terdaftar ke handler "*" jika ada
+- Statistik per link: pesan per detik (jendela 10 detik), jumlah reconnect, dan lag
+  (waktu terima dikurangi timestamp pesan dari controller)
+"""
+
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, Optional
+
+import websockets
+
+logger = logging.getLogger(__name__)
+
+ANY = "*"
+
+Handler = Callable[["ControllerSubscription", dict], Awaitable[None]]
+
+class RateMeter:
+    """Jumlah kejadian per detik dalam jendela geser (bucket per detik)"""
+
+    def __init__(self, window: int = 10):
+        self.window = window
+        self._buckets: deque = deque()  # (detik, jumlah)
+
+    def add(self, now: float = None):
+        second = int(now or time.monotonic())
+        if self._buckets and self._buckets[-1][0] == second:
+            self._buckets[-1][1] += 1
+        else:
+            self._buckets.append([second, 1])
+        self._trim(second)
+
+    def _trim(self, second: int):
+        while self._buckets and self._buckets[0][0] <= second - self.window:
+            self._buckets.popleft()
+
+    def rate(self) -> float:
+        self._trim(int(time.monotonic()))
+        return round(sum(count for _, count in self._buckets) / self.window, 2)
+
+def message_timestamp(message: dict) -> Optional[datetime]:
+    """Timestamp pesan controller (top-level atau di payload), None jika tidak ada/tidak valid"""
+    payload = message.get("payload") if isinstance(message.get("payload"), dict) else {}
+    value = message.get("timestamp") or payload.get("timestamp")
+    if not isinstance(value, str):
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        return None
+
+class ControllerSubscription:
+    """Satu link WebSocket ke gate controller beserta statistiknya"""
+
+    def __init__(self, manager: "ControllerSubscriptionManager", gate_id: str, ws_url: str):
+        self.manager = manager
+        self.gate_id = gate_id
+        self.ws_url = ws_url
+        self.websocket = None
+        self.task: Optional[asyncio.Task] = None
+        self.connected_since: Optional[str] = None
+        self.last_message_at: Optional[float] = None
+        self.last_error: Optional[str] = None
+        self.rate = RateMeter()
+        self.lag_ms: Optional[float] = None
+        self.max_lag_ms = 0.0
+        self.stats = {"messages": 0, "unrouted": 0, "handler_errors": 0, "reconnects": 0, "connects": 0}
+
+    @property
+    def connected(self) -> bool:
+        return self.websocket is not None
+
+    async def send(self, message: dict) -> bool:
+        """Kirim pesan ke controller; False jika link sedang putus"""
+        if self.websocket is None:
+            return False
+        try:
+            await self.websocket.send(json.dumps(message))
+            return True
+        except websockets.exceptions.ConnectionClosed:
+            return False
+
+    async def run(self):
+        """Supervisor: connect, baca, reconnect dengan backoff sampai dibatalkan"""
+        attempt = 0
+        while True:
+            try:
+                async with websockets.connect(self.ws_url, open_timeout=self.manager.connect_timeout) as websocket:
+                    self.websocket = websocket
+                    self.connected_since = datetime.now().isoformat()
+                    self.last_error = None
+                    self.stats["connects"] += 1
+                    logger.info(f"✅ Subscribed to controller {self.gate_id} at {self.ws_url}")
+                    await self.manager._notify(self.manager.on_connect, self)
+                    async for data in websocket:
+                        attempt = 0  # Link sehat: backoff mulai dari awal lagi
+                        await self._dispatch(data)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                self.last_error = str(e) or type(e).__name__
+            finally:
+                if self.websocket is not None:
+                    self.websocket = None
+                    self.connected_since = None
+                    await self.manager._notify(self.manager.on_disconnect, self)
+
+            attempt += 1
+            self.stats["reconnects"] += 1
+            delay = random.uniform(0, min(self.manager.backoff_max, self.manager.backoff_base * 2 ** attempt))
+            # Hanya kegagalan pertama yang warning; gate yang mati lama tidak membanjiri log
+            log = logger.warning if attempt == 1 else logger.debug
+            log(f"Controller {self.gate_id} link down ({self.last_error or 'closed'}); reconnecting in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _dispatch(self, data):
+        try:
+            message = json.loads(data)
+        except ValueError:
+            self.stats["handler_errors"] += 1
+            return
+        if not isinstance(message, dict):
+            return
+        self.stats["messages"] += 1
+        self.rate.add()
+        self.last_message_at = time.monotonic()
+        sent_at = message_timestamp(message)
+        if sent_at is not None:
+            self.lag_ms = round((datetime.now(sent_at.tzinfo) - sent_at).total_seconds() * 1000, 1)
+            self.max_lag_ms = max(self.max_lag_ms, self.lag_ms)
+
+        handler = self.manager.routes.get(message.get("type")) or self.manager.routes.get(ANY)
+        if handler is None:
+            self.stats["unrouted"] += 1
+            return
+        try:
+            await handler(self, message)
+        except Exception as e:
+            self.stats["handler_errors"] += 1
+            logger.error(f"Error handling {message.get('type')} from {self.gate_id}: {e}")
+
+    def get_status(self) -> dict:
+        idle = None if self.last_message_at is None else round(time.monotonic() - self.last_message_at, 1)
+        return {
+            "gate_id": self.gate_id,
+            "url": self.ws_url,
+            "connected": self.connected,
+            "connected_since": self.connected_since,
+            "messages_per_sec": self.rate.rate(),
+            "lag_ms": self.lag_ms,
+            "max_lag_ms": self.max_lag_ms,
+            "idle_sec": idle,
+            "last_error": self.last_error,
+            **self.stats
+        }
+
+class ControllerSubscriptionManager:
+    """Link ke semua gate controller terdaftar dengan satu tabel routing"""
+
+    def __init__(self, backoff_base: float = 0.5, backoff_max: float = 30.0, connect_timeout: float = 5.0):
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.connect_timeout = connect_timeout
+        self.routes: Dict[str, Handler] = {}
+        self.subscriptions: Dict[str, ControllerSubscription] = {}
+        self.on_connect: Optional[Callable[[ControllerSubscription], Awaitable[None]]] = None
+        self.on_disconnect: Optional[Callable[[ControllerSubscription], Awaitable[None]]] = None
+
+    def route(self, message_type: str, handler: Handler):
+        """Daftarkan handler untuk satu tipe pesan ("*" = semua tipe lain)"""
+        self.routes[message_type] = handler
+
+    def register(self, gate_id: str, ws_url: str) -> ControllerSubscription:
+        """Mulai link ke gate (link lama dengan gate_id sama diganti)"""
+        self.unregister(gate_id)
+        subscription = ControllerSubscription(self, gate_id, ws_url)
+        subscription.task = asyncio.create_task(subscription.run())
+        self.subscriptions[gate_id] = subscription
+        return subscription
+
+    def unregister(self, gate_id: str):
+        subscription = self.subscriptions.pop(gate_id, None)
+        if subscription and subscription.task:
+            subscription.task.cancel()
+
+    async def stop(self):
+        tasks = [subscription.task for subscription in self.subscriptions.values() if subscription.task]
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+        self.subscriptions = {}
+
+    async def _notify(self, callback, subscription: ControllerSubscription):
+        if callback is None:
+            return
+        try:
+            await callback(subscription)
+        except Exception as e:
+            logger.error(f"Error in controller link callback for {subscription.gate_id}: {e}")
+
+    def get_status(self) -> dict:
+        return {
+            "links": len(self.subscriptions),
+            "connected": sum(1 for subscription in self.subscriptions.values() if subscription.connected),
+            "routes": sorted(self.routes),
+            "gates": {gate_id: subscription.get_status() for gate_id, subscription in self.subscriptions.items()}
+        }
@@ -0,0 +1,372 @@
+"""
+Event Journal - Sistem Parkir Manless
+Journal append-only untuk perubahan state hub (sesi dibuka/ditutup, perintah gate).
+
+Format di disk (JOURNAL_DIR):
+- journal-<first_seq>.log    : segmen JSON lines {"seq", "ts", "type", "data"}, dirotasi per ukuran
+- snapshot-<seq>.json        : state lengkap pada seq tertentu (ditulis atomik: tmp + rename)
+
+append() hanya menambah ke buffer in-memory (hot path tanpa I/O); writer menulis buffer
+dalam satu batch dengan satu fsync setiap fsync_interval (group commit).
+Restart: muat snapshot terakhir lalu replay entri setelah seq snapshot.
+Range read berdasarkan seq atau waktu memakai index segmen (first/last seq dan timestamp).
+"""
+
+import asyncio
+import bisect
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+SEGMENT_PREFIX = "journal-"
+SNAPSHOT_PREFIX = "snapshot-"
+
+class EventJournal:
+    """Journal event berbasis segmen dengan batched fsync, snapshot, dan replay"""
+
+    def __init__(self, directory: str, segment_max_bytes: int = 16 * 1024 * 1024,
+                 fsync_interval: float = 0.05, snapshots_keep: int = 2, max_segments: int = 0):
+        self.directory = directory
+        self.segment_max_bytes = segment_max_bytes
+        self.fsync_interval = fsync_interval
+        self.snapshots_keep = snapshots_keep
+        self.max_segments = max_segments  # 0 = simpan semua segmen
+
+        self.enabled = False
+        self.last_seq = 0        # Seq terakhir yang diberikan append()
+        self.durable_seq = 0     # Seq terakhir yang sudah di-fsync
+        self.snapshot_seq = 0    # Seq snapshot terakhir
+
+        self._segments: List[dict] = []  # Urut naik: path, first_seq, last_seq, first_ts, last_ts, size
+        self._file = None
+        self._pending: List[dict] = []
+        self._pending_event = asyncio.Event()
+        self._io_lock = asyncio.Lock()  # Flush dan range read tidak berjalan bersamaan
+        self._writer_task: Optional[asyncio.Task] = None
+        self.stats = {"appended": 0, "batches": 0, "fsyncs": 0, "write_failures": 0,
+                      "snapshots": 0, "truncated_bytes": 0}
+
+    async def start(self):
+        """Buka journal (scan segmen, pulihkan ekor yang terpotong) lalu jalankan writer"""
+        try:
+            await asyncio.to_thread(self._open)
+            self.enabled = True
+        except Exception as e:
+            logger.error(f"Event journal disabled, cannot open {self.directory}: {e}")
+            return
+        self._writer_task = asyncio.create_task(self._writer_loop())
+        logger.info(f"Event journal opened at seq {self.last_seq} ({len(self._segments)} segment(s))")
+
+    async def stop(self):
+        """Hentikan writer, tulis sisa buffer, dan tutup segmen aktif"""
+        if self._writer_task:
+            self._writer_task.cancel()
+            self._writer_task = None
+        if self.enabled:
+            await self.flush()
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    # ========================================
+    # APPEND (hot path) DAN WRITER
+    # ========================================
+
+    def append(self, event_type: str, data: dict) -> Optional[dict]:
+        """Tambah event ke journal; durable setelah flush berikutnya"""
+        if not self.enabled:
+            return None
+        self.last_seq += 1
+        entry = {"seq": self.last_seq, "ts": time.time(), "type": event_type, "data": data}
+        self._pending.append(entry)
+        self._pending_event.set()
+        self.stats["appended"] += 1
+        return entry
+
+    async def _writer_loop(self):
+        """Kumpulkan event selama fsync_interval lalu tulis dengan satu fsync"""
+        while True:
+            await self._pending_event.wait()
+            await asyncio.sleep(self.fsync_interval)
+            if not await self.flush():
+                await asyncio.sleep(1.0)
+
+    async def flush(self) -> bool:
+        """Tulis dan fsync semua event di buffer; gagal = event dikembalikan ke buffer"""
+        async with self._io_lock:
+            if not self._pending:
+                self._pending_event.clear()
+                return True
+            batch, self._pending = self._pending, []
+            self._pending_event.clear()
+            try:
+                await asyncio.to_thread(self._write_batch, batch)
+            except Exception as e:
+                self.stats["write_failures"] += 1
+                logger.error(f"Failed to write {len(batch)} journal event(s): {e}")
+                self._pending[:0] = batch
+                self._pending_event.set()
+                return False
+            self.durable_seq = batch[-1]["seq"]
+            self.stats["batches"] += 1
+            return True
+
+    def _write_batch(self, batch: List[dict]):
+        """Tulis batch ke segmen aktif (rotasi jika penuh) lalu fsync (dijalankan di thread)"""
+        data = "".join(json.dumps(entry, separators=(",", ":"), default=str) + "\n" for entry in batch)
+        data = data.encode("utf-8")
+
+        segment = self._segments[-1] if self._segments else None
+        if segment is None or (segment["size"] > 0 and segment["size"] + len(data) > self.segment_max_bytes):
+            segment = self._new_segment(batch[0]["seq"])
+
+        self._file.write(data)
+        self._file.flush()
+        os.fsync(self._file.fileno())
+        self.stats["fsyncs"] += 1
+
+        if segment["first_ts"] is None:
+            segment["first_ts"] = batch[0]["ts"]
+        segment["last_seq"] = batch[-1]["seq"]
+        segment["last_ts"] = batch[-1]["ts"]
+        segment["size"] += len(data)
+
+    def _new_segment(self, first_seq: int) -> dict:
+        if self._file:
+            self._file.close()
+        path = os.path.join(self.directory, f"{SEGMENT_PREFIX}{first_seq:020d}.log")
+        self._file = open(path, "ab")
+        segment = {"path": path, "first_seq": first_seq, "last_seq": first_seq - 1,
+                   "first_ts": None, "last_ts": None, "size": 0}
+        self._segments.append(segment)
+        self._fsync_directory()
+        self._prune_segments()
+        return segment
+
+    def _prune_segments(self):
+        """Hapus segmen tertua di atas max_segments, tapi tidak pernah yang masih diperlukan untuk replay"""
+        if not self.max_segments:
+            return
+        while len(self._segments) > self.max_segments and self._segments[0]["last_seq"] <= self.snapshot_seq:
+            os.remove(self._segments.pop(0)["path"])
+
+    def _fsync_directory(self):
+        try:
+            fd = os.open(self.directory, os.O_RDONLY)
+        except OSError:
+            return  # Tidak didukung di semua platform
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+    # ========================================
+    # RECOVERY
+    # ========================================
+
+    def _open(self):
+        """Scan segmen yang ada dan bangun index (dijalankan di thread)"""
+        os.makedirs(self.directory, exist_ok=True)
+        paths = sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SEGMENT_PREFIX) and name.endswith(".log")
+        )
+        self._segments = []
+        for index, name in enumerate(paths):
+            path = os.path.join(self.directory, name)
+            first_seq = int(name[len(SEGMENT_PREFIX):-len(".log")])
+            if index == len(paths) - 1:
+                segment = self._recover_tail(path, first_seq)
+            else:
+                segment = self._index_segment(path, first_seq)
+            if segment:
+                self._segments.append(segment)
+
+        if self._segments:
+            self.last_seq = self.durable_seq = self._segments[-1]["last_seq"]
+            self._file = open(self._segments[-1]["path"], "ab")
+        self.snapshot_seq = self._latest_snapshot_seq()
+
+    def _index_segment(self, path: str, first_seq: int) -> dict:
+        """Index segmen tertutup hanya dari baris pertama dan terakhir"""
+        size = os.path.getsize(path)
+        with open(path, "rb") as segment_file:
+            first = _parse(segment_file.readline())
+            segment_file.seek(max(0, size - 64 * 1024))
+            lines = segment_file.read().splitlines()
+        last = next((entry for entry in map(_parse, reversed(lines)) if entry), None)
+        return {"path": path, "first_seq": first_seq,
+                "last_seq": last["seq"] if last else first_seq - 1,
+                "first_ts": first["ts"] if first else None, "last_ts": last["ts"] if last else None,
+                "size": size}
+
+    def _recover_tail(self, path: str, first_seq: int) -> Optional[dict]:
+        """Baca segmen terakhir penuh dan potong baris yang tidak lengkap (crash saat menulis)"""
+        valid_size, first, last = 0, None, None
+        with open(path, "rb") as segment_file:
+            for line in segment_file:
+                entry = _parse(line)
+                if entry is None or not line.endswith(b"\n"):
+                    break
+                first = first or entry
+                last = entry
+                valid_size += len(line)
+
+        size = os.path.getsize(path)
+        if valid_size < size:
+            logger.warning(f"Journal segment {path}: truncating {size - valid_size} byte(s) of torn tail")
+            with open(path, "r+b") as segment_file:
+                segment_file.truncate(valid_size)
+                os.fsync(segment_file.fileno())
+            self.stats["truncated_bytes"] += size - valid_size
+
+        return {"path": path, "first_seq": first_seq,
+                "last_seq": last["seq"] if last else first_seq - 1,
+                "first_ts": first["ts"] if first else None, "last_ts": last["ts"] if last else None,
+                "size": valid_size}
+
+    # ========================================
+    # SNAPSHOT
+    # ========================================
+
+    async def snapshot(self, state: dict) -> Optional[int]:
+        """Simpan state pada last_seq saat ini; state harus diambil tepat sebelum pemanggilan"""
+        if not self.enabled:
+            return None
+        seq = self.last_seq
+        if not await self.flush():
+            return None  # Snapshot tidak boleh mendahului event yang belum durable
+        try:
+            await asyncio.to_thread(self._write_snapshot, seq, state)
+        except Exception as e:
+            logger.error(f"Failed to write journal snapshot at seq {seq}: {e}")
+            return None
+        self.snapshot_seq = seq
+        self.stats["snapshots"] += 1
+        return seq
+
+    def _write_snapshot(self, seq: int, state: dict):
+        path = os.path.join(self.directory, f"{SNAPSHOT_PREFIX}{seq:020d}.json")
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as snapshot_file:
+            json.dump({"seq": seq, "ts": time.time(), "state": state}, snapshot_file, default=str)
+            snapshot_file.flush()
+            os.fsync(snapshot_file.fileno())
+        os.replace(tmp_path, path)
+        self._fsync_directory()
+
+        for old in self._snapshot_files()[:-self.snapshots_keep]:
+            os.remove(os.path.join(self.directory, old))
+
+    def _snapshot_files(self) -> List[str]:
+        return sorted(
+            name for name in os.listdir(self.directory)
+            if name.startswith(SNAPSHOT_PREFIX) and name.endswith(".json")
+        )
+
+    def _latest_snapshot_seq(self) -> int:
+        files = self._snapshot_files()
+        return int(files[-1][len(SNAPSHOT_PREFIX):-len(".json")]) if files else 0
+
+    def load_snapshot(self) -> Tuple[int, Optional[dict]]:
+        """Snapshot valid terbaru sebagai (seq, state), atau (0, None) (blocking)"""
+        if not self.enabled:
+            return 0, None
+        for name in reversed(self._snapshot_files()):
+            try:
+                with open(os.path.join(self.directory, name), encoding="utf-8") as snapshot_file:
+                    snapshot = json.load(snapshot_file)
+                return snapshot["seq"], snapshot["state"]
+            except Exception as e:
+                logger.warning(f"Skipping unreadable journal snapshot {name}: {e}")
+        return 0, None
+
+    # ========================================
+    # RANGE READ DAN REPLAY
+    # ========================================
+
+    def replay(self, after_seq: int = 0) -> List[dict]:
+        """Semua event durable setelah after_seq, urut naik (blocking; dipakai saat startup)"""
+        return self._read_segments(from_seq=after_seq + 1)
+
+    async def read(self, from_seq: int = None, to_seq: int = None, since: float = None,
+                   until: float = None, event_type: str = None, limit: int = 1000) -> dict:
+        """Event dalam rentang seq dan/atau waktu (epoch detik), urut naik"""
+        if not self.enabled:
+            return {"events": [], "next_seq": None, "last_seq": self.last_seq}
+        async with self._io_lock:
+            pending = list(self._pending)  # Belum di disk, tapi sudah punya seq
+            events = await asyncio.to_thread(
+                self._read_segments, from_seq, to_seq, since, until, event_type, limit + 1
+            )
+        for entry in pending:
+            if len(events) > limit:
+                break
+            if _matches(entry, from_seq, to_seq, since, until, event_type):
+                events.append(entry)
+
+        next_seq = events[limit]["seq"] if len(events) > limit else None
+        return {"events": events[:limit], "next_seq": next_seq, "last_seq": self.last_seq}
+
+    def _read_segments(self, from_seq: int = None, to_seq: int = None, since: float = None,
+                       until: float = None, event_type: str = None, limit: int = None) -> List[dict]:
+        segments = self._segments_for(from_seq, to_seq, since, until)
+        events: List[dict] = []
+        for segment in segments:
+            with open(segment["path"], "rb") as segment_file:
+                for line in segment_file:
+                    entry = _parse(line)
+                    if entry is None:
+                        continue
+                    if to_seq is not None and entry["seq"] > to_seq:
+                        return events
+                    if _matches(entry, from_seq, to_seq, since, until, event_type):
+                        events.append(entry)
+                        if limit is not None and len(events) >= limit:
+                            return events
+        return events
+
+    def _segments_for(self, from_seq, to_seq, since, until) -> List[dict]:
+        """Pilih segmen yang mungkin berisi rentang (bisect atas first_seq)"""
+        segments = self._segments
+        if from_seq is not None:
+            start = max(0, bisect.bisect_right([s["first_seq"] for s in segments], from_seq) - 1)
+            segments = segments[start:]
+        return [
+            s for s in segments
+            if s["last_seq"] >= s["first_seq"]
+            and (to_seq is None or s["first_seq"] <= to_seq)
+            and (since is None or s["last_ts"] >= since)
+            and (until is None or s["first_ts"] <= until)
+        ]
+
+    def get_status(self) -> dict:
+        """Status journal untuk API/status"""
+        return {
+            "enabled": self.enabled,
+            "last_seq": self.last_seq,
+            "durable_seq": self.durable_seq,
+            "snapshot_seq": self.snapshot_seq,
+            "pending": len(self._pending),
+            "segments": len(self._segments),
+            **self.stats
+        }
+
+def _parse(line: bytes) -> Optional[dict]:
+    try:
+        return json.loads(line)
+    except ValueError:
+        return None
+
+def _matches(entry: dict, from_seq, to_seq, since, until, event_type) -> bool:
+    return (
+        (from_seq is None or entry["seq"] >= from_seq)
+        and (to_seq is None or entry["seq"] <= to_seq)
+        and (since is None or entry["ts"] >= since)
+        and (until is None or entry["ts"] <= until)
+        and (event_type is None or entry["type"] == event_type)
+    )
@@ -4,160 +4,522 @@ Gate Coordinator - Central Hub untuk Multiple Gate Controllers
 Sistem Parkir Manless
 
 Arsitektur:
-Frontend ←→ Backend (Central Hub) ←→ Gate Controllers
+Frontend ←→ Backend (Central Hub) ←→ Gate Controllers (GateRegistry, N lane entry/exit)
                                    ├── Gate IN (port 8001)
                                    └── Gate OUT (port 8002)
 """
 
 import asyncio
-import aiohttp
 import logging
+import os
+import time
 from datetime import datetime
 from typing import Dict, Optional, List
 import json
+import random
+from urllib.parse import urlencode
+
+from event_journal import EventJournal
+from gate_health import CircuitBreaker, LatencyWindow
+from gate_http import gate_http
+from gate_link import GateLink, GateLinkUnavailable
+from gate_registry import GateRegistry
+from log_merge import decode_cursor, encode_cursor, merge_gate_logs
+from occupancy import occupancy_service
+from request_guard import IdempotencyCache, KeyedLocks
+from session_store import SessionStore
 
 logger = logging.getLogger(__name__)
 
+# Fan-out ke gate: request per gate berjalan paralel dengan batas waktu total (budget).
+# Pool HTTP, timeout per endpoint dan batas request per gate ada di gate_http.py.
+GATE_FANOUT_BUDGET = float(os.getenv("GATE_FANOUT_BUDGET", "3"))         # Batas waktu total satu fan-out (detik)
+GATE_FANOUT_CONCURRENCY = int(os.getenv("GATE_FANOUT_CONCURRENCY", "16")) # Maksimal request fan-out bersamaan
+
+# Cache status gate: dilayani langsung, di-refresh di background (stale-while-revalidate)
+STATUS_POLL_INTERVAL = float(os.getenv("STATUS_POLL_INTERVAL", "5"))    # Interval poller background (detik)
+STATUS_CACHE_TTL = float(os.getenv("STATUS_CACHE_TTL", "2"))            # Umur maksimal sebelum revalidate (detik)
+STATUS_CACHE_MAX_STALE = float(os.getenv("STATUS_CACHE_MAX_STALE", "30")) # Lebih tua dari ini: tunggu refresh (detik)
+
+# Health scheduler dan circuit breaker per gate
+GATE_HEALTH_INTERVAL = float(os.getenv("GATE_HEALTH_INTERVAL", "10"))   # Interval health check (detik)
+GATE_HEALTH_JITTER = float(os.getenv("GATE_HEALTH_JITTER", "0.2"))      # Jitter +/- (fraksi dari interval)
+GATE_PING_TIMEOUT = float(os.getenv("GATE_PING_TIMEOUT", "2"))
+GATE_BREAKER_FAILURES = int(os.getenv("GATE_BREAKER_FAILURES", "3"))    # Gagal berturut-turut sebelum breaker open
+GATE_BREAKER_RESET = float(os.getenv("GATE_BREAKER_RESET", "15"))       # Waktu open sebelum half-open probe (detik)
+
+# Idempotency key: retry dengan key yang sama mendapat hasil pertama
+IDEMPOTENCY_TTL = float(os.getenv("IDEMPOTENCY_TTL", "300"))
+IDEMPOTENCY_MAX_KEYS = int(os.getenv("IDEMPOTENCY_MAX_KEYS", "10000"))
+IDEMPOTENT_STATUSES = ("approved", "denied")  # Hasil gate yang di-cache per idempotency key
+
+# Event journal append-only (sesi dibuka/ditutup, perintah gate) dengan snapshot berkala
+JOURNAL_DIR = os.getenv("JOURNAL_DIR", "data/journal")
+JOURNAL_SEGMENT_BYTES = int(os.getenv("JOURNAL_SEGMENT_BYTES", str(16 * 1024 * 1024)))
+JOURNAL_FSYNC_INTERVAL = float(os.getenv("JOURNAL_FSYNC_INTERVAL", "0.05"))      # Jendela group commit (detik)
+JOURNAL_MAX_SEGMENTS = int(os.getenv("JOURNAL_MAX_SEGMENTS", "0"))               # 0 = simpan semua segmen
+JOURNAL_SNAPSHOT_INTERVAL = float(os.getenv("JOURNAL_SNAPSHOT_INTERVAL", "300"))  # Snapshot paling lambat (detik)
+JOURNAL_SNAPSHOT_EVENTS = int(os.getenv("JOURNAL_SNAPSHOT_EVENTS", "1000"))       # ...atau setelah N event
+
+# Link WebSocket persisten ke setiap gate (HTTP tetap dipakai sebagai fallback)
+GATE_LINKS_ENABLED = os.getenv("GATE_LINKS_ENABLED", "true").lower() == "true"
+
 class GateCoordinator:
     """Coordinator untuk mengelola multiple gate controllers"""
     
     def __init__(self):
-        self.gate_controllers = {
-            "gate_in": {
-                "url": "http://localhost:8001",
-                "type": "entry",
-                "status": "unknown",
-                "last_ping": None
-            },
-            "gate_out": {
-                "url": "http://localhost:8002", 
-                "type": "exit",
-                "status": "unknown",
-                "last_ping": None
-            }
-        }
+        self.registry = GateRegistry()  # Default gate_in/gate_out sampai load() di initialize()
+        self.http = gate_http  # Connection pool per gate, dipakai bersama ControllerClient
+        self._round_robin: Dict[str, int] = {}
         
-        self.active_sessions = {}  # Track kendaraan yang sedang parkir
-        self.session = None
+        self.active_sessions = SessionStore()  # Track kendaraan yang sedang parkir (persisten)
+        self.occupancy = occupancy_service  # Counter okupansi per jenis kendaraan/zona
+        self.card_locks = KeyedLocks()  # Entry/exit/force exit untuk satu kartu tidak pernah berjalan bersamaan
+        self.idempotency = IdempotencyCache(IDEMPOTENCY_TTL, IDEMPOTENCY_MAX_KEYS)
+        self.journal = EventJournal(JOURNAL_DIR, JOURNAL_SEGMENT_BYTES, JOURNAL_FSYNC_INTERVAL,
+                                    max_segments=JOURNAL_MAX_SEGMENTS)
+        self._snapshot_task: Optional[asyncio.Task] = None
+        
+        self.fanout_budget = GATE_FANOUT_BUDGET
+        self._fanout_semaphore = asyncio.Semaphore(GATE_FANOUT_CONCURRENCY)
+        
+        # Cache status gate (singleflight: paling banyak satu refresh berjalan)
+        self._gate_status_cache: Optional[dict] = None
+        self._gate_status_cached_at: Optional[float] = None
+        self._gate_status_refreshed_at: Optional[str] = None
+        self._status_refresh: Optional[asyncio.Task] = None
+        self._status_poller: Optional[asyncio.Task] = None
+        self.status_cache_stats = {"hits": 0, "stale_hits": 0, "misses": 0, "refreshes": 0, "coalesced": 0}
+        
+        # Health per gate: circuit breaker, latency, dan listener perubahan status
+        self.breakers: Dict[str, CircuitBreaker] = {}
+        self.latency: Dict[str, LatencyWindow] = {}
+        self._status_listeners: List = []
+        self._health_task: Optional[asyncio.Task] = None
+        
+        # Link persisten per gate dan listener event yang di-push gate
+        self.links: Dict[str, GateLink] = {}
+        self._event_listeners: List = []
+        self.link_stats = {"link_requests": 0, "http_requests": 0, "http_fallbacks": 0}
         
     async def initialize(self):
         """Initialize gate coordinator"""
-        self.session = aiohttp.ClientSession()
+        # Muat daftar gate dari env/file/database
+        await asyncio.to_thread(self.registry.load)
+        for gate_id in self.gate_controllers:
+            self._start_link(gate_id)
+        
+        # Pulihkan sesi parkir: snapshot + replay journal, atau dari database jika journal kosong
+        await self.journal.start()
+        restored = await self._restore_from_journal()
+        await self.active_sessions.initialize(load=not restored)
+        if not restored:
+            await self.snapshot_state()  # Basis replay untuk restart berikutnya
+        await self.occupancy.start(self.active_sessions.snapshot(), flush=self.active_sessions.flush,
+                                   pending=self.active_sessions.pending_writes)
         
         # Health check semua gate controllers
         await self.health_check_all_gates()
         
+        # Health scheduler dan poller background untuk cache status gate
+        self._health_task = asyncio.create_task(self._health_loop())
+        self._status_poller = asyncio.create_task(self._status_poll_loop())
+        self._snapshot_task = asyncio.create_task(self._snapshot_loop())
+        
         logger.info("Gate Coordinator initialized")
         
     async def cleanup(self):
         """Cleanup resources"""
-        if self.session:
-            await self.session.close()
+        for task in (self._health_task, self._status_poller, self._status_refresh, self._snapshot_task):
+            if task:
+                task.cancel()
+        for link in self.links.values():
+            await link.stop()
+        self.links = {}
+        await self.http.close()
+        await self.occupancy.stop()
+        await self.snapshot_state()
+        await self.journal.stop()
+        await self.active_sessions.shutdown()
         logger.info("Gate Coordinator cleaned up")
     
-    async def health_check_all_gates(self):
-        """Check status semua gate controllers"""
-        for gate_id, gate_info in self.gate_controllers.items():
+    @property
+    def gate_controllers(self) -> Dict[str, dict]:
+        """gate_id -> info gate (dari registry)"""
+        return self.registry.gates
+    
+    async def add_gate(self, gate_id: str, url: str, gate_type: str, lane: str = None, zone: str = None,
+                       persist: bool = True) -> dict:
+        """Tambah/update gate saat runtime lalu langsung cek health-nya"""
+        await self._drop_gate_state(gate_id)
+        gate_info = self.registry.add(gate_id, url, gate_type, lane, zone)
+        self._start_link(gate_id)
+        if persist:
+            await asyncio.to_thread(self.registry.save)
+        if self._gate_status_cache is not None:
+            self._gate_status_cache[gate_id] = {**gate_info, "controller_status": None,
+                                                "fetch_status": "pending", "latency_ms": None}
+        self.invalidate_status_cache()
+        await self.ping_gate(gate_id)
+        logger.info(f"Gate {gate_id} registered ({gate_type}, lane {lane}) at {url}")
+        return gate_info
+    
+    async def remove_gate(self, gate_id: str, persist: bool = True) -> Optional[dict]:
+        """Hapus gate saat runtime beserta connection pool dan state health-nya"""
+        gate_info = self.registry.remove(gate_id)
+        if gate_info is None:
+            return None
+        await self._drop_gate_state(gate_id)
+        if persist:
+            await asyncio.to_thread(self.registry.save)
+        if self._gate_status_cache is not None:
+            self._gate_status_cache.pop(gate_id, None)
+        logger.info(f"Gate {gate_id} removed from registry")
+        return gate_info
+    
+    async def _drop_gate_state(self, gate_id: str):
+        link = self.links.pop(gate_id, None)
+        if link:
+            await link.stop()
+        self.breakers.pop(gate_id, None)
+        self.latency.pop(gate_id, None)
+        await self.http.close_gate(gate_id)
+    
+    def _start_link(self, gate_id: str):
+        """Buka link persisten ke gate (reconnect otomatis di background)"""
+        if not GATE_LINKS_ENABLED or gate_id in self.links:
+            return
+        link = GateLink(gate_id, self.gate_controllers[gate_id]["url"])
+        link.add_event_listener(self._on_gate_event)
+        link.start(self.http.session(gate_id))
+        self.links[gate_id] = link
+    
+    def add_event_listener(self, listener):
+        """Daftarkan callback(gate_id, message) untuk event yang di-push gate lewat link"""
+        self._event_listeners.append(listener)
+    
+    def _on_gate_event(self, gate_id: str, message: dict):
+        for listener in self._event_listeners:
             try:
-                status = await self.ping_gate(gate_id)
-                self.gate_controllers[gate_id]["status"] = "online" if status else "offline"
-                self.gate_controllers[gate_id]["last_ping"] = datetime.now().isoformat()
-                
-                logger.info(f"Gate {gate_id}: {self.gate_controllers[gate_id]['status']}")
-                
+                listener(gate_id, message)
             except Exception as e:
-                logger.error(f"Health check failed for {gate_id}: {e}")
-                self.gate_controllers[gate_id]["status"] = "offline"
+                logger.error(f"Error in gate event listener: {e}")
+    
+    def route_gate(self, gate_type: str, payload: dict) -> Optional[str]:
+        """Pilih gate untuk request: gate_id eksplisit, lalu lane, lalu round-robin gate yang sehat"""
+        requested = payload.get("gate_id")
+        if requested in self.gate_controllers and self.gate_controllers[requested]["type"] == gate_type:
+            return requested
+        
+        candidates = self.registry.of_type(gate_type, payload.get("lane")) or self.registry.of_type(gate_type)
+        if not candidates:
+            return None
+        
+        # Lewati gate yang breaker-nya open; jika semua open, tetap pilih (akan gagal cepat)
+        healthy = [gid for gid in candidates if self._breaker(gid).state != CircuitBreaker.OPEN] or candidates
+        index = self._round_robin.get(gate_type, 0)
+        self._round_robin[gate_type] = index + 1
+        return healthy[index % len(healthy)]
+    
+    def add_status_listener(self, listener):
+        """Daftarkan callback(event) yang dipanggil saat status gate berubah"""
+        self._status_listeners.append(listener)
+    
+    def _breaker(self, gate_id: str) -> CircuitBreaker:
+        if gate_id not in self.breakers:
+            self.breakers[gate_id] = CircuitBreaker(GATE_BREAKER_FAILURES, GATE_BREAKER_RESET)
+        return self.breakers[gate_id]
+    
+    def _latency(self, gate_id: str) -> LatencyWindow:
+        if gate_id not in self.latency:
+            self.latency[gate_id] = LatencyWindow()
+        return self.latency[gate_id]
+    
+    def _set_gate_status(self, gate_id: str, status: str):
+        """Update status gate dan push ke listener jika berubah"""
+        gate_info = self.gate_controllers.get(gate_id)
+        if gate_info is None or gate_info["status"] == status:
+            return
+        
+        event = {
+            "gate": gate_id,
+            "from": gate_info["status"],
+            "to": status,
+            "circuit": self._breaker(gate_id).state,
+            "timestamp": datetime.now().isoformat()
+        }
+        gate_info["status"] = status
+        logger.info(f"Gate {gate_id}: {event['from']} -> {status}")
+        
+        for listener in self._status_listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Error in gate status listener: {e}")
+    
+    def _record_result(self, gate_id: str, ok: bool, elapsed: float, status: str):
+        """Catat hasil request ke breaker, latency dan status gate"""
+        breaker = self._breaker(gate_id)
+        if ok:
+            breaker.record_success()
+            self._latency(gate_id).add(elapsed)
+        else:
+            breaker.record_failure()
+        self._set_gate_status(gate_id, status)
+    
+    async def _health_loop(self):
+        """Health check periodik dengan jitter agar probe ke banyak gate tidak serentak"""
+        while True:
+            jitter = random.uniform(-GATE_HEALTH_JITTER, GATE_HEALTH_JITTER) * GATE_HEALTH_INTERVAL
+            await asyncio.sleep(max(0.1, GATE_HEALTH_INTERVAL + jitter))
+            try:
+                await self.health_check_all_gates()
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Health scheduler error: {e}")
+    
+    async def health_check_all_gates(self):
+        """Check status semua gate controllers (paralel)"""
+        gate_ids = list(self.gate_controllers.keys())
+        results = await asyncio.gather(*[self.ping_gate(gate_id) for gate_id in gate_ids], return_exceptions=True)
+        
+        for gate_id, result in zip(gate_ids, results):
+            if isinstance(result, Exception):
+                logger.error(f"Health check failed for {gate_id}: {result}")
     
     async def ping_gate(self, gate_id: str) -> bool:
-        """Ping specific gate controller"""
+        """Ping specific gate controller (melewati circuit breaker; berfungsi sebagai probe half-open)"""
+        breaker = self._breaker(gate_id)
+        if not breaker.allow_request():
+            return False
+        
+        start = time.perf_counter()
         try:
-            gate_url = self.gate_controllers[gate_id]["url"]
+            status, _ = await self._request_gate(gate_id, "/api/status", {}, GATE_PING_TIMEOUT, method="GET")
+            ok = status == 200
             
-            async with self.session.get(
-                f"{gate_url}/api/status",
-                timeout=aiohttp.ClientTimeout(total=5)
-            ) as response:
-                return response.status == 200
-                
         except Exception as e:
             logger.warning(f"Ping failed for {gate_id}: {e}")
-            return False
+            ok = False
+        
+        if gate_id in self.gate_controllers:
+            self.gate_controllers[gate_id]["last_ping"] = datetime.now().isoformat()
+        self._record_result(gate_id, ok, time.perf_counter() - start, "online" if ok else "offline")
+        return ok
     
-    async def send_to_gate(self, gate_id: str, endpoint: str, data: dict) -> dict:
+    async def list_gates(self) -> dict:
+        """Daftar gate dari registry beserta health-nya"""
+        return {
+            "source": self.registry.source,
+            "gates": self.gate_controllers,
+            "health": self.get_gate_health()
+        }
+    
+    def get_gate_health(self) -> dict:
+        """Health per gate: status, circuit breaker dan persentil latency"""
+        return {
+            gate_id: {
+                "status": gate_info["status"],
+                "last_ping": gate_info["last_ping"],
+                "circuit": self._breaker(gate_id).get_status(),
+                "link": self.links[gate_id].get_status() if gate_id in self.links else None,
+                "latency": self._latency(gate_id).percentiles()
+            }
+            for gate_id, gate_info in self.gate_controllers.items()
+        }
+    
+    async def send_to_gate(self, gate_id: str, endpoint: str, data: dict, timeout: float = None,
+                           method: str = "POST") -> dict:
         """Send request to specific gate controller"""
         if gate_id not in self.gate_controllers:
             return {"error": f"Unknown gate: {gate_id}"}
             
-        gate_url = self.gate_controllers[gate_id]["url"]
+        # Gate yang diketahui mati: gagal seketika tanpa menunggu timeout
+        if not self._breaker(gate_id).allow_request():
+            return {"error": f"Gate {gate_id} unavailable (circuit open)", "circuit": "open"}
+        
+        start = time.perf_counter()
         
         try:
-            async with self.session.post(
-                f"{gate_url}{endpoint}",
-                json=data,
-                timeout=aiohttp.ClientTimeout(total=10)
-            ) as response:
+            status, result = await self._request_gate(gate_id, endpoint, data, timeout, method)
+            
+            if status == 200:
+                self._record_result(gate_id, True, time.perf_counter() - start, "online")
+                return result
+            else:
+                logger.error(f"Gate {gate_id} returned status {status}")
+                # 4xx = gate hidup tapi menolak request; hanya 5xx dihitung gagal
+                alive = status < 500
+                self._record_result(gate_id, alive, time.perf_counter() - start, "online" if alive else "error")
+                return {"error": f"Gate {gate_id} error: {status}"}
                 
-                if response.status == 200:
-                    result = await response.json()
-                    self.gate_controllers[gate_id]["status"] = "online"
-                    return result
-                else:
-                    logger.error(f"Gate {gate_id} returned status {response.status}")
-                    return {"error": f"Gate {gate_id} error: {response.status}"}
-                    
         except asyncio.TimeoutError:
             logger.error(f"Timeout sending to gate {gate_id}")
-            self.gate_controllers[gate_id]["status"] = "timeout"
+            self._record_result(gate_id, False, time.perf_counter() - start, "timeout")
             return {"error": f"Gate {gate_id} timeout"}
             
+        except asyncio.CancelledError:
+            # Dibatalkan oleh deadline fan-out: dihitung gagal agar probe half-open tidak menggantung
+            self._record_result(gate_id, False, time.perf_counter() - start, "timeout")
+            raise
+            
         except Exception as e:
             logger.error(f"Error sending to gate {gate_id}: {e}")
-            self.gate_controllers[gate_id]["status"] = "error"
+            self._record_result(gate_id, False, time.perf_counter() - start, "error")
             return {"error": f"Gate {gate_id} error: {str(e)}"}
     
-    async def process_parking_entry(self, payload: dict) -> dict:
-        """Process parking entry via Gate IN"""
-        card_id = payload.get("card_id")
+    async def _request_gate(self, gate_id: str, endpoint: str, data: dict, timeout: float = None,
+                            method: str = "POST") -> tuple:
+        """Kirim request lewat link persisten jika terhubung, selain itu lewat HTTP; hasil (status, body)
+
+        timeout None = timeout per endpoint dari gate_http.
+        """
+        timeout = timeout or self.http.timeout_for(endpoint)
+        link = self.links.get(gate_id)
+        if link is not None and link.connected:
+            try:
+                frame = await link.request(endpoint, data, timeout)
+                self.link_stats["link_requests"] += 1
+                return frame["status"], frame.get("payload")
+            except GateLinkUnavailable:
+                # Request belum terkirim lewat link: aman diulang lewat HTTP
+                self.link_stats["http_fallbacks"] += 1
+        
+        self.link_stats["http_requests"] += 1
+        return await self.http.request(
+            gate_id,
+            method,
+            f"{self.gate_controllers[gate_id]['url']}{endpoint}",
+            endpoint,
+            json=data if method == "POST" else None,
+            timeout=timeout
+        )
+    
+    async def fan_out(self, gate_ids: List[str], endpoint: str, data: dict, budget: float = None) -> Dict[str, dict]:
+        """Kirim request yang sama ke beberapa gate secara paralel dalam satu deadline budget
+        
+        Gate yang belum menjawab saat budget habis dibatalkan dan dilaporkan "timeout";
+        hasil gate lain tetap dikembalikan (partial result) beserta latency per gate.
+        """
+        budget = budget or self.fanout_budget
+        
+        async def call(gate_id: str) -> dict:
+            async with self._fanout_semaphore:
+                start = time.perf_counter()
+                result = await self.send_to_gate(gate_id, endpoint, data, timeout=budget)
+                return {
+                    "status": "error" if "error" in result else "ok",
+                    "latency_ms": round((time.perf_counter() - start) * 1000, 1),
+                    "result": result
+                }
+        
+        tasks = {gate_id: asyncio.create_task(call(gate_id)) for gate_id in gate_ids}
+        if tasks:
+            await asyncio.wait(tasks.values(), timeout=budget)
+        
+        results = {}
+        for gate_id, task in tasks.items():
+            if task.done():
+                results[gate_id] = task.result()
+                continue
+            
+            # Budget habis: batalkan request yang masih berjalan
+            task.cancel()
+            results[gate_id] = {
+                "status": "timeout",
+                "latency_ms": round(budget * 1000, 1),
+                "result": {"error": f"Gate {gate_id} no response within {budget}s budget"}
+            }
         
+        slow = [gid for gid, r in results.items() if r["status"] != "ok"]
+        if slow:
+            logger.warning(f"Fan-out {endpoint}: no valid response from {slow}")
+        return results
+    
+    async def _guarded(self, action: str, payload: dict, handler) -> dict:
+        """Jalankan handler di bawah lock per kartu, dengan cache hasil per idempotency key"""
+        card_id = payload.get("card_id")
         if not card_id:
             return {"error": "Card ID is required"}
         
+        key = payload.get("idempotency_key")
+        cache_key = f"{action}:{card_id}:{key}" if key else None
+        
+        async with self.card_locks.lock(card_id):
+            if cache_key:
+                cached = self.idempotency.get(cache_key)
+                if cached is not None:
+                    logger.info(f"Idempotent replay of {action} for {card_id} (key {key})")
+                    return {**cached, "idempotent_replay": True}
+            
+            result = await handler(payload)
+            
+            # Hanya keputusan final dari gate yang di-cache; error/timeout/circuit open boleh di-retry
+            if cache_key and "error" not in result and result.get("status") in IDEMPOTENT_STATUSES:
+                self.idempotency.put(cache_key, result)
+            return result
+    
+    async def process_parking_entry(self, payload: dict) -> dict:
+        """Process parking entry via Gate IN"""
+        return await self._guarded("entry", payload, self._process_parking_entry)
+    
+    async def _process_parking_entry(self, payload: dict) -> dict:
+        card_id = payload.get("card_id")
+        
         # Check if card is already in active session
         if card_id in self.active_sessions:
             return {
                 "error": "Card already has active parking session",
-                "session": self.active_sessions[card_id]
+                "session": self.active_sessions.get(card_id)
+            }
+        
+        # Route ke salah satu entry gate (gate_id/lane dari payload, atau round-robin)
+        gate_id = self.route_gate("entry", payload)
+        if gate_id is None:
+            return {"error": "No entry gate registered"}
+        
+        # Parkir penuh (total, jenis kendaraan, atau zona gate): tolak sebelum palang dibuka
+        zone = payload.get("zone") or self.gate_controllers[gate_id].get("zone")
+        vehicle_type = payload.get("vehicle_type") or await self.occupancy.vehicle_type_for(card_id)
+        if self.occupancy.is_full(vehicle_type, zone):
+            return {
+                "error": "Parking full",
+                "status": "full",
+                "gate": gate_id,
+                "capacity": self.occupancy.snapshot()
             }
         
-        # Send to Gate IN controller
-        result = await self.send_to_gate("gate_in", "/api/parking/entry", payload)
+        result = await self.send_to_gate(gate_id, "/api/parking/entry", payload)
+        result["gate"] = gate_id  # Semua hasil (juga ditolak/error) diberi label gate untuk event per gate
         
         if result.get("status") == "approved":
             # Create active session
-            self.active_sessions[card_id] = {
-                "card_id": card_id,
+            session = self.active_sessions.open(card_id, {
                 "entry_time": datetime.now().isoformat(),
-                "entry_gate": "gate_in",
+                "entry_gate": gate_id,
                 "license_plate": payload.get("license_plate"),
+                "vehicle_type": result.get("vehicle_type") or vehicle_type,
+                "zone": zone,
                 "status": "parked"
-            }
+            })
+            self.occupancy.on_open(session)
+            self.journal.append("session_opened", {"session": session})
             
             logger.info(f"Parking entry approved for {card_id}")
             
             # Add session info to result
-            result["session"] = self.active_sessions[card_id]
-            result["gate"] = "gate_in"
+            result["session"] = session
             
         return result
     
     async def process_parking_exit(self, payload: dict) -> dict:
         """Process parking exit via Gate OUT"""
+        return await self._guarded("exit", payload, self._process_parking_exit)
+    
+    async def _process_parking_exit(self, payload: dict) -> dict:
         card_id = payload.get("card_id")
         
-        if not card_id:
-            return {"error": "Card ID is required"}
-        
         # Check if card has active session
         if card_id not in self.active_sessions:
             return {
@@ -165,32 +527,34 @@ class GateCoordinator:
                 "card_id": card_id
             }
         
-        session = self.active_sessions[card_id]
+        session = self.active_sessions.get(card_id)
         
         # Add session info to payload
         payload["session"] = session
         
-        # Send to Gate OUT controller
-        result = await self.send_to_gate("gate_out", "/api/parking/exit", payload)
+        # Route ke salah satu exit gate
+        gate_id = self.route_gate("exit", payload)
+        if gate_id is None:
+            return {"error": "No exit gate registered"}
+        result = await self.send_to_gate(gate_id, "/api/parking/exit", payload)
+        result["gate"] = gate_id  # Semua hasil (juga ditolak/error) diberi label gate untuk event per gate
         
         if result.get("status") == "approved":
-            # Update session with exit info
-            session.update({
+            # Update session with exit info and remove from active sessions
+            completed_session = self.active_sessions.close(card_id, {
                 "exit_time": datetime.now().isoformat(),
-                "exit_gate": "gate_out",
+                "exit_gate": gate_id,
                 "payment_amount": result.get("payment_amount", 0),
                 "payment_method": payload.get("payment_method", "card"),
                 "status": "completed"
             })
-            
-            # Remove from active sessions
-            completed_session = self.active_sessions.pop(card_id)
+            self.occupancy.on_close(completed_session)
+            self.journal.append("session_closed", {"session": completed_session})
             
             logger.info(f"Parking exit approved for {card_id}")
             
             # Add session info to result
             result["session"] = completed_session
-            result["gate"] = "gate_out"
             
         return result
     
@@ -203,6 +567,8 @@ class GateCoordinator:
         
         result = await self.send_to_gate(gate_id, "/api/gate/control", payload)
         result["gate"] = gate_id
+        self.invalidate_status_cache()
+        self.journal.append("gate_command", {"gate": gate_id, **payload, "ok": "error" not in result})
         
         return result
     
@@ -221,59 +587,121 @@ class GateCoordinator:
         
         return result
     
-    async def get_system_status(self) -> dict:
-        """Get comprehensive system status"""
-        status = {
+    async def get_system_status(self, refresh: bool = False) -> dict:
+        """Get comprehensive system status
+        
+        Status gate diambil dari cache (dengan umur cache); sesi aktif selalu live dari memori.
+        refresh=True memaksa menunggu data gate terbaru.
+        """
+        gates = await self.get_gate_statuses(refresh)
+        age = time.monotonic() - self._gate_status_cached_at
+        
+        return {
             "coordinator": {
                 "status": "online",
                 "timestamp": datetime.now().isoformat(),
                 "active_sessions": len(self.active_sessions)
             },
-            "gates": {},
-            "active_sessions": self.active_sessions
+            "gates": gates,
+            "health": self.get_gate_health(),
+            "transport": {**self.link_stats, "http": self.http.get_status()},
+            "idempotency": {**self.idempotency.get_status(), "cards_in_flight": len(self.card_locks),
+                            "contended": self.card_locks.contended},
+            "gates_cache": {
+                "refreshed_at": self._gate_status_refreshed_at,
+                "age_ms": round(age * 1000, 1),
+                "stale": age > STATUS_CACHE_TTL,
+                "stats": dict(self.status_cache_stats)
+            },
+            "active_sessions": self.active_sessions.snapshot(),
+            "session_store": self.active_sessions.get_status(),
+            "journal": self.journal.get_status()
         }
+    
+    async def get_gate_statuses(self, refresh: bool = False) -> dict:
+        """Status semua gate dengan semantik stale-while-revalidate"""
+        if refresh or self._gate_status_cache is None:
+            self.status_cache_stats["misses"] += 1
+            return await self.refresh_gate_statuses()
+        
+        age = time.monotonic() - self._gate_status_cached_at
+        if age > STATUS_CACHE_MAX_STALE:
+            # Terlalu basi untuk dilayani: tunggu refresh (tetap singleflight)
+            self.status_cache_stats["misses"] += 1
+            return await self.refresh_gate_statuses()
         
-        # Get status dari semua gate
-        for gate_id, gate_info in self.gate_controllers.items():
+        if age > STATUS_CACHE_TTL:
+            # Layani data lama sekarang, revalidate di background
+            self.status_cache_stats["stale_hits"] += 1
+            self._start_status_refresh()
+        else:
+            self.status_cache_stats["hits"] += 1
+        return self._gate_status_cache
+    
+    async def refresh_gate_statuses(self) -> dict:
+        """Refresh cache status gate; pemanggil bersamaan menunggu refresh yang sama"""
+        return await asyncio.shield(self._start_status_refresh())
+    
+    def _start_status_refresh(self) -> asyncio.Task:
+        """Mulai refresh jika belum ada yang berjalan (singleflight)"""
+        if self._status_refresh is None or self._status_refresh.done():
+            self._status_refresh = asyncio.create_task(self._fetch_gate_statuses())
+        else:
+            self.status_cache_stats["coalesced"] += 1
+        return self._status_refresh
+    
+    async def _fetch_gate_statuses(self) -> dict:
+        """Ambil status live dari semua gate (paralel, dalam satu deadline budget)"""
+        gates = {}
+        results = await self.fan_out(list(self.gate_controllers.keys()), "/api/status", {})
+        for gate_id, outcome in results.items():
+            gates[gate_id] = {
+                **self.gate_controllers.get(gate_id, {}),
+                "controller_status": outcome["result"],
+                "fetch_status": outcome["status"],
+                "latency_ms": outcome["latency_ms"]
+            }
+        
+        self._gate_status_cache = gates
+        self._gate_status_cached_at = time.monotonic()
+        self._gate_status_refreshed_at = datetime.now().isoformat()
+        self.status_cache_stats["refreshes"] += 1
+        return gates
+    
+    def invalidate_status_cache(self):
+        """Tandai cache basi (mis. setelah perintah gate) agar pembaca berikutnya memicu revalidate"""
+        if self._gate_status_cached_at is not None:
+            self._gate_status_cached_at -= STATUS_CACHE_TTL
+    
+    async def _status_poll_loop(self):
+        """Poller background: jaga cache tetap hangat tanpa bergantung pada pembaca"""
+        while True:
             try:
-                gate_status = await self.send_to_gate(gate_id, "/api/status", {})
-                status["gates"][gate_id] = {
-                    **gate_info,
-                    "controller_status": gate_status
-                }
+                await self.refresh_gate_statuses()
+            except asyncio.CancelledError:
+                raise
             except Exception as e:
-                status["gates"][gate_id] = {
-                    **gate_info,
-                    "error": str(e)
-                }
-        
-        return status
+                logger.error(f"Status poller error: {e}")
+            await asyncio.sleep(STATUS_POLL_INTERVAL)
     
     async def get_parking_capacity(self) -> dict:
-        """Get parking capacity info"""
-        total_capacity = 100  # Dari config
-        occupied = len(self.active_sessions)
-        available = total_capacity - occupied
-        
-        return {
-            "total_capacity": total_capacity,
-            "occupied": occupied,
-            "available": available,
-            "occupancy_rate": (occupied / total_capacity) * 100
-        }
+        """Get parking capacity info (counter O(1), kapasitas dari system_config)"""
+        return self.occupancy.snapshot()
     
     async def force_exit_session(self, card_id: str, reason: str = "manual") -> dict:
         """Force exit parking session (emergency/manual)"""
-        if card_id not in self.active_sessions:
-            return {"error": "No active session found"}
-        
-        session = self.active_sessions.pop(card_id)
-        session.update({
-            "exit_time": datetime.now().isoformat(),
-            "exit_gate": "manual",
-            "status": "force_exited",
-            "reason": reason
-        })
+        async with self.card_locks.lock(card_id):
+            if card_id not in self.active_sessions:
+                return {"error": "No active session found"}
+            
+            session = self.active_sessions.close(card_id, {
+                "exit_time": datetime.now().isoformat(),
+                "exit_gate": "manual",
+                "status": "force_exited",
+                "reason": reason
+            })
+            self.occupancy.on_close(session)
+            self.journal.append("session_closed", {"session": session})
         
         logger.warning(f"Force exit session for {card_id}: {reason}")
         
@@ -283,30 +711,111 @@ class GateCoordinator:
             "reason": reason
         }
     
+    async def push_card_invalidation(self, card_ids: list) -> dict:
+        """Push invalidasi kartu (revoke) ke card cache semua entry gate"""
+        entry_gates = self.registry.of_type("entry")
+        results = await asyncio.gather(*[
+            self.send_to_gate(gid, "/api/cards/invalidate", {"card_ids": card_ids})
+            for gid in entry_gates
+        ])
+        
+        delivered = {gid: "error" not in result for gid, result in zip(entry_gates, results)}
+        logger.info(f"Card invalidation for {card_ids} pushed: {delivered}")
+        return delivered
+    
     async def get_gate_logs(self, gate_id: str = None, limit: int = 50) -> list:
         """Get logs from specific gate or all gates"""
-        logs = []
-        
-        if gate_id:
-            # Get logs from specific gate
-            result = await self.send_to_gate(gate_id, f"/api/logs?limit={limit}", {})
-            if "logs" in result:
-                for log in result["logs"]:
-                    log["gate"] = gate_id
-                logs.extend(result["logs"])
-        else:
-            # Get logs from all gates
-            for gid in self.gate_controllers.keys():
-                result = await self.send_to_gate(gid, f"/api/logs?limit={limit}", {})
-                if "logs" in result:
-                    for log in result["logs"]:
-                        log["gate"] = gid
-                    logs.extend(result["logs"])
-        
-        # Sort by timestamp
-        logs.sort(key=lambda x: x.get("timestamp", ""), reverse=True)
-        
-        return logs[:limit]
+        return (await self.get_merged_logs(gate_id, limit))["logs"]
+    
+    async def get_merged_logs(self, gate_id: str = None, limit: int = 50, cursor: str = None,
+                              event_type: str = None, card_id: str = None) -> dict:
+        """Log gabungan semua gate (k-way merge, terbaru dulu) dengan cursor untuk halaman berikutnya"""
+        positions = decode_cursor(cursor)
+        gate_ids = [gate_id] if gate_id else list(self.gate_controllers.keys())
+        
+        async def fetch_page(gid: str, before: int = None) -> dict:
+            query = {"limit": limit, "before": before, "event_type": event_type, "card_id": card_id}
+            endpoint = f"/api/logs?{urlencode({k: v for k, v in query.items() if v is not None})}"
+            result = await self.send_to_gate(gid, endpoint, {}, timeout=self.fanout_budget, method="GET")
+            if "error" in result:
+                raise RuntimeError(result["error"])
+            return result
+        
+        logs, positions, has_more, errors = await merge_gate_logs(gate_ids, fetch_page, limit, positions)
+        if errors:
+            logger.warning(f"Merged logs incomplete, gates skipped: {errors}")
+        
+        return {
+            "logs": logs,
+            "next_cursor": encode_cursor(positions) if has_more else None,
+            "errors": errors
+        }
+    
+    # ========================================
+    # EVENT JOURNAL
+    # ========================================
+    
+    async def _restore_from_journal(self) -> bool:
+        """Bangun ulang sesi aktif dari snapshot terakhir + replay event setelahnya"""
+        if not self.journal.enabled:
+            return False
+        try:
+            snapshot_seq, state = await asyncio.to_thread(self.journal.load_snapshot)
+            events = await asyncio.to_thread(self.journal.replay, snapshot_seq)
+        except Exception as e:
+            logger.error(f"Journal replay failed, falling back to database: {e}")
+            return False
+        if state is None and not events:
+            return False
+        
+        active = dict((state or {}).get("active_sessions", {}))
+        pending = {s["session_id"]: s for s in (state or {}).get("pending_writes", [])}
+        for event in events:
+            session = event["data"].get("session")
+            if session is None:
+                continue
+            if event["type"] == "session_opened":
+                active[session["card_id"]] = session
+            elif event["type"] == "session_closed":
+                active.pop(session["card_id"], None)
+            pending[session["session_id"]] = session  # Upsert ulang: write-behind mungkin belum sempat
+        
+        self.active_sessions.restore(active, list(pending.values()))
+        logger.info(f"Restored {len(active)} session(s) from journal snapshot {snapshot_seq} "
+                    f"+ {len(events)} event(s)")
+        return True
+    
+    async def snapshot_state(self) -> Optional[int]:
+        """Snapshot state sesi pada seq journal saat ini"""
+        # Diambil sinkron bersama last_seq (di dalam snapshot) agar konsisten
+        state = {
+            "active_sessions": self.active_sessions.snapshot(),
+            "pending_writes": self.active_sessions.pending_writes()
+        }
+        return await self.journal.snapshot(state)
+    
+    async def _snapshot_loop(self):
+        """Snapshot setiap JOURNAL_SNAPSHOT_INTERVAL, atau lebih cepat jika event menumpuk"""
+        last_snapshot = time.monotonic()
+        while True:
+            await asyncio.sleep(min(5.0, JOURNAL_SNAPSHOT_INTERVAL))
+            backlog = self.journal.last_seq - self.journal.snapshot_seq
+            if backlog == 0:
+                continue
+            if backlog >= JOURNAL_SNAPSHOT_EVENTS or time.monotonic() - last_snapshot >= JOURNAL_SNAPSHOT_INTERVAL:
+                try:
+                    await self.snapshot_state()
+                except Exception as e:
+                    logger.error(f"Journal snapshot error: {e}")
+                last_snapshot = time.monotonic()
+    
+    async def read_journal(self, from_seq: int = None, to_seq: int = None, since: str = None,
+                           until: str = None, event_type: str = None, limit: int = 1000) -> dict:
+        """Range read journal berdasarkan seq dan/atau waktu (ISO 8601)"""
+        def epoch(value: str) -> Optional[float]:
+            return datetime.fromisoformat(value).timestamp() if value else None
+        
+        return await self.journal.read(from_seq, to_seq, epoch(since), epoch(until), event_type, limit)
 
 # Global instance
 gate_coordinator = GateCoordinator() 
\ No newline at end of file
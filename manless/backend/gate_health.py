@@ -0,0 +1,93 @@
+"""
+Gate Health - Sistem Parkir Manless
+Circuit breaker dan jendela latency per gate controller untuk GateCoordinator.
+
+Breaker OPEN membuat request ke gate yang mati gagal seketika (tanpa menunggu timeout);
+setelah reset_timeout breaker menjadi HALF_OPEN dan hanya satu probe yang diizinkan.
+"""
+
+import statistics
+import time
+from collections import deque
+from typing import Dict, Optional
+
+class CircuitBreaker:
+    """Circuit breaker sederhana: closed -> open -> half_open -> closed"""
+
+    CLOSED = "closed"
+    OPEN = "open"
+    HALF_OPEN = "half_open"
+
+    def __init__(self, failure_threshold: int = 3, reset_timeout: float = 15.0):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.rejected = 0
+        self._probe_in_flight = False
+
+    def allow_request(self) -> bool:
+        """True jika request boleh dikirim; False = gagal cepat"""
+        if self.state == self.CLOSED:
+            return True
+        if self.state == self.OPEN and time.monotonic() - self.opened_at >= self.reset_timeout:
+            self.state = self.HALF_OPEN
+        if self.state == self.HALF_OPEN and not self._probe_in_flight:
+            self._probe_in_flight = True
+            return True
+        self.rejected += 1
+        return False
+
+    def record_success(self):
+        """Request berhasil: tutup breaker"""
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = None
+        self._probe_in_flight = False
+
+    def record_failure(self):
+        """Request gagal: buka breaker jika ambang tercapai atau probe half-open gagal"""
+        self.failures += 1
+        self._probe_in_flight = False
+        if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+            self.state = self.OPEN
+            self.opened_at = time.monotonic()
+
+    def get_status(self) -> Dict:
+        """Status breaker untuk API/status"""
+        retry_in = None
+        if self.state == self.OPEN:
+            retry_in = round(max(0.0, self.reset_timeout - (time.monotonic() - self.opened_at)), 2)
+        return {
+            "state": self.state,
+            "failures": self.failures,
+            "rejected": self.rejected,
+            "retry_in": retry_in
+        }
+
+class LatencyWindow:
+    """Jendela geser sampel latency (detik) dengan ringkasan persentil"""
+
+    def __init__(self, size: int = 100):
+        self._samples = deque(maxlen=size)
+
+    def add(self, seconds: float):
+        self._samples.append(seconds)
+
+    def percentiles(self) -> Dict:
+        """p50/p95/p99 dalam milidetik"""
+        if not self._samples:
+            return {"count": 0}
+        ordered = sorted(self._samples)
+
+        def pick(fraction: float) -> float:
+            return round(ordered[min(len(ordered) - 1, int(len(ordered) * fraction))] * 1000, 1)
+
+        return {
+            "count": len(ordered),
+            "p50_ms": round(statistics.median(ordered) * 1000, 1),
+            "p95_ms": pick(0.95),
+            "p99_ms": pick(0.99),
+            "max_ms": round(ordered[-1] * 1000, 1)
+        }
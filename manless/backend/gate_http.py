@@ -0,0 +1,164 @@
+"""
+Gate HTTP - Sistem Parkir Manless
+Pool HTTP async bersama untuk semua request backend ke gate controller.
+
+Satu aiohttp.ClientSession (connection pool keep-alive) per gate, dipakai bersama oleh
+GateCoordinator, GateLink dan ControllerClient, sehingga backend memegang satu pool per gate.
+Setiap request:
+- dibatasi jumlah request bersamaan per gate (semaphore); waktu antre termasuk dalam timeout
+- memakai timeout per endpoint (GATE_ENDPOINT_TIMEOUTS="/api/status=5,/health=2"), atau default
+- dicatat latency-nya per gate dan per endpoint (p50/p95/p99)
+Request tidak pernah memblokir event loop; satu controller yang lambat hanya menahan
+request ke controller itu sendiri.
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import aiohttp
+
+from gate_health import LatencyWindow
+
+logger = logging.getLogger(__name__)
+
+GATE_CONNECTIONS_PER_HOST = int(os.getenv("GATE_CONNECTIONS_PER_HOST", "4"))  # Koneksi keep-alive per gate
+GATE_MAX_CONCURRENT = int(os.getenv("GATE_MAX_CONCURRENT", "8"))              # Request bersamaan per gate
+GATE_KEEPALIVE_TIMEOUT = float(os.getenv("GATE_KEEPALIVE_TIMEOUT", "30"))     # Umur koneksi idle (detik)
+GATE_REQUEST_TIMEOUT = float(os.getenv("GATE_REQUEST_TIMEOUT", "10"))         # Default timeout (detik)
+
+DEFAULT_ENDPOINT_TIMEOUTS = {
+    "/health": 2.0,
+    "/api/status": 5.0,
+    "/api/logs": 5.0,
+    "/api/backend/gate/control": 10.0,
+    "/api/gate/control": 10.0,
+    "/api/camera/capture": 15.0,
+}
+
+def parse_endpoint_timeouts(value: str) -> Dict[str, float]:
+    """Format "path=detik,path=detik"; entri yang salah diabaikan"""
+    timeouts = {}
+    for item in (value or "").split(","):
+        path, _, seconds = item.strip().partition("=")
+        try:
+            timeouts[path] = float(seconds)
+        except ValueError:
+            continue
+    return timeouts
+
+class GateHttpPool:
+    """Connection pool, batas konkurensi, timeout dan metrik latency per gate"""
+
+    def __init__(self, connections_per_host: int = GATE_CONNECTIONS_PER_HOST,
+                 max_concurrent: int = GATE_MAX_CONCURRENT, default_timeout: float = GATE_REQUEST_TIMEOUT,
+                 endpoint_timeouts: Dict[str, float] = None):
+        self.connections_per_host = connections_per_host
+        self.max_concurrent = max_concurrent
+        self.default_timeout = default_timeout
+        self.endpoint_timeouts = {**DEFAULT_ENDPOINT_TIMEOUTS, **(endpoint_timeouts or {})}
+        self._sessions: Dict[str, aiohttp.ClientSession] = {}
+        self._semaphores: Dict[str, asyncio.Semaphore] = {}
+        self._latency: Dict[Tuple[str, str], LatencyWindow] = {}
+        self.stats: Dict[str, Dict[str, int]] = {}
+
+    def session(self, gate_id: str) -> aiohttp.ClientSession:
+        """Connection pool milik satu gate (dibuat saat pertama dipakai)"""
+        session = self._sessions.get(gate_id)
+        if session is None or session.closed:
+            session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(limit=self.connections_per_host,
+                                               keepalive_timeout=GATE_KEEPALIVE_TIMEOUT)
+            )
+            self._sessions[gate_id] = session
+        return session
+
+    def timeout_for(self, endpoint: str) -> float:
+        """Timeout endpoint: prefix terpanjang yang cocok, selain itu default"""
+        path = endpoint.split("?", 1)[0]
+        matches = [prefix for prefix in self.endpoint_timeouts if path.startswith(prefix)]
+        return self.endpoint_timeouts[max(matches, key=len)] if matches else self.default_timeout
+
+    def _stats(self, gate_id: str) -> Dict[str, int]:
+        if gate_id not in self.stats:
+            self.stats[gate_id] = {"requests": 0, "errors": 0, "timeouts": 0, "in_flight": 0, "queued": 0}
+        return self.stats[gate_id]
+
+    async def request(self, gate_id: str, method: str, url: str, endpoint: str, json: dict = None,
+                      timeout: float = None) -> Tuple[int, Optional[dict]]:
+        """Kirim request ke gate; hasil (status HTTP, body JSON atau None). TimeoutError jika lewat batas"""
+        timeout = timeout or self.timeout_for(endpoint)
+        semaphore = self._semaphores.setdefault(gate_id, asyncio.Semaphore(self.max_concurrent))
+        stats = self._stats(gate_id)
+        start = time.perf_counter()
+        if semaphore.locked():
+            # Batas request bersamaan tercapai: antre, tapi tetap dalam timeout request
+            stats["queued"] += 1
+            try:
+                await asyncio.wait_for(semaphore.acquire(), timeout)
+            except asyncio.TimeoutError:
+                stats["timeouts"] += 1
+                raise
+        else:
+            await semaphore.acquire()
+        stats["in_flight"] += 1
+        stats["requests"] += 1
+        try:
+            remaining = max(0.01, timeout - (time.perf_counter() - start))
+            async with self.session(gate_id).request(
+                method, url, json=json, timeout=aiohttp.ClientTimeout(total=remaining)
+            ) as response:
+                if response.status == 200:
+                    body = await response.json(content_type=None)
+                else:
+                    body = None
+                    logger.debug(f"Gate {gate_id} {method} {endpoint} -> {response.status}")
+            self._latency.setdefault((gate_id, endpoint.split("?", 1)[0]), LatencyWindow()).add(
+                time.perf_counter() - start)
+            return response.status, body
+        except asyncio.TimeoutError:
+            stats["timeouts"] += 1
+            raise
+        except Exception:
+            stats["errors"] += 1
+            raise
+        finally:
+            stats["in_flight"] -= 1
+            semaphore.release()
+
+    async def close_gate(self, gate_id: str):
+        """Tutup pool satu gate (gate dihapus dari registry)"""
+        session = self._sessions.pop(gate_id, None)
+        self._semaphores.pop(gate_id, None)
+        self.stats.pop(gate_id, None)
+        for key in [key for key in self._latency if key[0] == gate_id]:
+            del self._latency[key]
+        if session:
+            await session.close()
+
+    async def close(self):
+        for session in self._sessions.values():
+            await session.close()
+        self._sessions = {}
+
+    def get_status(self) -> dict:
+        """Statistik dan latency per endpoint untuk setiap gate"""
+        return {
+            "connections_per_host": self.connections_per_host,
+            "max_concurrent": self.max_concurrent,
+            "gates": {
+                gate_id: {
+                    **stats,
+                    "endpoints": {
+                        endpoint: window.percentiles()
+                        for (latency_gate, endpoint), window in self._latency.items() if latency_gate == gate_id
+                    }
+                }
+                for gate_id, stats in self.stats.items()
+            }
+        }
+
+# Global pool instance
+gate_http = GateHttpPool(endpoint_timeouts=parse_endpoint_timeouts(os.getenv("GATE_ENDPOINT_TIMEOUTS", "")))
@@ -0,0 +1,131 @@
+"""
+Gate Link - Sistem Parkir Manless
+Koneksi WebSocket persisten dari central hub ke satu gate controller (endpoint /ws/hub).
+
+Satu koneksi membawa request (dikorelasikan lewat id), balasan, dan event yang di-push gate.
+Koneksi dijaga oleh task reconnect dengan backoff; selama link putus GateCoordinator
+memakai HTTP sebagai fallback.
+"""
+
+import asyncio
+import json
+import logging
+import uuid
+from typing import Callable, Dict, List, Optional
+
+import aiohttp
+
+logger = logging.getLogger(__name__)
+
+class GateLinkUnavailable(Exception):
+    """Link tidak terhubung; pemanggil sebaiknya fallback ke HTTP"""
+
+class GateLink:
+    """Link request/response multiplexed ke satu gate controller"""
+
+    def __init__(self, gate_id: str, url: str, reconnect_delay: float = 1.0, max_reconnect_delay: float = 30.0):
+        self.gate_id = gate_id
+        self.ws_url = url.replace("http://", "ws://").replace("https://", "wss://") + "/ws/hub"
+        self.reconnect_delay = reconnect_delay
+        self.max_reconnect_delay = max_reconnect_delay
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._ws: Optional[aiohttp.ClientWebSocketResponse] = None
+        self._pending: Dict[str, asyncio.Future] = {}
+        self._event_listeners: List[Callable[[str, dict], None]] = []
+        self._task: Optional[asyncio.Task] = None
+        self.stats = {"requests": 0, "events": 0, "connects": 0, "disconnects": 0}
+
+    @property
+    def connected(self) -> bool:
+        return self._ws is not None and not self._ws.closed
+
+    def add_event_listener(self, listener: Callable[[str, dict], None]):
+        """Daftarkan callback(gate_id, message) untuk event yang di-push gate"""
+        self._event_listeners.append(listener)
+
+    def start(self, session: aiohttp.ClientSession):
+        """Mulai task koneksi (dengan reconnect) memakai connection pool milik gate"""
+        self._session = session
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Tutup link dan gagalkan request yang masih menunggu"""
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._ws is not None:
+            await self._ws.close()
+        self._fail_pending(ConnectionError(f"Link to {self.gate_id} closed"))
+
+    async def _run(self):
+        """Loop koneksi: connect, baca frame sampai putus, lalu reconnect dengan backoff"""
+        delay = self.reconnect_delay
+        while True:
+            try:
+                async with self._session.ws_connect(self.ws_url, heartbeat=15) as ws:
+                    self._ws = ws
+                    self.stats["connects"] += 1
+                    delay = self.reconnect_delay
+                    logger.info(f"Gate link to {self.gate_id} connected ({self.ws_url})")
+                    await self._read_loop(ws)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.debug(f"Gate link to {self.gate_id} unavailable: {e}")
+            finally:
+                if self._ws is not None:
+                    self.stats["disconnects"] += 1
+                    logger.warning(f"Gate link to {self.gate_id} disconnected")
+                self._ws = None
+                # Request yang sudah terkirim mungkin sudah dieksekusi gate: jangan di-retry lewat HTTP
+                self._fail_pending(ConnectionError(f"Link to {self.gate_id} lost"))
+
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, self.max_reconnect_delay)
+
+    async def _read_loop(self, ws: aiohttp.ClientWebSocketResponse):
+        async for message in ws:
+            if message.type != aiohttp.WSMsgType.TEXT:
+                break
+            frame = json.loads(message.data)
+            if frame.get("type") == "response":
+                future = self._pending.pop(frame.get("id"), None)
+                if future and not future.done():
+                    future.set_result(frame)
+            elif frame.get("type") == "event":
+                self.stats["events"] += 1
+                for listener in self._event_listeners:
+                    try:
+                        listener(self.gate_id, frame.get("payload", {}))
+                    except Exception as e:
+                        logger.error(f"Error in gate event listener: {e}")
+
+    def _fail_pending(self, error: Exception):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(error)
+        self._pending = {}
+
+    async def request(self, path: str, payload: dict, timeout: float) -> dict:
+        """Kirim request dan tunggu balasan dengan id yang sama; hasil {"status", "payload"}"""
+        if not self.connected:
+            raise GateLinkUnavailable(f"Link to {self.gate_id} not connected")
+
+        request_id = uuid.uuid4().hex
+        future = asyncio.get_running_loop().create_future()
+        self._pending[request_id] = future
+        self.stats["requests"] += 1
+        try:
+            try:
+                await self._ws.send_str(json.dumps({"type": "request", "id": request_id, "path": path, "payload": payload}))
+            except (ConnectionResetError, RuntimeError) as e:
+                # Belum terkirim: aman untuk fallback ke HTTP
+                raise GateLinkUnavailable(str(e))
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(request_id, None)
+
+    def get_status(self) -> dict:
+        return {"connected": self.connected, "pending": len(self._pending), **self.stats}
@@ -0,0 +1,143 @@
+"""
+Gate Registry - Sistem Parkir Manless
+Daftar gate controller (N lane entry/exit) untuk GateCoordinator.
+
+Urutan sumber konfigurasi:
+1. Env GATE_CONTROLLERS   : JSON list, mis. [{"gate_id": "entry_1", "url": "http://10.0.0.11:8001", "type": "entry", "lane": "A", "zone": "basement"}]
+2. Env GATE_CONFIG_FILE   : path file JSON dengan format yang sama
+3. Database               : system_config.config_key = "gate_controllers"
+4. Default                : gate_in (port 8001) dan gate_out (port 8002)
+
+Perubahan saat runtime (add/remove) disimpan kembali ke system_config.
+"""
+
+import json
+import logging
+import os
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from app.database.database import SessionLocal
+from app.database.model import SystemConfig
+
+logger = logging.getLogger(__name__)
+
+CONFIG_KEY = "gate_controllers"
+GATE_TYPES = ("entry", "exit")
+
+DEFAULT_GATES = [
+    {"gate_id": "gate_in", "url": "http://localhost:8001", "type": "entry", "lane": None},
+    {"gate_id": "gate_out", "url": "http://localhost:8002", "type": "exit", "lane": None},
+]
+
+class GateRegistry:
+    """Registry gate controller: gate_id -> info gate (url, type, lane, status, last_ping)"""
+
+    def __init__(self):
+        self.gates: Dict[str, dict] = {}
+        self.source = "default"
+        self._load_entries(DEFAULT_GATES)
+
+    def load(self) -> str:
+        """Muat gate dari env/file/database (blocking; panggil lewat asyncio.to_thread)"""
+        entries, source = None, "default"
+        try:
+            if os.getenv("GATE_CONTROLLERS"):
+                entries, source = json.loads(os.getenv("GATE_CONTROLLERS")), "env"
+            elif os.getenv("GATE_CONFIG_FILE"):
+                with open(os.getenv("GATE_CONFIG_FILE")) as config_file:
+                    entries, source = json.load(config_file), "file"
+            else:
+                entries = self._load_from_database()
+                if entries is not None:
+                    source = "database"
+        except Exception as e:
+            logger.error(f"Failed to load gate registry ({source}), using defaults: {e}")
+            entries, source = None, "default"
+
+        self.gates = {}
+        if entries and not self._load_entries(entries):
+            logger.error(f"Gate registry ({source}) has no valid gate, using defaults")
+            entries, source = None, "default"
+        if not entries:
+            self._load_entries(DEFAULT_GATES)
+        self.source = source
+        logger.info(f"Gate registry loaded {len(self.gates)} gate(s) from {source}: {list(self.gates)}")
+        return source
+
+    def _load_entries(self, entries: List[dict]) -> int:
+        """Tambahkan entri yang valid; entri rusak (field kurang, tipe salah) dilewati. Kembalikan jumlahnya"""
+        if not isinstance(entries, list):
+            logger.error(f"Gate registry config must be a list, got {type(entries).__name__}")
+            return 0
+        loaded = 0
+        for entry in entries:
+            try:
+                self.add(entry["gate_id"], entry["url"], entry["type"], entry.get("lane"), entry.get("zone"))
+                loaded += 1
+            except (KeyError, TypeError, AttributeError, ValueError) as e:
+                logger.warning(f"Skipping invalid gate entry {entry!r}: {e!r}")
+        return loaded
+
+    def _load_from_database(self) -> Optional[List[dict]]:
+        db = SessionLocal()
+        try:
+            row = db.query(SystemConfig).filter(SystemConfig.config_key == CONFIG_KEY).first()
+            return json.loads(row.config_value) if row else None
+        finally:
+            db.close()
+
+    def save(self):
+        """Simpan daftar gate ke system_config (blocking; panggil lewat asyncio.to_thread)"""
+        db = SessionLocal()
+        try:
+            value = json.dumps(self.to_config())
+            row = db.query(SystemConfig).filter(SystemConfig.config_key == CONFIG_KEY).first()
+            if row is None:
+                db.add(SystemConfig(
+                    config_key=CONFIG_KEY,
+                    config_value=value,
+                    description="Gate controllers (JSON list: gate_id, url, type, lane, zone)"
+                ))
+            else:
+                row.config_value = value
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def add(self, gate_id: str, url: str, gate_type: str, lane: Optional[str] = None,
+            zone: Optional[str] = None) -> dict:
+        """Tambah atau update satu gate; status health direset"""
+        if gate_type not in GATE_TYPES:
+            raise ValueError(f"Invalid gate type: {gate_type}")
+        self.gates[gate_id] = {
+            "url": url.rstrip("/"),
+            "type": gate_type,
+            "lane": lane,
+            "zone": zone,  # Zona parkir yang dilayani gate (untuk counter okupansi)
+            "status": "unknown",
+            "last_ping": None,
+            "registered_at": datetime.now().isoformat()
+        }
+        return self.gates[gate_id]
+
+    def remove(self, gate_id: str) -> Optional[dict]:
+        """Hapus gate dari registry"""
+        return self.gates.pop(gate_id, None)
+
+    def of_type(self, gate_type: str, lane: Optional[str] = None) -> List[str]:
+        """gate_id dengan tipe (dan lane) tertentu, urut sesuai registrasi"""
+        return [
+            gate_id for gate_id, info in self.gates.items()
+            if info["type"] == gate_type and (lane is None or info["lane"] == lane)
+        ]
+
+    def to_config(self) -> List[dict]:
+        """Format konfigurasi (tanpa status runtime)"""
+        return [
+            {"gate_id": gate_id, "url": info["url"], "type": info["type"], "lane": info["lane"], "zone": info["zone"]}
+            for gate_id, info in self.gates.items()
+        ]
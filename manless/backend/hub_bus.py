@@ -0,0 +1,403 @@
+"""
+Hub Bus - Sistem Parkir Manless
+Bus pub/sub lokal (Unix domain socket) agar central hub bisa jalan dengan beberapa worker uvicorn.
+
+    HUB_BUS_PATH=/tmp/manless-hub.sock python hub_bus.py          # broker (satu proses)
+    HUB_BUS_PATH=/tmp/manless-hub.sock uvicorn app.main:app --workers 4
+
+Broker hanya meneruskan frame antar worker (pengganti lokal untuk Redis pub/sub):
+- publish : pesan broadcast dari satu worker diteruskan ke semua worker lain, yang mengirimnya
+            ke client WebSocket miliknya sendiri
+- leader  : satu worker dipilih sebagai pemilik GateCoordinator (link gate, sesi, journal).
+            Pemilihan sticky: worker yang sebelumnya leader mengklaim ulang setelah broker restart
+            (grace period); jika leader putus, worker yang paling lama terhubung menggantikannya
+            setelah grace period. Worker yang kehilangan koneksi bus langsung mundur sebagai leader,
+            sehingga tidak pernah ada dua coordinator sekaligus
+- call    : worker lain meneruskan pemanggilan coordinator ke leader dan menunggu reply
+
+Frame berupa JSON per baris. Tanpa HUB_BUS_PATH hub berjalan satu proses seperti sebelumnya:
+worker selalu leader dan publish tidak dikirim ke mana-mana.
+"""
+
+import asyncio
+import itertools
+import json
+import logging
+import os
+import time
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+from json_encoder import encode_message
+
+logger = logging.getLogger(__name__)
+
+FRAME_LIMIT = 16 * 1024 * 1024      # Batas satu frame (status lengkap semua gate muat)
+MAX_WRITE_BUFFER = 8 * 1024 * 1024  # Worker yang tidak membaca selama ini diputus broker
+
+class BusError(Exception):
+    """Pemanggilan lewat bus gagal (tidak ada leader, timeout, atau error di leader)"""
+
+def _frame(data: dict) -> bytes:
+    return (encode_message(data) + "\n").encode()
+
+class BusBroker:
+    """Broker frame antar worker hub"""
+
+    def __init__(self, path: str, election_grace: float = 2.0):
+        self.path = path
+        self.election_grace = election_grace
+        self._server: Optional[asyncio.AbstractServer] = None
+        self._workers: Dict[str, asyncio.StreamWriter] = {}  # urutan = urutan terhubung
+        self._claims = set()
+        self._leader: Optional[str] = None
+        self._inflight: Dict[tuple, str] = {}  # (worker asal, id call) -> leader yang memproses
+        self._started = 0.0
+        self._leader_lost = 0.0  # Saat leader terakhir putus (pengganti menunggu grace)
+        self._election: Optional[asyncio.TimerHandle] = None
+        self.stats = {"published": 0, "relayed": 0, "calls": 0, "elections": 0, "slow_disconnects": 0}
+
+    async def start(self):
+        if os.path.exists(self.path):
+            os.unlink(self.path)  # Socket sisa broker sebelumnya
+        self._server = await asyncio.start_unix_server(self._serve, path=self.path, limit=FRAME_LIMIT)
+        self._started = time.monotonic()
+        logger.info(f"Hub bus broker listening on {self.path}")
+
+    async def stop(self):
+        if self._election:
+            self._election.cancel()
+        if self._server:
+            self._server.close()
+            await self._server.wait_closed()
+        for writer in list(self._workers.values()):
+            writer.close()
+        if os.path.exists(self.path):
+            os.unlink(self.path)
+
+    async def serve_forever(self):
+        await self.start()
+        try:
+            await self._server.serve_forever()
+        finally:
+            await self.stop()
+
+    async def _serve(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        worker = None
+        try:
+            hello = json.loads(await reader.readline() or "{}")
+            worker = hello.get("worker")
+            if hello.get("op") != "hello" or not worker:
+                return
+            old = self._workers.pop(worker, None)
+            if old:
+                old.close()  # Koneksi lama worker yang sama (reconnect)
+            self._workers[worker] = writer
+            if hello.get("claim"):
+                self._claims.add(worker)
+            logger.info(f"Hub worker {worker} connected ({len(self._workers)} workers)")
+            if self._leader:
+                self._send(worker, {"op": "leader", "worker": self._leader})
+            else:
+                self._elect()
+
+            while True:
+                line = await reader.readline()
+                if not line:
+                    break
+                self._route(worker, json.loads(line), line)
+        except (ConnectionError, ValueError) as e:
+            logger.warning(f"Hub worker {worker} connection error: {e}")
+        finally:
+            if worker and self._workers.get(worker) is writer:
+                self._drop(worker)
+            writer.close()
+
+    def _route(self, worker: str, frame: dict, line: bytes):
+        op = frame.get("op")
+        if op == "publish":
+            self.stats["published"] += 1
+            for other in list(self._workers):
+                if other != worker:
+                    self._write(other, line)  # Diteruskan apa adanya, tanpa encode ulang
+                    self.stats["relayed"] += 1
+        elif op == "call":
+            self.stats["calls"] += 1
+            if self._leader is None:
+                self._send(worker, {"op": "reply", "id": frame.get("id"), "error": "no coordinator leader"})
+                return
+            self._inflight[(worker, frame.get("id"))] = self._leader
+            self._send(self._leader, {**frame, "from": worker})
+        elif op == "reply":
+            caller = frame.pop("to", None)
+            self._inflight.pop((caller, frame.get("id")), None)
+            if caller in self._workers:
+                self._send(caller, frame)
+
+    def _drop(self, worker: str):
+        self._workers.pop(worker, None)
+        self._claims.discard(worker)
+        logger.info(f"Hub worker {worker} disconnected ({len(self._workers)} workers)")
+        if worker != self._leader:
+            return
+        self._leader = None
+        self._leader_lost = time.monotonic()
+        # Call yang sedang diproses leader lama tidak akan dibalas
+        for (caller, call_id), leader in list(self._inflight.items()):
+            if leader == worker:
+                del self._inflight[(caller, call_id)]
+                self._send(caller, {"op": "reply", "id": call_id, "error": "coordinator leader disconnected"})
+        self._elect()
+
+    def _elect(self):
+        """Pilih leader: pengklaim dulu; tanpa pengklaim, tunggu grace lalu worker tertua
+
+        Grace dihitung dari start broker atau dari putusnya leader terakhir, agar leader lama
+        sempat melihat koneksinya putus dan menghentikan coordinator-nya sebelum ada pengganti.
+        """
+        if self._leader or not self._workers:
+            return
+        candidates = [worker for worker in self._workers if worker in self._claims]
+        if not candidates:
+            remaining = self.election_grace - (time.monotonic() - max(self._started, self._leader_lost))
+            if remaining > 0:
+                if self._election is None:
+                    self._election = asyncio.get_running_loop().call_later(remaining, self._elect_later)
+                return
+            candidates = list(self._workers)
+        self._leader = candidates[0]
+        self._claims = {self._leader}
+        self.stats["elections"] += 1
+        logger.info(f"Hub worker {self._leader} elected coordinator leader")
+        for worker in list(self._workers):
+            self._send(worker, {"op": "leader", "worker": self._leader})
+
+    def _elect_later(self):
+        self._election = None
+        self._elect()
+
+    def _send(self, worker: str, frame: dict):
+        self._write(worker, _frame(frame))
+
+    def _write(self, worker: str, data: bytes):
+        writer = self._workers.get(worker)
+        if writer is None:
+            return
+        if writer.transport.get_write_buffer_size() > MAX_WRITE_BUFFER:
+            logger.warning(f"Disconnecting slow hub worker {worker}")
+            self.stats["slow_disconnects"] += 1
+            self._drop(worker)
+            writer.close()
+            return
+        writer.write(data)
+
+    def get_status(self) -> dict:
+        return {"path": self.path, "workers": list(self._workers), "leader": self._leader, **self.stats}
+
+class BusClient:
+    """Koneksi satu worker ke broker (tanpa path: mode satu proses, selalu leader)"""
+
+    def __init__(self, path: str = "", worker_id: str = None, call_timeout: float = 30.0,
+                 reconnect_delay: float = 1.0):
+        self.path = path
+        self.worker_id = worker_id or f"{os.uname().nodename}-{os.getpid()}"
+        self.call_timeout = call_timeout
+        self.reconnect_delay = reconnect_delay
+        self.leader: Optional[str] = None
+        self.on_publish: Optional[Callable[[dict], None]] = None
+        self.on_leadership: Optional[Callable[[bool], Awaitable[None]]] = None
+        self._handlers: Dict[str, Callable[..., Awaitable]] = {}
+        self._writer: Optional[asyncio.StreamWriter] = None
+        self._task: Optional[asyncio.Task] = None
+        self._pending: Dict[int, asyncio.Future] = {}
+        self._ids = itertools.count(1)
+        self._is_leader = False
+        self._claim = False  # Leader terakhir yang dilihat: klaim ulang saat reconnect (sticky)
+        self._leadership_lock = asyncio.Lock()
+        self.stats = {"published": 0, "received": 0, "calls": 0, "served": 0, "reconnects": 0}
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.path)
+
+    @property
+    def connected(self) -> bool:
+        return self._writer is not None
+
+    @property
+    def is_leader(self) -> bool:
+        return self._is_leader
+
+    def expose(self, target, methods: Iterable[str]):
+        """Method target yang boleh dipanggil worker lain saat worker ini leader"""
+        for name in methods:
+            self._handlers[name] = getattr(target, name)
+
+    async def start(self):
+        if not self.enabled:
+            self.leader = self.worker_id
+            await self._set_leadership(True)
+            return
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+        if self._writer:
+            self._writer.close()
+            self._writer = None
+        self._fail_pending("hub bus stopped")
+
+    async def _run(self):
+        while True:
+            try:
+                reader, writer = await asyncio.open_unix_connection(self.path, limit=FRAME_LIMIT)
+                writer.write(_frame({"op": "hello", "worker": self.worker_id, "claim": self._claim}))
+                self._writer = writer
+                logger.info(f"Hub worker {self.worker_id} connected to bus {self.path}")
+                while True:
+                    line = await reader.readline()
+                    if not line:
+                        break
+                    self._dispatch(json.loads(line))
+            except asyncio.CancelledError:
+                raise
+            except (OSError, ValueError) as e:
+                logger.warning(f"Hub bus {self.path} unavailable: {e}")
+            if self._writer:
+                self._writer.close()
+                self._writer = None
+            self._fail_pending("hub bus disconnected")
+            # Tanpa bus, broker bisa memilih leader lain: mundur sekarang, jangan tunggu frame leader
+            await self._set_leadership(False)
+            self.stats["reconnects"] += 1
+            await asyncio.sleep(self.reconnect_delay)
+
+    def _dispatch(self, frame: dict):
+        op = frame.get("op")
+        if op == "publish":
+            self.stats["received"] += 1
+            if self.on_publish:
+                try:
+                    self.on_publish(frame)
+                except Exception as e:
+                    logger.error(f"Error delivering bus message: {e}")
+        elif op == "reply":
+            future = self._pending.pop(frame.get("id"), None)
+            if future and not future.done():
+                if "error" in frame:
+                    # ValueError tetap ValueError (input tidak valid -> HTTP 400 di pemanggil)
+                    error = ValueError if frame.get("error_type") == "ValueError" else BusError
+                    future.set_exception(error(frame["error"]))
+                else:
+                    future.set_result(frame.get("result"))
+        elif op == "call":
+            asyncio.create_task(self._serve_call(frame))
+        elif op == "leader":
+            self.leader = frame.get("worker")
+            self._claim = self.leader == self.worker_id
+            asyncio.create_task(self._set_leadership(self.leader == self.worker_id))
+
+    async def _set_leadership(self, is_leader: bool):
+        async with self._leadership_lock:  # Init/cleanup coordinator tidak boleh tumpang tindih
+            if is_leader == self._is_leader:
+                return
+            self._is_leader = is_leader
+            logger.info(f"Hub worker {self.worker_id} is {'now' if is_leader else 'no longer'} coordinator leader")
+            if self.on_leadership:
+                await self.on_leadership(is_leader)
+
+    async def _serve_call(self, frame: dict):
+        reply = {"op": "reply", "id": frame.get("id"), "to": frame.get("from")}
+        handler = self._handlers.get(frame.get("method"))
+        if not self._is_leader or handler is None:
+            reply["error"] = f"cannot serve {frame.get('method')} on {self.worker_id}"
+        else:
+            try:
+                reply["result"] = await handler(*frame.get("args", []), **frame.get("kwargs", {}))
+                self.stats["served"] += 1
+            except Exception as e:
+                reply["error"] = str(e)
+                reply["error_type"] = type(e).__name__
+        try:
+            try:
+                self._write(reply)
+            except (TypeError, ValueError) as e:
+                reply.pop("result", None)
+                reply["error"] = f"unserializable result: {e}"
+                self._write(reply)
+        except BusError as e:
+            logger.error(f"Cannot reply to {frame.get('method')} call: {e}")
+
+    def _write(self, frame: dict):
+        if self._writer is None:
+            raise BusError("hub bus not connected")
+        self._writer.write(_frame(frame))
+
+    def _fail_pending(self, reason: str):
+        for future in self._pending.values():
+            if not future.done():
+                future.set_exception(BusError(reason))
+        self._pending = {}
+
+    def publish(self, topic: str, data: str, message_class: str = None, key: str = None) -> bool:
+        """Teruskan pesan broadcast (sudah di-encode) ke worker lain; False jika bus tidak terhubung"""
+        if self._writer is None:
+            return False
+        self._writer.write(_frame({"op": "publish", "topic": topic, "data": data,
+                                   "class": message_class, "key": key}))
+        self.stats["published"] += 1
+        return True
+
+    async def call(self, method: str, *args, **kwargs):
+        """Jalankan method coordinator: langsung jika worker ini leader, selain itu lewat bus"""
+        if self._is_leader:
+            return await self._handlers[method](*args, **kwargs)
+        call_id = next(self._ids)
+        future = asyncio.get_running_loop().create_future()
+        self._pending[call_id] = future
+        try:
+            self._write({"op": "call", "id": call_id, "method": method, "args": args, "kwargs": kwargs})
+            self.stats["calls"] += 1
+            return await asyncio.wait_for(future, timeout=self.call_timeout)
+        except asyncio.TimeoutError:
+            raise BusError(f"{method} timed out after {self.call_timeout}s")
+        finally:
+            self._pending.pop(call_id, None)
+
+    def get_status(self) -> dict:
+        return {
+            "enabled": self.enabled,
+            "worker": self.worker_id,
+            "leader": self.leader,
+            "is_leader": self._is_leader,
+            "connected": self.connected or not self.enabled,
+            "pending_calls": len(self._pending),
+            **self.stats
+        }
+
+class LeaderProxy:
+    """Akses method coordinator yang selalu dijalankan di worker leader"""
+
+    def __init__(self, bus: BusClient, target, methods: Iterable[str]):
+        self._bus = bus
+        self._methods = frozenset(methods)
+        bus.expose(target, self._methods)
+
+    def __getattr__(self, name: str):
+        if name not in self._methods:
+            raise AttributeError(name)
+        async def call(*args, **kwargs):
+            return await self._bus.call(name, *args, **kwargs)
+        return call
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+    broker = BusBroker(
+        os.getenv("HUB_BUS_PATH", "/tmp/manless-hub.sock"),
+        election_grace=float(os.getenv("HUB_BUS_ELECTION_GRACE", "2"))
+    )
+    try:
+        asyncio.run(broker.serve_forever())
+    except KeyboardInterrupt:
+        pass
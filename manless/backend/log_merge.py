@@ -0,0 +1,107 @@
+"""
+Log Merge - Sistem Parkir Manless
+K-way merge (heap) atas halaman log yang sudah terurut dari setiap gate, terbaru lebih dulu.
+
+Halaman berikutnya dari sebuah gate hanya diambil saat entri gate itu benar-benar terpakai,
+sehingga menggulir ke belakang tidak memaksa semua gate mengirim seluruh log-nya.
+Posisi per gate (seq terakhir yang terpakai) dibungkus menjadi cursor opaque.
+"""
+
+import asyncio
+import base64
+import heapq
+import json
+import logging
+from datetime import datetime
+from typing import Awaitable, Callable, Dict, List, Optional, Tuple
+
+logger = logging.getLogger(__name__)
+
+EXHAUSTED = -1  # Posisi gate yang log-nya sudah habis
+
+def encode_cursor(positions: Dict[str, int]) -> str:
+    """Posisi per gate -> cursor opaque (base64url JSON)"""
+    raw = json.dumps(positions, separators=(",", ":")).encode("utf-8")
+    return base64.urlsafe_b64encode(raw).decode("ascii").rstrip("=")
+
+def decode_cursor(cursor: Optional[str]) -> Dict[str, int]:
+    """Cursor opaque -> posisi per gate; ValueError jika cursor tidak valid"""
+    if not cursor:
+        return {}
+    try:
+        raw = base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4))
+        positions = json.loads(raw)
+        return {str(gate_id): int(seq) for gate_id, seq in positions.items()}
+    except Exception as e:
+        raise ValueError(f"Invalid log cursor: {e}")
+
+def _sort_key(entry: dict) -> float:
+    try:
+        return datetime.fromisoformat(entry.get("timestamp", "")).timestamp()
+    except (TypeError, ValueError):
+        return 0.0
+
+async def merge_gate_logs(
+    gate_ids: List[str],
+    fetch_page: Callable[[str, Optional[int]], Awaitable[dict]],
+    limit: int,
+    positions: Dict[str, int]
+) -> Tuple[List[dict], Dict[str, int], bool, Dict[str, str]]:
+    """Gabungkan log dari beberapa gate; hasil (logs, posisi baru, masih_ada, error per gate)
+
+    fetch_page(gate_id, before) mengembalikan {"logs": [...terbaru dulu], "next_before": seq|None}.
+    masih_ada hanya memperhitungkan gate yang menjawab; gate yang gagal dilaporkan di error per gate.
+    """
+    positions = dict(positions)
+    buffers: Dict[str, List[dict]] = {}
+    next_before: Dict[str, Optional[int]] = {}
+    errors: Dict[str, str] = {}
+
+    async def load(gate_id: str, before: Optional[int]) -> bool:
+        try:
+            page = await fetch_page(gate_id, before)
+        except Exception as e:
+            errors[gate_id] = str(e)
+            return False
+        buffers[gate_id] = page.get("logs", [])
+        next_before[gate_id] = page.get("next_before")
+        return bool(buffers[gate_id])
+
+    # Halaman pertama dari setiap gate yang belum habis diambil paralel
+    active = [gid for gid in gate_ids if positions.get(gid) != EXHAUSTED]
+    loaded = await asyncio.gather(*[load(gid, positions.get(gid)) for gid in active])
+
+    heap = []
+    for gate_id, has_logs in zip(active, loaded):
+        if has_logs:
+            heapq.heappush(heap, (-_sort_key(buffers[gate_id][0]), gate_id, 0))
+        elif gate_id not in errors:
+            positions[gate_id] = EXHAUSTED
+
+    logs: List[dict] = []
+    while heap and len(logs) < limit:
+        _, gate_id, index = heapq.heappop(heap)
+        entry = buffers[gate_id][index]
+        entry.setdefault("gate", gate_id)
+        logs.append(entry)
+        positions[gate_id] = entry["seq"]
+
+        index += 1
+        if index >= len(buffers[gate_id]):
+            # Halaman gate ini habis terpakai: ambil halaman berikutnya hanya jika masih diperlukan
+            if next_before[gate_id] is None:
+                positions[gate_id] = EXHAUSTED
+                continue
+            if len(logs) >= limit:
+                continue  # Diambil pada halaman berikutnya (posisi sudah tersimpan di cursor)
+            if not await load(gate_id, next_before[gate_id]):
+                if gate_id not in errors:
+                    positions[gate_id] = EXHAUSTED
+                continue
+            index = 0
+        heapq.heappush(heap, (-_sort_key(buffers[gate_id][index]), gate_id, index))
+
+    # Gate yang error di halaman ini tidak dihitung: tanpa itu gate yang terus gagal membuat
+    # paginasi tidak pernah selesai. Posisinya tetap di cursor (dicoba lagi jika klien lanjut)
+    has_more = any(positions.get(gid) != EXHAUSTED for gid in gate_ids if gid not in errors)
+    return logs, positions, has_more, errors
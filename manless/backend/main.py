@@ -13,9 +13,8 @@ import logging
 import os
 from datetime import datetime
 from typing import Dict, List, Optional
-import requests
+import aiohttp
 import threading
-import websockets
 
 import uvicorn
 from fastapi import FastAPI, WebSocket, WebSocketDisconnect, HTTPException, Depends
@@ -31,6 +30,11 @@ from app.hardware.camera import CameraController
 # from app.hardware.arduino import ArduinoController  # Dihapus - Arduino ada di controller
 # from app.hardware.card_reader import CardReaderController  # Dihapus - Card reader ada di controller
 from camera_config import DEFAULT_CAMERA_URL, get_camera_url, get_camera_url_for_gate
+from broadcaster import Broadcaster, STATUS
+from controller_subscriptions import ANY, ControllerSubscription, ControllerSubscriptionManager
+from gate_registry import GateRegistry
+from gate_http import gate_http
+from status_delta import StatusPublisher, StatusReplica
 
 # Configure logging
 logging.basicConfig(
@@ -43,13 +47,16 @@ logger = logging.getLogger(__name__)
 CONTROLLER_HOST = "localhost"
 CONTROLLER_PORT = 8001
 CONTROLLER_URL = f"http://{CONTROLLER_HOST}:{CONTROLLER_PORT}"
+CONTROLLER_GATE_ID = os.getenv("CONTROLLER_GATE_ID", "gate_in")  # Key pool di gate_http (sama dengan GateCoordinator)
+CONTROLLER_BACKOFF_BASE = float(os.getenv("CONTROLLER_BACKOFF_BASE", "0.5"))  # Backoff reconnect awal (detik)
+CONTROLLER_BACKOFF_MAX = float(os.getenv("CONTROLLER_BACKOFF_MAX", "30"))     # Batas backoff reconnect (detik)
 
 class ControllerClient:
-    """Client untuk komunikasi dengan controller menggunakan requests"""
+    """Client async untuk komunikasi dengan controller (pool HTTP bersama di gate_http)"""
     
-    def __init__(self):
-        self.session = requests.Session()
-        self.session.timeout = 5
+    def __init__(self, gate_id: str = CONTROLLER_GATE_ID):
+        self.gate_id = gate_id
+        self.http = gate_http
         
     async def start(self):
         """Initialize controller client"""
@@ -57,44 +64,49 @@ class ControllerClient:
         
     async def stop(self):
         """Cleanup controller client"""
-        self.session.close()
+        await self.http.close_gate(self.gate_id)
         logger.info("Controller client stopped")
     
-    def get_controller_status(self) -> dict:
-        """Get status dari controller (synchronous)"""
+    async def _request(self, method: str, endpoint: str, json: dict = None):
+        return await self.http.request(self.gate_id, method, f"{CONTROLLER_URL}{endpoint}", endpoint, json=json)
+    
+    async def get_controller_status(self) -> dict:
+        """Get status dari controller"""
         try:
             logger.info(f"Requesting status from controller: {CONTROLLER_URL}/api/status")
-            response = self.session.get(f"{CONTROLLER_URL}/api/status", timeout=5)
-            logger.info(f"Controller response status: {response.status_code}")
+            status, data = await self._request("GET", "/api/status")
+            logger.info(f"Controller response status: {status}")
             
-            if response.status_code == 200:
-                data = response.json()
+            if status == 200:
                 logger.info(f"Controller status received successfully")
                 logger.debug(f"Controller data: {data}")
                 return data
             else:
-                logger.error(f"Controller API error: {response.status_code} - {response.text}")
-                return {"error": f"Controller API error: {response.status_code}"}
-        except requests.ConnectionError as e:
+                logger.error(f"Controller API error: {status}")
+                return {"error": f"Controller API error: {status}"}
+        except asyncio.TimeoutError:
+            logger.error("Timeout getting controller status")
+            return {"error": "Controller timeout"}
+        except aiohttp.ClientConnectionError as e:
             logger.error(f"Error connecting to controller: {e}")
             return {"error": f"Controller connection failed: {str(e)}"}
         except Exception as e:
             logger.error(f"Unexpected error getting controller status: {e}")
             return {"error": str(e)}
     
-    def send_gate_command(self, action: str, gate_id: str = "gate_in") -> dict:
-        """Send gate control command to controller (synchronous)"""
+    async def send_gate_command(self, action: str, gate_id: str = "gate_in") -> dict:
+        """Send gate control command to controller"""
         try:
-            response = self.session.post(
-                f"{CONTROLLER_URL}/api/backend/gate/control",
-                json={"action": action, "duration": 10},
-                timeout=10
-            )
-            if response.status_code == 200:
-                return response.json()
+            status, data = await self._request("POST", "/api/backend/gate/control",
+                                               json={"action": action, "duration": 10})
+            if status == 200:
+                return data
             else:
-                logger.error(f"Gate control error: {response.status_code}")
-                return {"error": f"Gate control failed: {response.status_code}"}
+                logger.error(f"Gate control error: {status}")
+                return {"error": f"Gate control failed: {status}"}
+        except asyncio.TimeoutError:
+            logger.error("Timeout sending gate command")
+            return {"error": "Controller timeout"}
         except Exception as e:
             logger.error(f"Error sending gate command: {e}")
             return {"error": str(e)}
@@ -123,40 +135,41 @@ app.include_router(api_router, prefix="/api/v1")
 # WebSocket connection manager
 class ConnectionManager:
     def __init__(self):
-        self.active_connections: List[WebSocket] = []
+        self.broadcaster = Broadcaster("backend")  # Antrean keluar + writer per client
+        
+    @property
+    def active_connections(self) -> Broadcaster:
+        return self.broadcaster
         
     async def connect(self, websocket: WebSocket):
         await websocket.accept()
-        self.active_connections.append(websocket)
+        self.broadcaster.add(websocket)
         logger.info(f"WebSocket connected. Total connections: {len(self.active_connections)}")
         
     def disconnect(self, websocket: WebSocket):
-        if websocket in self.active_connections:
-            self.active_connections.remove(websocket)
+        self.broadcaster.remove(websocket)
         logger.info(f"WebSocket disconnected. Total connections: {len(self.active_connections)}")
         
     async def send_personal_message(self, message: str, websocket: WebSocket):
-        try:
-            await websocket.send_text(message)
-        except Exception as e:
-            logger.error(f"Error sending personal message: {e}")
+        # Lewat antrean client yang sama dengan broadcast: urutan terjaga, writer tunggal per socket
+        if not self.broadcaster.send(websocket, message):
+            logger.debug("Personal message dropped: client not connected")
             
-    async def broadcast(self, message: str):
-        disconnected = []
-        for connection in self.active_connections:
-            try:
-                await connection.send_text(message)
-            except Exception as e:
-                logger.error(f"Error broadcasting message: {e}")
-                disconnected.append(connection)
-        
-        # Remove disconnected connections
-        for connection in disconnected:
-            self.disconnect(connection)
+    async def broadcast(self, message, message_class: str = None):
+        # Hanya antre per client; client yang lambat tidak menahan client lain
+        self.broadcaster.broadcast(message, message_class)
 
 # Global connection manager
 manager = ConnectionManager()
 
+# Status hardware per gate controller (replica berversi) dan publisher ke frontend
+controller_replicas: Dict[str, StatusReplica] = {}
+status_publisher = StatusPublisher(manager.broadcaster)
+
+# Satu link WebSocket yang diawasi per gate controller terdaftar
+controller_subscriptions = ControllerSubscriptionManager(backoff_base=CONTROLLER_BACKOFF_BASE,
+                                                         backoff_max=CONTROLLER_BACKOFF_MAX)
+
 # Hardware controllers (hanya camera di backend)
 camera_controller = None
 
@@ -219,41 +232,76 @@ async def startup_event():
     except Exception as e:
         logger.error(f"Error initializing camera: {e}")
     
-    # Mulai background task untuk mendengarkan controller
-    asyncio.create_task(listen_to_controller_task())
+    # Mulai link WebSocket ke setiap gate controller terdaftar
+    try:
+        registry = GateRegistry()
+        await asyncio.to_thread(registry.load)
+        for gate_id, info in registry.gates.items():
+            controller_subscriptions.register(gate_id, controller_ws_url(info["url"]))
+        logger.info(f"Subscribed to {len(registry.gates)} controller(s): {list(registry.gates)}")
+    except Exception as e:
+        logger.error(f"Error starting controller subscriptions: {e}")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Tutup link ke semua controller"""
+    await controller_subscriptions.stop()
+
+def controller_ws_url(url: str) -> str:
+    """URL HTTP controller dari registry -> URL WebSocket /ws"""
+    if url.startswith("https://"):
+        url = "wss://" + url[len("https://"):]
+    elif url.startswith("http://"):
+        url = "ws://" + url[len("http://"):]
+    return f"{url.rstrip('/')}/ws"
+
+async def on_controller_connect(link: ControllerSubscription):
+    """Link tersambung: minta snapshot status berversi; setelah itu controller hanya mengirim patch"""
+    controller_replicas.pop(link.gate_id, None)
+    if link.gate_id == CONTROLLER_GATE_ID:
+        system_status.controller_connected = True
+    await link.send({"type": "status_resync"})
+
+async def on_controller_disconnect(link: ControllerSubscription):
+    if link.gate_id == CONTROLLER_GATE_ID:
+        system_status.controller_connected = False
+        system_status.arduino = False
+        system_status.card_reader = False
+
+async def on_controller_hardware_status(link: ControllerSubscription, message: dict):
+    """hardware_status / hardware_status_patch: terapkan ke replica gate lalu terbitkan"""
+    replica = controller_replicas.setdefault(link.gate_id, StatusReplica())
+    if not replica.apply(message):
+        # Versi terlewat: minta snapshot ulang; patch diabaikan sampai snapshot tiba
+        if replica.request_resync():
+            await link.send({"type": "status_resync"})
+        return
+
+    if link.gate_id != CONTROLLER_GATE_ID:
+        # Gate lain: status penuh dengan gate_id (kelas status, client lambat hanya dapat yang terbaru)
+        manager.broadcaster.broadcast(
+            {"type": "gate_hardware_status", "gate_id": link.gate_id, "payload": replica.state}, STATUS
+        )
+        return
 
-async def listen_to_controller_task():
-    """Menghubungkan ke WebSocket controller dan meneruskan pesan ke frontend."""
-    controller_ws_url = f"ws://{CONTROLLER_HOST}:{CONTROLLER_PORT}/ws"
-    while True:
-        try:
-            async with websockets.connect(controller_ws_url) as websocket:
-                logger.info(f"✅ Terhubung ke WebSocket Controller di {controller_ws_url}")
-                system_status.controller_connected = True
-                while True:
-                    message_str = await websocket.recv()
-                    message = json.loads(message_str)
-                    logger.debug(f"Menerima dari Controller: {message}")
-
-                    # Teruskan pesan hardware_status langsung ke semua klien frontend
-                    if message.get("type") == "hardware_status":
-                        await manager.broadcast(json.dumps(message))
-                        
-                        # Update status global di backend juga
-                        payload = message.get("payload", {})
-                        system_status.arduino = payload.get("arduino", {}).get("connected", False)
-                        system_status.card_reader = payload.get("card_reader", {}).get("connected", False)
-                        system_status.gate_status = payload.get("arduino", {}).get("gate_status", "unknown").split(',')[0]
-
-        except (websockets.exceptions.ConnectionClosedError, ConnectionRefusedError) as e:
-            logger.warning(f"Koneksi ke Controller WebSocket terputus: {e}. Mencoba lagi dalam 5 detik...")
-            system_status.controller_connected = False
-            system_status.arduino = False
-            system_status.card_reader = False
-        except Exception as e:
-            logger.error(f"Error pada listener Controller WebSocket: {e}. Mencoba lagi dalam 5 detik...")
-        
-        await asyncio.sleep(5)
+    # Terbitkan ke frontend: patch ke client delta, snapshot ke client lama
+    status_publisher.publish(replica.state)
+
+    # Update status global di backend juga
+    payload = replica.state
+    system_status.arduino = payload.get("arduino", {}).get("connected", False)
+    system_status.card_reader = payload.get("card_reader", {}).get("connected", False)
+    system_status.gate_status = payload.get("arduino", {}).get("gate_status", "unknown").split(',')[0]
+
+async def on_controller_event(link: ControllerSubscription, message: dict):
+    """Tipe pesan lain (event kartu, gate, log, ...): teruskan ke frontend dengan gate asalnya"""
+    manager.broadcaster.broadcast({**message, "gate_id": message.get("gate_id") or link.gate_id})
+
+controller_subscriptions.route("hardware_status", on_controller_hardware_status)
+controller_subscriptions.route("hardware_status_patch", on_controller_hardware_status)
+controller_subscriptions.route(ANY, on_controller_event)
+controller_subscriptions.on_connect = on_controller_connect
+controller_subscriptions.on_disconnect = on_controller_disconnect
 
 @app.get("/")
 async def root():
@@ -300,10 +348,12 @@ async def websocket_endpoint(websocket: WebSocket):
             
     except WebSocketDisconnect:
         manager.disconnect(websocket)
+        status_publisher.remove(websocket)
         logger.info("Frontend client disconnected")
     except Exception as e:
         logger.error(f"Frontend WebSocket error: {e}")
         manager.disconnect(websocket)
+        status_publisher.remove(websocket)
 
 @app.websocket("/ws/camera")
 async def camera_websocket_endpoint(websocket: WebSocket):
@@ -393,6 +443,10 @@ async def handle_websocket_message(message: dict, websocket: WebSocket):
             )
             return
             
+        elif message_type == "status_resync":
+            # Client delta: snapshot penuh + versi, setelah itu hanya patch
+            status_publisher.resync(websocket)
+            
         elif message_type == "request_camera_stream":
             if camera_controller:
                 await camera_controller.start_stream()
@@ -481,7 +535,7 @@ async def control_gate_api(request: GateControlRequest):
         logger.info(f"Gate control request: {request.action} for {request.gate_id}")
         
         # Forward request ke controller
-        result = controller_client.send_gate_command(request.action, request.gate_id)
+        result = await controller_client.send_gate_command(request.action, request.gate_id)
         
         if "error" not in result:
             # Update local status
@@ -505,12 +559,17 @@ async def control_gate_api(request: GateControlRequest):
         logger.error(f"Error controlling gate: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+@app.get("/api/v1/controllers/links")
+async def get_controller_links():
+    """Statistik link WebSocket per gate controller (pesan/detik, reconnect, lag)"""
+    return controller_subscriptions.get_status()
+
 @app.get("/api/v1/system/status")
 async def get_system_status():
     """Get current system status (combined from backend and controller)"""
     try:
         # Get fresh status from controller
-        controller_status = controller_client.get_controller_status()
+        controller_status = await controller_client.get_controller_status()
         
         if "error" not in controller_status:
             hardware = controller_status.get("hardware", {})
@@ -810,11 +869,12 @@ async def debug_controller():
         logger.info("=== DEBUG: Testing controller communication ===")
         
         # Test controller status
-        controller_status = controller_client.get_controller_status()
+        controller_status = await controller_client.get_controller_status()
         
         debug_info = {
             "controller_url": CONTROLLER_URL,
             "controller_response": controller_status,
+            "controller_http": gate_http.get_status(),
             "backend_system_status": system_status.dict(),
             "timestamp": datetime.now().isoformat()
         }
@@ -833,12 +893,12 @@ async def debug_controller():
 @app.get("/debug/test-controller-direct")
 async def debug_test_controller_direct():
     """Debug endpoint untuk test controller langsung"""
-    import requests
     try:
-        response = requests.get("http://localhost:8001/api/status", timeout=5)
+        status, data = await gate_http.request(CONTROLLER_GATE_ID, "GET", "http://localhost:8001/api/status", "/api/status")
         return {
-            "status_code": response.status_code,
-            "response": response.json() if response.status_code == 200 else response.text,
+            "status_code": status,
+            "response": data,
+            "latency": gate_http.get_status()["gates"].get(CONTROLLER_GATE_ID),
             "timestamp": datetime.now().isoformat()
         }
     except Exception as e:
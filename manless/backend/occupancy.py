@@ -0,0 +1,255 @@
+"""
+Occupancy Service - Sistem Parkir Manless
+Counter okupansi per jenis kendaraan dan per zona, di-update O(1) setiap sesi dibuka/ditutup.
+
+Kapasitas dibaca dari system_config (di-cache, di-refresh saat rekonsiliasi):
+- max_parking_capacity      : kapasitas total
+- capacity_<vehicle_type>   : mis. capacity_car, capacity_motorcycle
+- zone_capacity_<zone>      : mis. zone_capacity_basement
+
+Rekonsiliasi periodik membandingkan counter dengan parking_sessions (status "parked").
+Jenis kendaraan kartu (tabel vehicles) di-cache singkat agar cek kapasitas per jenis kendaraan
+bisa dilakukan sebelum palang dibuka.
+"""
+
+import asyncio
+import logging
+import time
+from collections import Counter, OrderedDict
+from datetime import datetime
+from typing import Dict, Optional
+
+from sqlalchemy import func
+
+from app.database.database import SessionLocal
+from app.database.model import ParkingSession, SystemConfig, Vehicle
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_VEHICLE_TYPE = "car"
+DEFAULT_ZONE = "main"
+DEFAULT_CAPACITY = 100
+VEHICLE_TYPE_TTL = 300.0     # Umur cache jenis kendaraan per kartu (detik)
+VEHICLE_TYPE_CACHE_SIZE = 10000
+
+class OccupancyService:
+    """Counter okupansi in-memory dengan kapasitas dari system_config"""
+
+    def __init__(self, reconcile_interval: float = 60.0):
+        self.reconcile_interval = reconcile_interval
+        self.total = 0
+        self.by_type: Counter = Counter()
+        self.by_zone: Counter = Counter()
+
+        self.capacity_total = DEFAULT_CAPACITY
+        self.capacity_by_type: Dict[str, int] = {}
+        self.capacity_by_zone: Dict[str, int] = {}
+
+        self.loaded = False
+        self.last_reconcile: Optional[str] = None
+        self._mutations = 0  # Naik setiap open/close; rekonsiliasi hanya diterapkan jika tidak berubah
+        self._task: Optional[asyncio.Task] = None
+        self._vehicle_types: "OrderedDict[str, tuple]" = OrderedDict()  # card_id -> (expires_at, jenis)
+        self.stats = {"reconciles": 0, "drift_corrections": 0, "skipped_reconciles": 0}
+
+    async def start(self, sessions: Dict[str, dict], flush=None, pending=None):
+        """Bangun counter dari sesi aktif, muat kapasitas, lalu jalankan rekonsiliasi periodik"""
+        self.rebuild(sessions.values())
+        try:
+            await asyncio.to_thread(self._load_capacities)
+        except Exception as e:
+            logger.error(f"Failed to load capacity config, using defaults: {e}")
+        self.loaded = True
+        self._task = asyncio.create_task(self._reconcile_loop(flush, pending))
+        logger.info(f"Occupancy service started: {self.total}/{self.capacity_total}")
+
+    async def stop(self):
+        if self._task:
+            self._task.cancel()
+            self._task = None
+
+    # ========================================
+    # HOT PATH (O(1))
+    # ========================================
+
+    def on_open(self, session: dict):
+        """Sesi baru dibuka (entry)"""
+        self._apply(session, 1)
+
+    def on_close(self, session: dict):
+        """Sesi ditutup (exit/force exit)"""
+        self._apply(session, -1)
+
+    def _apply(self, session: dict, delta: int):
+        vehicle_type = session.get("vehicle_type") or DEFAULT_VEHICLE_TYPE
+        zone = session.get("zone") or DEFAULT_ZONE
+        self.total = max(0, self.total + delta)
+        self.by_type[vehicle_type] = max(0, self.by_type[vehicle_type] + delta)
+        self.by_zone[zone] = max(0, self.by_zone[zone] + delta)
+        self._mutations += 1
+
+    def is_full(self, vehicle_type: Optional[str] = None, zone: Optional[str] = None) -> bool:
+        """True jika total, jenis kendaraan, atau zona sudah mencapai kapasitas"""
+        if self.total >= self.capacity_total:
+            return True
+        if vehicle_type and vehicle_type in self.capacity_by_type:
+            if self.by_type[vehicle_type] >= self.capacity_by_type[vehicle_type]:
+                return True
+        if zone and zone in self.capacity_by_zone:
+            if self.by_zone[zone] >= self.capacity_by_zone[zone]:
+                return True
+        return False
+
+    async def vehicle_type_for(self, card_id: str) -> str:
+        """Jenis kendaraan terdaftar untuk kartu (cache, lalu tabel vehicles); default jika tidak ada"""
+        now = time.monotonic()
+        entry = self._vehicle_types.get(card_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+        try:
+            vehicle_type = await asyncio.to_thread(self._load_vehicle_type, card_id)
+        except Exception as e:
+            logger.error(f"Failed to resolve vehicle type for {card_id}: {e}")
+            return DEFAULT_VEHICLE_TYPE  # Tidak di-cache: coba lagi di entry berikutnya
+        vehicle_type = vehicle_type or DEFAULT_VEHICLE_TYPE
+        self._vehicle_types.pop(card_id, None)
+        self._vehicle_types[card_id] = (now + VEHICLE_TYPE_TTL, vehicle_type)
+        while len(self._vehicle_types) > VEHICLE_TYPE_CACHE_SIZE:
+            self._vehicle_types.popitem(last=False)
+        return vehicle_type
+
+    def snapshot(self) -> dict:
+        """Ringkasan kapasitas untuk API/status"""
+        def breakdown(counts: Counter, capacities: Dict[str, int]) -> dict:
+            result = {}
+            for key in set(counts) | set(capacities):
+                capacity = capacities.get(key)
+                result[key] = {
+                    "occupied": counts[key],
+                    "capacity": capacity,
+                    "available": max(0, capacity - counts[key]) if capacity is not None else None,
+                    "full": capacity is not None and counts[key] >= capacity
+                }
+            return result
+
+        return {
+            "total_capacity": self.capacity_total,
+            "occupied": self.total,
+            "available": max(0, self.capacity_total - self.total),
+            "occupancy_rate": (self.total / self.capacity_total) * 100 if self.capacity_total else 0,
+            "full": self.total >= self.capacity_total,
+            "by_vehicle_type": breakdown(self.by_type, self.capacity_by_type),
+            "by_zone": breakdown(self.by_zone, self.capacity_by_zone),
+            "last_reconcile": self.last_reconcile
+        }
+
+    # ========================================
+    # REKONSILIASI DAN KONFIGURASI
+    # ========================================
+
+    def rebuild(self, sessions):
+        """Hitung ulang counter dari daftar sesi aktif"""
+        self.total = 0
+        self.by_type = Counter()
+        self.by_zone = Counter()
+        for session in sessions:
+            self._apply(session, 1)
+
+    async def _reconcile_loop(self, flush, pending):
+        while True:
+            await asyncio.sleep(self.reconcile_interval)
+            try:
+                await self.reconcile(flush, pending)
+            except asyncio.CancelledError:
+                raise
+            except Exception as e:
+                logger.error(f"Occupancy reconcile failed: {e}")
+
+    async def reconcile(self, flush=None, pending=None):
+        """Bandingkan counter dengan database dan koreksi drift; kapasitas ikut di-refresh
+
+        flush   : tulis perubahan write-behind ke database (False = gagal)
+        pending : sesi yang belum pasti tersimpan (dirty + sedang ditulis)
+        Koreksi dilewati jika database belum memuat semua perubahan, karena hitungan
+        database saat itu lebih lama dari counter di memori.
+        """
+        flushed = await flush() if flush is not None else True
+        unsaved = pending is not None and bool(pending())
+        mutations = self._mutations
+        counts = await asyncio.to_thread(self._count_parked)
+        await asyncio.to_thread(self._load_capacities)
+
+        if not flushed or unsaved or mutations != self._mutations:
+            # Flush gagal, write-behind masih berjalan, atau ada entry/exit selama query: coba lagi nanti
+            self.stats["skipped_reconciles"] += 1
+            return
+
+        total, by_type, by_zone = counts
+        if total != self.total or by_type != +self.by_type or by_zone != +self.by_zone:
+            logger.warning(f"Occupancy drift corrected: memory {self.total}, database {total}")
+            self.total, self.by_type, self.by_zone = total, by_type, by_zone
+            self.stats["drift_corrections"] += 1
+        self.stats["reconciles"] += 1
+        self.last_reconcile = datetime.now().isoformat()
+
+    def _count_parked(self):
+        """Hitung sesi parked per jenis kendaraan dan zona (dijalankan di thread)"""
+        db = SessionLocal()
+        try:
+            rows = (
+                db.query(ParkingSession.vehicle_type, ParkingSession.zone, func.count(ParkingSession.id))
+                .filter(ParkingSession.status == "parked")
+                .group_by(ParkingSession.vehicle_type, ParkingSession.zone)
+                .all()
+            )
+        finally:
+            db.close()
+
+        by_type, by_zone = Counter(), Counter()
+        for vehicle_type, zone, count in rows:
+            by_type[vehicle_type or DEFAULT_VEHICLE_TYPE] += count
+            by_zone[zone or DEFAULT_ZONE] += count
+        return sum(by_type.values()), by_type, by_zone
+
+    def _load_vehicle_type(self, card_id: str) -> Optional[str]:
+        """Jenis kendaraan aktif yang terdaftar dengan kartu (dijalankan di thread)"""
+        db = SessionLocal()
+        try:
+            row = (
+                db.query(Vehicle.vehicle_type)
+                .filter(Vehicle.card_id == card_id, Vehicle.is_active == True)
+                .first()
+            )
+        finally:
+            db.close()
+        return row[0] if row else None
+
+    def _load_capacities(self):
+        """Baca kapasitas dari system_config (dijalankan di thread)"""
+        db = SessionLocal()
+        try:
+            rows = db.query(SystemConfig).filter(
+                (SystemConfig.config_key == "max_parking_capacity")
+                | SystemConfig.config_key.like("capacity_%")
+                | SystemConfig.config_key.like("zone_capacity_%")
+            ).all()
+        finally:
+            db.close()
+
+        by_type, by_zone = {}, {}
+        for row in rows:
+            try:
+                value = int(row.config_value)
+            except ValueError:
+                logger.warning(f"Invalid capacity config {row.config_key}={row.config_value}")
+                continue
+            if row.config_key == "max_parking_capacity":
+                self.capacity_total = value
+            elif row.config_key.startswith("zone_capacity_"):
+                by_zone[row.config_key[len("zone_capacity_"):]] = value
+            elif row.config_key.startswith("capacity_"):
+                by_type[row.config_key[len("capacity_"):]] = value
+        self.capacity_by_type, self.capacity_by_zone = by_type, by_zone
+
+# Global instance
+occupancy_service = OccupancyService()
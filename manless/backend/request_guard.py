@@ -0,0 +1,78 @@
+"""
+Request Guard - Sistem Parkir Manless
+Serialisasi per kartu dan cache idempotency untuk proses entry/exit di GateCoordinator.
+
+KeyedLocks      : satu asyncio.Lock per key (card_id); entri dihapus saat tidak ada pemakai,
+                  sehingga memori sebanding dengan jumlah kartu yang sedang diproses.
+IdempotencyCache: hasil request per idempotency key disimpan singkat (TTL + batas ukuran),
+                  sehingga retry mendapat hasil pertama tanpa memproses ulang.
+"""
+
+import asyncio
+import time
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+class KeyedLocks:
+    """Lock async per key dengan reference count"""
+
+    def __init__(self):
+        self._locks: Dict[str, list] = {}  # key -> [lock, jumlah pemakai]
+        self.contended = 0
+
+    @asynccontextmanager
+    async def lock(self, key: str):
+        entry = self._locks.get(key)
+        if entry is None:
+            entry = self._locks[key] = [asyncio.Lock(), 0]
+        elif entry[0].locked():
+            self.contended += 1
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                yield
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                del self._locks[key]
+
+    def __len__(self) -> int:
+        return len(self._locks)
+
+class IdempotencyCache:
+    """Cache hasil request per idempotency key dengan TTL dan ukuran maksimal"""
+
+    def __init__(self, ttl: float = 300.0, max_size: int = 10000):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()  # key -> (expires_at, result)
+        self.stats = {"hits": 0, "stores": 0}
+
+    def get(self, key: str) -> Optional[dict]:
+        self._expire()
+        entry = self._entries.get(key)
+        if entry is None:
+            return None
+        self.stats["hits"] += 1
+        return entry[1]
+
+    def put(self, key: str, result: dict):
+        self._entries.pop(key, None)
+        self._entries[key] = (time.monotonic() + self.ttl, result)
+        self.stats["stores"] += 1
+        while len(self._entries) > self.max_size:
+            self._entries.popitem(last=False)
+
+    def _expire(self):
+        # Entri tersusun menurut waktu simpan, jadi yang kedaluwarsa selalu di depan
+        now = time.monotonic()
+        while self._entries:
+            key, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now:
+                break
+            del self._entries[key]
+
+    def get_status(self) -> dict:
+        self._expire()
+        return {"entries": len(self._entries), **self.stats}
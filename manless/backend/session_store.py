@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Session Store - Sesi parkir aktif untuk GateCoordinator
+Sistem Parkir Manless
+
+Index utama ada di memori (card_id -> session) sehingga lookup entry/exit tetap O(1).
+Setiap perubahan ditandai dirty dan ditulis ke tabel parking_sessions oleh task
+write-behind, di luar jalur kritis. Saat start, hanya sesi yang masih "parked" dimuat,
+atau state dipulihkan dari snapshot + replay event journal (restore()).
+"""
+
+import asyncio
+import logging
+import uuid
+from datetime import datetime
+from typing import Dict, Optional
+
+from app.database.database import SessionLocal
+from app.database.model import ParkingSession
+
+logger = logging.getLogger(__name__)
+
+# Kolom yang disimpan dari dict sesi ke tabel parking_sessions
+_DATETIME_FIELDS = ("entry_time", "exit_time")
+_PLAIN_FIELDS = ("card_id", "license_plate", "vehicle_type", "zone", "status", "entry_gate", "exit_gate",
+                 "payment_amount", "payment_method", "reason")
+
+class SessionStore:
+    """Store sesi parkir in-memory dengan persistensi write-behind"""
+
+    def __init__(self, flush_interval: float = 0.5, retry_delay: float = 5.0):
+        self.flush_interval = flush_interval
+        self.retry_delay = retry_delay
+
+        self._active: Dict[str, dict] = {}   # card_id -> sesi yang masih parked
+        self._dirty: Dict[str, dict] = {}    # session_id -> snapshot yang belum tersimpan
+        self._inflight: Dict[str, dict] = {} # Batch yang sedang ditulis ke database
+        self._dirty_event = asyncio.Event()
+        self._writer_task: Optional[asyncio.Task] = None
+        self.stats = {"flushes": 0, "rows_written": 0, "flush_failures": 0, "recovered": 0}
+
+    async def initialize(self, load: bool = True):
+        """Muat sesi yang masih terbuka (kecuali sudah di-restore) lalu jalankan writer write-behind"""
+        if load:
+            try:
+                recovered = await asyncio.to_thread(self._load_open_sessions)
+                self._active.update(recovered)
+                self.stats["recovered"] = len(recovered)
+                logger.info(f"Session store recovered {len(recovered)} open session(s)")
+            except Exception as e:
+                logger.error(f"Failed to recover parking sessions: {e}")
+
+        self._writer_task = asyncio.create_task(self._writer_loop())
+
+    async def shutdown(self):
+        """Hentikan writer dan tulis semua perubahan yang tersisa"""
+        if self._writer_task:
+            self._writer_task.cancel()
+            self._writer_task = None
+        await self.flush()
+
+    # ========================================
+    # HOT PATH (in-memory)
+    # ========================================
+
+    def __contains__(self, card_id: str) -> bool:
+        return card_id in self._active
+
+    def __len__(self) -> int:
+        return len(self._active)
+
+    def get(self, card_id: str) -> Optional[dict]:
+        """Sesi aktif untuk kartu, atau None"""
+        return self._active.get(card_id)
+
+    def open(self, card_id: str, session: dict) -> dict:
+        """Buat sesi aktif baru untuk kartu"""
+        session = {"session_id": uuid.uuid4().hex, "card_id": card_id, **session}
+        self._active[card_id] = session
+        self._mark_dirty(session)
+        return session
+
+    def close(self, card_id: str, updates: dict) -> Optional[dict]:
+        """Tutup sesi aktif (exit/force exit) dan kembalikan sesi yang sudah selesai"""
+        session = self._active.pop(card_id, None)
+        if session is None:
+            return None
+        session.update(updates)
+        self._mark_dirty(session)
+        return session
+
+    def snapshot(self) -> Dict[str, dict]:
+        """Salinan dangkal sesi aktif untuk status/JSON"""
+        return dict(self._active)
+
+    def restore(self, active: Dict[str, dict], pending: list):
+        """Pulihkan sesi aktif dari journal; pending = sesi yang mungkin belum tersimpan di database"""
+        self._active = dict(active)
+        for session in pending:
+            self._mark_dirty(session)
+        self.stats["recovered"] = len(self._active)
+
+    def pending_writes(self) -> list:
+        """Sesi yang belum pasti tersimpan di database (dirty + sedang ditulis)"""
+        return list({**self._inflight, **self._dirty}.values())
+
+    def _mark_dirty(self, session: dict):
+        self._dirty[session["session_id"]] = dict(session)
+        self._dirty_event.set()
+
+    # ========================================
+    # WRITE-BEHIND
+    # ========================================
+
+    async def _writer_loop(self):
+        """Kumpulkan perubahan selama flush_interval lalu tulis dalam satu batch"""
+        while True:
+            await self._dirty_event.wait()
+            await asyncio.sleep(self.flush_interval)
+            if not await self.flush():
+                await asyncio.sleep(self.retry_delay)
+
+    async def flush(self) -> bool:
+        """Tulis semua sesi dirty ke database; gagal = dikembalikan ke antrean dirty"""
+        if not self._dirty:
+            self._dirty_event.clear()
+            return True
+
+        batch, self._dirty = self._dirty, {}
+        self._inflight.update(batch)
+        self._dirty_event.clear()
+
+        try:
+            await asyncio.to_thread(self._persist, list(batch.values()))
+            self.stats["flushes"] += 1
+            self.stats["rows_written"] += len(batch)
+            return True
+        except Exception as e:
+            self.stats["flush_failures"] += 1
+            logger.error(f"Failed to persist {len(batch)} parking session(s): {e}")
+            # Perubahan yang lebih baru (sudah ada di _dirty) tidak boleh ditimpa
+            for session_id, session in batch.items():
+                self._dirty.setdefault(session_id, session)
+            self._dirty_event.set()
+            return False
+        finally:
+            for session_id, session in batch.items():
+                if self._inflight.get(session_id) is session:
+                    del self._inflight[session_id]
+
+    def _persist(self, sessions: list):
+        """Upsert batch sesi (dijalankan di thread)"""
+        db = SessionLocal()
+        try:
+            session_ids = [session["session_id"] for session in sessions]
+            existing = {
+                row.session_id: row
+                for row in db.query(ParkingSession).filter(ParkingSession.session_id.in_(session_ids))
+            }
+            for session in sessions:
+                row = existing.get(session["session_id"])
+                if row is None:
+                    row = ParkingSession(session_id=session["session_id"])
+                    db.add(row)
+                for field in _PLAIN_FIELDS:
+                    setattr(row, field, session.get(field))
+                for field in _DATETIME_FIELDS:
+                    value = session.get(field)
+                    setattr(row, field, datetime.fromisoformat(value) if isinstance(value, str) else value)
+            db.commit()
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _load_open_sessions(self) -> Dict[str, dict]:
+        """Baca hanya sesi yang masih parked (dijalankan di thread)"""
+        db = SessionLocal()
+        try:
+            rows = db.query(ParkingSession).filter(ParkingSession.status == "parked").all()
+            return {
+                row.card_id: {
+                    "session_id": row.session_id,
+                    "card_id": row.card_id,
+                    "entry_time": row.entry_time.isoformat(),
+                    "entry_gate": row.entry_gate,
+                    "license_plate": row.license_plate,
+                    "vehicle_type": row.vehicle_type,
+                    "zone": row.zone,
+                    "status": row.status
+                }
+                for row in rows
+            }
+        finally:
+            db.close()
+
+    def get_status(self) -> dict:
+        """Status store untuk API/status"""
+        return {
+            "active": len(self._active),
+            "pending_writes": len(self._dirty),
+            **self.stats
+        }
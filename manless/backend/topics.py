@@ -0,0 +1,118 @@
+"""
+Topic Index - Sistem Parkir Manless
+Subscription topic untuk WebSocket frontend, diindeks sebagai trie per segmen.
+
+Topic dipisah titik, mis. "gate.gate_in.events", "gate.gate_out.status", "camera.gate_out.thumb".
+Pattern subscription:
+- "*" cocok dengan tepat satu segmen     : "gate.*.status"
+- "#" cocok dengan nol atau lebih segmen : "gate.gate_in.#", "#" (semua topic); hanya di akhir
+
+match(topic) hanya menelusuri cabang trie yang cocok, sehingga biaya publish bergantung pada
+kedalaman topic dan jumlah subscriber yang cocok, bukan jumlah seluruh koneksi.
+Hasil match di-cache per topic dan dibuang setiap kali subscription berubah.
+"""
+
+from typing import Dict, Hashable, List, Set
+
+MULTI = "#"
+SINGLE = "*"
+
+class _Node:
+    __slots__ = ("children", "subscribers")
+
+    def __init__(self):
+        self.children: Dict[str, "_Node"] = {}
+        self.subscribers: Set[Hashable] = set()
+
+def validate_pattern(pattern: str) -> List[str]:
+    """Pecah pattern menjadi segmen; ValueError jika formatnya salah"""
+    segments = pattern.split(".") if isinstance(pattern, str) else []
+    if not segments or any(not segment for segment in segments):
+        raise ValueError(f"Invalid topic pattern: {pattern!r}")
+    if MULTI in segments[:-1]:
+        raise ValueError(f"'#' is only allowed as the last segment: {pattern!r}")
+    return segments
+
+class TopicIndex:
+    """Trie pattern topic -> subscriber"""
+
+    def __init__(self):
+        self._root = _Node()
+        self._patterns: Dict[Hashable, Set[str]] = {}  # subscriber -> pattern miliknya
+        self._cache: Dict[str, frozenset] = {}
+
+    def subscribe(self, subscriber: Hashable, pattern: str):
+        segments = validate_pattern(pattern)
+        node = self._root
+        for segment in segments:
+            node = node.children.setdefault(segment, _Node())
+        node.subscribers.add(subscriber)
+        self._patterns.setdefault(subscriber, set()).add(pattern)
+        self._cache.clear()
+
+    def unsubscribe(self, subscriber: Hashable, pattern: str):
+        patterns = self._patterns.get(subscriber)
+        if not patterns or pattern not in patterns:
+            return
+        patterns.discard(pattern)
+        if not patterns:
+            del self._patterns[subscriber]
+        self._remove(self._root, pattern.split("."), subscriber)
+        self._cache.clear()
+
+    def unsubscribe_all(self, subscriber: Hashable):
+        for pattern in list(self._patterns.get(subscriber, ())):
+            self.unsubscribe(subscriber, pattern)
+
+    def _remove(self, node: _Node, segments: List[str], subscriber: Hashable) -> bool:
+        """Hapus subscriber di ujung path; node kosong dipangkas. True = node ini kosong"""
+        if segments:
+            child = node.children.get(segments[0])
+            if child is not None and self._remove(child, segments[1:], subscriber):
+                del node.children[segments[0]]
+        else:
+            node.subscribers.discard(subscriber)
+        return not node.children and not node.subscribers
+
+    def patterns(self, subscriber: Hashable) -> List[str]:
+        return sorted(self._patterns.get(subscriber, ()))
+
+    def match(self, topic: str) -> frozenset:
+        """Semua subscriber dengan pattern yang cocok dengan topic"""
+        cached = self._cache.get(topic)
+        if cached is not None:
+            return cached
+
+        result: Set[Hashable] = set()
+        nodes = [self._root]
+        for segment in topic.split("."):
+            next_nodes = []
+            for node in nodes:
+                multi = node.children.get(MULTI)
+                if multi is not None:
+                    result |= multi.subscribers
+                for key in (segment, SINGLE):
+                    child = node.children.get(key)
+                    if child is not None:
+                        next_nodes.append(child)
+            nodes = next_nodes
+            if not nodes:
+                break
+        for node in nodes:
+            result |= node.subscribers
+            multi = node.children.get(MULTI)  # "#" juga cocok dengan nol segmen
+            if multi is not None:
+                result |= multi.subscribers
+
+        matched = self._cache[topic] = frozenset(result)
+        return matched
+
+    def __len__(self) -> int:
+        return len(self._patterns)
+
+    def get_status(self) -> dict:
+        return {
+            "subscribers": len(self._patterns),
+            "subscriptions": sum(len(patterns) for patterns in self._patterns.values()),
+            "cached_topics": len(self._cache)
+        }
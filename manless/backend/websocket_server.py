@@ -11,6 +11,9 @@ from typing import Dict, List, Set
 from fastapi import WebSocket, WebSocketDisconnect
 from pydantic import BaseModel
 
+from broadcaster import Broadcaster
+from json_encoder import encode_message
+
 # Setup logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -19,37 +22,31 @@ class WebSocketChannel:
     """Kelas untuk mengelola channel WebSocket berbeda"""
     def __init__(self, name: str):
         self.name = name
-        self.connections: Set[WebSocket] = set()
+        self.broadcaster = Broadcaster(name)  # Antrean keluar + writer per client
+        
+    @property
+    def connections(self) -> Broadcaster:
+        return self.broadcaster
         
     async def connect(self, websocket: WebSocket):
         """Tambahkan koneksi ke channel"""
         await websocket.accept()
-        self.connections.add(websocket)
+        self.broadcaster.add(websocket)
         logger.info(f"WebSocket connected to channel '{self.name}'. Total: {len(self.connections)}")
         
     def disconnect(self, websocket: WebSocket):
         """Hapus koneksi dari channel"""
-        self.connections.discard(websocket)
+        self.broadcaster.remove(websocket)
         logger.info(f"WebSocket disconnected from channel '{self.name}'. Total: {len(self.connections)}")
         
-    async def broadcast(self, message: dict):
-        """Broadcast pesan ke semua koneksi di channel"""
+    async def broadcast(self, message: dict, encoded: str = None):
+        """Broadcast pesan ke semua koneksi di channel (antre per client, tidak menunggu pengiriman)
+
+        encoded: teks JSON dari pesan yang sama jika sudah di-encode (relay ke beberapa channel).
+        """
         if not self.connections:
             return
-            
-        disconnected = []
-        message_str = json.dumps(message)
-        
-        for websocket in self.connections:
-            try:
-                await websocket.send_text(message_str)
-            except Exception as e:
-                logger.error(f"Error broadcasting to {self.name}: {e}")
-                disconnected.append(websocket)
-        
-        # Hapus koneksi yang terputus
-        for websocket in disconnected:
-            self.disconnect(websocket)
+        self.broadcaster.broadcast(encoded or encode_message(message), self.broadcaster.classify(message))
             
     async def send_to_websocket(self, websocket: WebSocket, message: dict):
         """Kirim pesan ke WebSocket spesifik"""
@@ -77,6 +74,9 @@ class WebSocketManager:
         # Track controller connections
         self.controller_connections: Dict[str, WebSocket] = {}
         
+        # Posisi terakhir yang sudah diproses per gate: {"epoch", "seq" (link), "id" (control)}
+        self.controller_positions: Dict[str, dict] = {}
+        
     def get_channel(self, channel_name: str) -> WebSocketChannel:
         """Dapatkan channel berdasarkan nama"""
         return self.channels.get(channel_name)
@@ -88,9 +88,15 @@ class WebSocketManager:
         logger.info(f"Controller {gate_id} connected")
         
         try:
+            # Controller melanjutkan dari posisi ini (replay) atau mengirim resync
+            position = self.controller_positions.get(gate_id, {})
+            await websocket.send_text(json.dumps({
+                "type": "resume",
+                "payload": {"epoch": position.get("epoch"), "seq": position.get("seq", 0)}
+            }))
             while True:
                 data = await websocket.receive_text()
-                await self.process_controller_message(gate_id, json.loads(data))
+                await self.process_controller_frame(websocket, gate_id, json.loads(data))
         except WebSocketDisconnect:
             logger.info(f"Controller {gate_id} disconnected")
             self.controller_connections.pop(gate_id, None)
@@ -98,6 +104,35 @@ class WebSocketManager:
             logger.error(f"Error handling controller {gate_id}: {e}")
             self.controller_connections.pop(gate_id, None)
     
+    async def process_controller_frame(self, websocket: WebSocket, gate_id: str, frame: dict):
+        """Proses satu frame controller (pesan tunggal, batch, atau resync) lalu kirim ack kumulatif"""
+        if frame.get("type") in ("batch", "resync"):
+            messages = frame.get("payload", {}).get("messages", [])
+            if frame["type"] == "resync":
+                logger.info(f"Controller {gate_id} resync: {len(messages)} status snapshot(s)")
+        else:
+            messages = [frame]
+        
+        position = self.controller_positions.get(gate_id)
+        for message in messages:
+            seq = message.get("seq")
+            if seq is not None:
+                if position is None or message.get("epoch") != position["epoch"]:
+                    # Outbox baru di controller: mulai posisi dari awal
+                    position = self.controller_positions[gate_id] = {"epoch": message.get("epoch"), "seq": 0, "id": 0}
+                if seq <= position["seq"]:
+                    continue  # Replay yang sudah diproses
+                position["seq"] = seq
+                message_id = message.get("id")
+                if message_id is not None:
+                    if message_id <= position["id"]:
+                        continue  # Control yang dikirim ulang setelah resync
+                    position["id"] = message_id
+            await self.process_controller_message(gate_id, message)
+        
+        if position is not None:
+            await websocket.send_text(json.dumps({"type": "ack", "payload": {"seq": position["seq"]}}))
+    
     async def process_controller_message(self, gate_id: str, message: dict):
         """Proses pesan dari controller dan relay ke frontend"""
         message_type = message.get("type")
@@ -129,11 +164,12 @@ class WebSocketManager:
             "timestamp": datetime.now().isoformat()
         }
         
-        # Kirim ke channel yang sesuai
+        # Kirim ke channel yang sesuai (di-encode sekali untuk semua channel)
+        encoded = encode_message(relay_message)
         for channel_name in target_channels:
             channel = self.get_channel(channel_name)
             if channel:
-                await channel.broadcast(relay_message)
+                await channel.broadcast(relay_message, encoded)
                 
         logger.info(f"Relayed message from {gate_id} to channels: {target_channels}")
     
@@ -7,25 +7,21 @@ from datetime import datetime, date
 from typing import Any, Dict
 from fastapi import WebSocket
 
+from json_encoder import encode_message
+
 def safe_json_dumps(data: Any) -> str:
     """Safely serialize data to JSON string, handling datetime objects"""
-    def json_serializer(obj):
-        if isinstance(obj, (datetime, date)):
-            return obj.isoformat()
-        raise TypeError(f"Object of type {type(obj)} is not JSON serializable")
-    
-    return json.dumps(data, default=json_serializer, ensure_ascii=False)
+    return encode_message(data)
 
 async def safe_websocket_send_json(websocket: WebSocket, data: Dict[str, Any]) -> None:
     """Safely send JSON data via WebSocket, handling datetime serialization"""
     try:
-        # Convert any datetime objects to ISO format strings
-        safe_data = convert_datetime_to_string(data)
-        await websocket.send_json(safe_data)
+        # Datetime dkk. dikonversi saat encode, tanpa menyalin objek lebih dulu
+        await websocket.send_text(encode_message(data))
     except Exception as e:
-        # Fallback: send as text
+        # Fallback: kirim tipe yang tidak dikenal sebagai string
         try:
-            json_str = safe_json_dumps(data)
+            json_str = json.dumps(convert_datetime_to_string(data), default=str, ensure_ascii=False)
             await websocket.send_text(json_str)
         except Exception as fallback_error:
             # Last resort: send error message
@@ -0,0 +1,248 @@
+"""
+Broadcaster WebSocket - Sistem Parkir Manless
+Broadcast ke banyak client tanpa menunggu client yang lambat.
+
+Setiap client punya antrean keluar terbatas dan satu writer task; broadcast() hanya
+memasukkan pesan ke antrean setiap client (O(client), tanpa await), sehingga satu browser
+yang macet tidak menunda event untuk client lain. Pesan di-encode ke JSON satu kali per
+broadcast (json_encoder.encode_message) dan teks yang sama dikirim ke setiap client;
+string dianggap sudah di-encode.
+
+Kebijakan saat antrean penuh (per kelas pesan):
+- status   : pesan status tertua di antrean dibuang (status terbaru menggantikan yang lama)
+- critical : jika tidak ada pesan status yang bisa dibuang, client diputus (backlog event penting);
+             client akan reconnect dan meminta status ulang
+
+Coalescing (opt-in per client, set_batching): writer menunggu coalesce_window setelah pesan
+pertama lalu mengirim semua pesan yang antre sebagai satu frame array JSON. Pesan status dengan
+key yang sama di dalam satu window diciutkan; hanya yang terbaru yang dikirim.
+"""
+
+import asyncio
+import logging
+from collections import deque
+from typing import Dict, Iterable, Optional, Union
+
+from fastapi import WebSocket
+
+from json_encoder import encode_message
+
+logger = logging.getLogger(__name__)
+
+# Pesan yang boleh dibuang saat client tertinggal (selalu ada versi yang lebih baru)
+DEFAULT_STATUS_TYPES = frozenset({
+    "hardware_status", "hardware_status_patch", "system_status", "gate_status", "gate_status_changed",
+    "camera_status_update", "camera_frame", "all_status", "heartbeat"
+})
+
+# Status yang boleh diciutkan dalam satu window (patch bertingkat tidak boleh: versi akan bolong)
+DEFAULT_COLLAPSE_TYPES = DEFAULT_STATUS_TYPES - {"hardware_status_patch"}
+
+STATUS = "status"
+CRITICAL = "critical"
+
+class ClientQueue:
+    """Antrean keluar dan writer untuk satu client"""
+
+    def __init__(self, websocket: WebSocket, max_size: int):
+        self.websocket = websocket
+        self.max_size = max_size
+        self.messages: deque = deque()  # (kelas, teks JSON, key coalescing)
+        self.ready = asyncio.Event()
+        self.writer: Optional[asyncio.Task] = None
+        self.closed = False
+        self.batching = False
+        self.stats = {"sent": 0, "frames": 0, "collapsed": 0, "dropped": 0, "max_depth": 0}
+
+    @property
+    def label(self) -> str:
+        client = getattr(self.websocket, "client", None)
+        return f"{client.host}:{client.port}" if client else str(id(self.websocket))
+
+    def offer(self, message_class: str, message, key: str = None) -> bool:
+        """Masukkan pesan; False = antrean penuh dan tidak ada yang bisa dibuang (client harus diputus)"""
+        if len(self.messages) >= self.max_size and not self._drop_oldest_status(message_class):
+            return message_class == STATUS  # Status baru dibuang saja; critical -> putus
+        self.messages.append((message_class, message, key))
+        self.stats["max_depth"] = max(self.stats["max_depth"], len(self.messages))
+        self.ready.set()
+        return True
+
+    def _drop_oldest_status(self, message_class: str) -> bool:
+        for index, (queued_class, _, _) in enumerate(self.messages):
+            if queued_class == STATUS:
+                del self.messages[index]
+                self.stats["dropped"] += 1
+                return True
+        if message_class == STATUS:
+            self.stats["dropped"] += 1  # Pesan status baru yang tidak muat
+        return False
+
+    def take_batch(self) -> str:
+        """Kosongkan antrean menjadi satu frame array; status dengan key sama hanya yang terbaru"""
+        seen, kept = set(), []
+        for _, data, key in reversed(self.messages):
+            if key is not None:
+                if key in seen:
+                    continue
+                seen.add(key)
+            kept.append(data)
+        self.stats["collapsed"] += len(self.messages) - len(kept)
+        self.messages.clear()
+        kept.reverse()
+        self.stats["sent"] += len(kept)
+        return "[" + ",".join(kept) + "]"  # Teks sudah di-encode, cukup digabung
+
+    def get_status(self) -> dict:
+        return {"client": self.label, "depth": len(self.messages), "batching": self.batching, **self.stats}
+
+class Broadcaster:
+    """Kumpulan client WebSocket dengan antrean keluar per client"""
+
+    def __init__(self, name: str = "ws", max_queue: int = 256, send_timeout: float = 5.0,
+                 status_types: Iterable[str] = DEFAULT_STATUS_TYPES, coalesce_window: float = 0.05,
+                 collapse_types: Iterable[str] = DEFAULT_COLLAPSE_TYPES):
+        self.name = name
+        self.max_queue = max_queue
+        self.send_timeout = send_timeout
+        self.status_types = frozenset(status_types)
+        self.coalesce_window = coalesce_window
+        self.collapse_types = frozenset(collapse_types)
+        self._clients: Dict[WebSocket, ClientQueue] = {}
+        self.stats = {"broadcasts": 0, "encodes": 0, "slow_disconnects": 0, "send_errors": 0}
+
+    def add(self, websocket: WebSocket) -> ClientQueue:
+        """Daftarkan client yang sudah di-accept dan jalankan writer-nya"""
+        client = ClientQueue(websocket, self.max_queue)
+        client.writer = asyncio.create_task(self._writer(client))
+        self._clients[websocket] = client
+        return client
+
+    def remove(self, websocket: WebSocket):
+        """Lepas client (idempotent); pesan yang masih antre dibuang"""
+        client = self._clients.pop(websocket, None)
+        if client is None:
+            return
+        client.closed = True
+        if client.writer and client.writer is not asyncio.current_task():
+            client.writer.cancel()
+
+    def set_batching(self, websocket: WebSocket, enabled: bool = True) -> bool:
+        """Aktifkan/nonaktifkan frame array ter-coalesce untuk satu client"""
+        client = self._clients.get(websocket)
+        if client is None:
+            return False
+        client.batching = enabled and self.coalesce_window > 0
+        return client.batching
+
+    def __contains__(self, websocket: WebSocket) -> bool:
+        return websocket in self._clients
+
+    def __len__(self) -> int:
+        return len(self._clients)
+
+    def __iter__(self):
+        return iter(list(self._clients))
+
+    def classify(self, message: Union[dict, str]) -> str:
+        message_type = message.get("type") if isinstance(message, dict) else None
+        return STATUS if message_type in self.status_types else CRITICAL
+
+    def coalesce_key(self, message: Union[dict, str], message_class: str) -> Optional[str]:
+        """Key untuk menciutkan status yang tergantikan: tipe + gate"""
+        if message_class != STATUS or not isinstance(message, dict):
+            return None
+        message_type = message.get("type")
+        if message_type not in self.collapse_types:
+            return None
+        payload = message.get("payload") if isinstance(message.get("payload"), dict) else {}
+        gate = message.get("gate") or message.get("gate_id") or payload.get("gate") or payload.get("gate_id")
+        return f"{message_type}:{gate or ''}"
+
+    def encode(self, message: Union[dict, str]) -> str:
+        if isinstance(message, str):
+            return message
+        self.stats["encodes"] += 1
+        return encode_message(message, strict=False)  # Tipe tak dikenal tidak boleh menggagalkan broadcast
+
+    def broadcast(self, message: Union[dict, str], message_class: str = None,
+                  targets: Iterable[WebSocket] = None, key: str = None) -> int:
+        """Antrekan pesan ke semua client, atau hanya ke targets (tanpa menunggu pengiriman)
+
+        key: key coalescing untuk pesan status (default: tipe + gate). Kembalikan jumlah client.
+        """
+        if targets is None:
+            clients = list(self._clients.values())
+        else:
+            clients = [self._clients[ws] for ws in targets if ws in self._clients]
+        if not clients:
+            return 0
+        message_class = message_class or self.classify(message)
+        key = key or self.coalesce_key(message, message_class)
+        data = self.encode(message)  # Sekali per broadcast, bukan per client
+        self.stats["broadcasts"] += 1
+        for client in clients:
+            if not client.offer(message_class, data, key):
+                self._disconnect_slow(client)
+        return len(clients)
+
+    def send(self, websocket: WebSocket, message: Union[dict, str], message_class: str = CRITICAL) -> bool:
+        """Antrekan pesan ke satu client (urutan terjaga terhadap broadcast)"""
+        client = self._clients.get(websocket)
+        if client is None:
+            return False
+        if not client.offer(message_class, self.encode(message)):
+            self._disconnect_slow(client)
+            return False
+        return True
+
+    def _disconnect_slow(self, client: ClientQueue, reason: str = "send queue overflow"):
+        logger.warning(f"[{self.name}] Disconnecting slow client {client.label}: {reason} "
+                       f"({len(client.messages)} queued)")
+        self.stats["slow_disconnects"] += 1
+        self.remove(client.websocket)
+        asyncio.create_task(self._close(client.websocket))
+
+    async def _close(self, websocket: WebSocket):
+        try:
+            await asyncio.wait_for(websocket.close(code=1013), timeout=self.send_timeout)
+        except Exception:
+            pass  # Koneksi sudah putus
+
+    async def _writer(self, client: ClientQueue):
+        """Kirim antrean client satu per satu; kirim yang macet melebihi send_timeout = putus"""
+        websocket = client.websocket
+        try:
+            while not client.closed:
+                if not client.messages:
+                    client.ready.clear()
+                    await client.ready.wait()
+                    continue
+                if client.batching:
+                    # Kumpulkan pesan selama satu window, kirim sebagai satu frame
+                    await asyncio.sleep(self.coalesce_window)
+                    data = client.take_batch()
+                else:
+                    _, data, _ = client.messages.popleft()
+                    client.stats["sent"] += 1
+                await asyncio.wait_for(websocket.send_text(data), timeout=self.send_timeout)
+                client.stats["frames"] += 1
+        except asyncio.CancelledError:
+            raise
+        except asyncio.TimeoutError:
+            if not client.closed:
+                self._disconnect_slow(client, f"send blocked > {self.send_timeout}s")
+        except Exception as e:
+            self.stats["send_errors"] += 1
+            logger.debug(f"[{self.name}] Send to {client.label} failed: {e}")
+            self.remove(websocket)
+
+    def get_status(self) -> dict:
+        """Jumlah client dan kedalaman antrean per client"""
+        return {
+            "clients": len(self._clients),
+            "max_queue": self.max_queue,
+            "coalesce_window_ms": round(self.coalesce_window * 1000),
+            "queues": [client.get_status() for client in self._clients.values()],
+            **self.stats
+        }
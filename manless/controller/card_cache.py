@@ -0,0 +1,218 @@
+"""
+Card Cache untuk Controller
+Index kartu in-memory yang disinkronkan dari tabel `cards` di backend (central hub).
+Validasi kartu dilakukan lokal sehingga tetap berjalan saat hub sementara tidak terjangkau.
+
+Untuk populasi kartu yang sangat besar, mode revocation filter hanya memuat Bloom filter
+kartu yang dicabut (satu blob berversi) alih-alih seluruh tabel kartu.
+"""
+
+import asyncio
+import logging
+from datetime import datetime
+from typing import Optional, Dict, Tuple, Iterable
+
+import aiohttp
+
+from revocation_filter import RevocationFilter
+
+logger = logging.getLogger(__name__)
+
+class CardCache:
+    """Index kartu lokal: bulk load sekali, lalu delta berdasarkan watermark updated_at"""
+
+    def __init__(self, backend_url: str, sync_interval: float = 30.0, request_timeout: float = 5.0,
+                 use_revocation_filter: bool = False):
+        self.backend_url = backend_url
+        self.sync_url = f"{backend_url}/cards/sync"
+        self.filter_url = f"{backend_url}/cards/revocation-filter"
+        self.sync_interval = sync_interval
+        self.request_timeout = request_timeout
+        self.use_revocation_filter = use_revocation_filter
+        self.revocation_filter: Optional[RevocationFilter] = None
+
+        self._cards: Dict[str, Dict] = {}
+        self.watermark: Optional[str] = None
+        self.loaded = False
+        self.last_sync: Optional[str] = None
+        self.last_error: Optional[str] = None
+        self.stats = {
+            "hits": 0, "misses": 0, "syncs": 0, "sync_failures": 0, "invalidations": 0,
+            "filter_negatives": 0, "filter_confirmations": 0
+        }
+
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._sync_task: Optional[asyncio.Task] = None
+
+    async def start(self):
+        """Bulk load awal lalu jalankan sinkronisasi delta di background"""
+        self._session = aiohttp.ClientSession()
+        await self.sync()
+        self._sync_task = asyncio.create_task(self._sync_loop())
+        logger.info(f"Card cache started ({len(self._cards)} cards)")
+
+    async def stop(self):
+        """Hentikan sinkronisasi dan tutup session HTTP"""
+        if self._sync_task:
+            self._sync_task.cancel()
+            self._sync_task = None
+        if self._session:
+            await self._session.close()
+            self._session = None
+        logger.info("Card cache stopped")
+
+    async def _sync_loop(self):
+        """Sinkronisasi delta periodik; kegagalan tidak mengosongkan cache"""
+        while True:
+            await asyncio.sleep(self.sync_interval)
+            await self.sync()
+
+    async def sync(self) -> bool:
+        """Ambil bulk (jika belum loaded) atau delta sejak watermark dari backend"""
+        if self.use_revocation_filter:
+            return await self._sync_revocation_filter()
+        
+        params = {"since": self.watermark} if self.loaded and self.watermark else {}
+        try:
+            async with self._session.get(
+                self.sync_url,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            ) as response:
+                if response.status != 200:
+                    raise RuntimeError(f"Backend API error: {response.status}")
+                data = await response.json()
+        except Exception as e:
+            self.stats["sync_failures"] += 1
+            self.last_error = str(e)
+            logger.warning(f"Card cache sync failed, serving cached data ({len(self._cards)} cards): {e}")
+            return False
+
+        if data.get("full"):
+            self._cards = {}
+        self.apply_changes(data.get("cards", []))
+        self.watermark = data.get("watermark") or self.watermark
+        self.loaded = True
+        self.last_sync = datetime.now().isoformat()
+        self.last_error = None
+        self.stats["syncs"] += 1
+        logger.debug(f"Card cache synced: {len(data.get('cards', []))} changes, watermark {self.watermark}")
+        return True
+
+    async def _sync_revocation_filter(self) -> bool:
+        """Ambil blob revocation filter baru (jika versinya berubah) lalu tukar secara atomik"""
+        params = {"version": self.revocation_filter.version} if self.revocation_filter else {}
+        try:
+            async with self._session.get(
+                self.filter_url,
+                params=params,
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            ) as response:
+                if response.status == 304:
+                    self.last_sync = datetime.now().isoformat()
+                    return True
+                if response.status != 200:
+                    raise RuntimeError(f"Backend API error: {response.status}")
+                blob = await response.read()
+            new_filter = RevocationFilter.from_blob(blob)
+        except Exception as e:
+            self.stats["sync_failures"] += 1
+            self.last_error = str(e)
+            logger.warning(f"Revocation filter sync failed, keeping current filter: {e}")
+            return False
+
+        # Revocation yang di-push setelah blob dibangun tetap dibawa, kecuali sudah tercakup filter baru
+        if self.revocation_filter:
+            new_filter.overflow = {card_id for card_id in self.revocation_filter.overflow
+                                   if not new_filter.might_contain(card_id)}
+        self.revocation_filter = new_filter
+        self.loaded = True
+        self.last_sync = datetime.now().isoformat()
+        self.last_error = None
+        self.stats["syncs"] += 1
+        logger.info(f"Revocation filter loaded: {new_filter.get_status()}")
+        return True
+
+    def apply_changes(self, cards: Iterable[Dict]):
+        """Terapkan perubahan kartu (idempotent)"""
+        for card in cards:
+            card_id = card.get("card_id")
+            if not card_id:
+                continue
+            self._cards[card_id] = {
+                "card_type": (card.get("card_type") or "visitor").lower(),
+                "is_active": bool(card.get("is_active", True)),
+                "owner_name": card.get("owner_name")
+            }
+
+    def invalidate(self, card_ids: Iterable[str]) -> int:
+        """Push invalidasi dari hub: tandai kartu tidak aktif seketika"""
+        count = 0
+        for card_id in card_ids:
+            if self.use_revocation_filter:
+                if self.revocation_filter is None:
+                    self.revocation_filter = RevocationFilter(8, 1)
+                self.revocation_filter.overflow.add(card_id)
+            else:
+                entry = self._cards.setdefault(card_id, {"card_type": "visitor", "owner_name": None})
+                entry["is_active"] = False
+            count += 1
+        self.stats["invalidations"] += count
+        logger.info(f"Card cache invalidated {count} card(s)")
+        return count
+
+    def lookup(self, card_id: str) -> Optional[Dict]:
+        """Lookup O(1) satu kartu"""
+        entry = self._cards.get(card_id)
+        if entry is None:
+            self.stats["misses"] += 1
+        else:
+            self.stats["hits"] += 1
+        return entry
+
+    def validate(self, card_id: str) -> Tuple[bool, Optional[str]]:
+        """Kembalikan (valid, card_type) dalam satu lookup"""
+        entry = self.lookup(card_id)
+        if entry is None:
+            return False, None
+        return entry["is_active"], entry["card_type"]
+
+    async def check(self, card_id: str) -> Tuple[bool, Optional[str]]:
+        """Validasi kartu sesuai mode: index tabel, atau revocation filter + konfirmasi exact"""
+        if not self.use_revocation_filter:
+            return self.validate(card_id)
+        
+        if self.revocation_filter is None or not self.revocation_filter.might_contain(card_id):
+            self.stats["filter_negatives"] += 1
+            return True, None
+        
+        # Positif (mungkin dicabut): konfirmasi exact ke hub
+        self.stats["filter_confirmations"] += 1
+        try:
+            async with self._session.get(
+                f"{self.backend_url}/cards/{card_id}",
+                timeout=aiohttp.ClientTimeout(total=self.request_timeout)
+            ) as response:
+                if response.status == 404:
+                    return card_id not in self.revocation_filter.overflow, None
+                if response.status != 200:
+                    raise RuntimeError(f"Backend API error: {response.status}")
+                card = await response.json()
+            return bool(card.get("is_active")), (card.get("card_type") or "visitor").lower()
+        except Exception as e:
+            # Hub tidak terjangkau: kartu yang mungkin dicabut ditolak (fail closed)
+            logger.warning(f"Could not confirm revocation for {card_id}, denying: {e}")
+            return False, None
+
+    def get_status(self) -> Dict:
+        """Status cache untuk API/status"""
+        return {
+            "loaded": self.loaded,
+            "mode": "revocation_filter" if self.use_revocation_filter else "table",
+            "revocation_filter": self.revocation_filter.get_status() if self.revocation_filter else None,
+            "cards": len(self._cards),
+            "watermark": self.watermark,
+            "last_sync": self.last_sync,
+            "last_error": self.last_error,
+            "stats": dict(self.stats)
+        }
@@ -21,10 +21,16 @@ HOST = "0.0.0.0"
 PORT = 8001
 DEBUG = True
 LOG_LEVEL = "INFO"
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "128"))  # Maksimal pesan antre per client WebSocket
+WS_SEND_TIMEOUT = 5  # seconds, kirim yang macet lebih lama = client diputus
+WS_COALESCE_WINDOW = 0.05  # seconds, window frame array untuk client ?batch=1
 
 # Backend Configuration (Central Hub)
 BACKEND_URL = "http://localhost:8000"
 BACKEND_WEBSOCKET_URL = "ws://localhost:8000/ws"
+CARD_CACHE_SYNC_INTERVAL = 30  # seconds, interval sinkronisasi delta index kartu
+# "table" = index seluruh tabel kartu, "filter" = Bloom filter kartu dicabut (populasi sangat besar)
+CARD_VALIDATION_MODE = os.getenv("CARD_VALIDATION_MODE", "table")
 
 # Hardware Configuration
 SIMULATION_MODE = False  # Hard-coded to false
@@ -40,6 +46,12 @@ CAMERA_FPS = 30
 CARD_READER_ENABLED = True
 CARD_READER_PORT = os.getenv("GATE_IN_CARD_READER_PORT", "COM1")
 CARD_READER_BAUDRATE = 9600
+CARD_DUPLICATE_WINDOW = 3  # seconds, tap ulang kartu yang sama diabaikan
+# Proses entry lokal langsung dari event stream card reader (membuka palang tanpa hub: tidak ada
+# sesi GateCoordinator, okupansi, maupun lock/idempotency per kartu). Default mati: tap dikirim
+# sebagai card_detected lewat hub link, dan hub menjalankan entry (POST /api/parking/entry ke gate
+# ini). Tanpa hub yang terhubung, tap tidak membuka palang; aktifkan ini untuk operasi standalone.
+CARD_AUTO_ENTRY = os.getenv("GATE_IN_CARD_AUTO_ENTRY", "false").lower() == "true"
 
 # Arduino/Gate Controller Configuration
 ARDUINO_ENABLED = True
@@ -21,6 +21,9 @@ HOST = "0.0.0.0"
 PORT = 8002
 DEBUG = True
 LOG_LEVEL = "INFO"
+WS_SEND_QUEUE = int(os.getenv("WS_SEND_QUEUE", "128"))  # Maksimal pesan antre per client WebSocket
+WS_SEND_TIMEOUT = 5  # seconds, kirim yang macet lebih lama = client diputus
+WS_COALESCE_WINDOW = 0.05  # seconds, window frame array untuk client ?batch=1
 
 # Backend Configuration (Central Hub)
 BACKEND_URL = "http://localhost:8000"
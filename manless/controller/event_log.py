@@ -0,0 +1,71 @@
+"""
+Event Log untuk Controller Application
+Ring buffer event gate (entry/exit, transisi palang, kartu) yang sudah terurut menurut seq,
+dilayani per halaman lewat /api/logs?limit=&before=<seq> (terbaru lebih dulu).
+"""
+
+import bisect
+from collections import deque
+from datetime import datetime
+from typing import Iterable, List, Optional
+
+class EventLog:
+    """Log event in-memory berukuran tetap dengan paginasi berbasis seq"""
+
+    def __init__(self, gate_id: str, event_types: Iterable[str], max_entries: int = 5000):
+        self.gate_id = gate_id
+        self.event_types = set(event_types)
+        self._entries = deque(maxlen=max_entries)  # Urut naik menurut seq
+        self._next_seq = 1
+
+    def record(self, message: dict) -> Optional[dict]:
+        """Catat pesan broadcast jika tipenya termasuk event yang di-log"""
+        event_type = message.get("type")
+        if event_type not in self.event_types:
+            return None
+        payload = message.get("payload") or {}
+        entry = {
+            "seq": self._next_seq,
+            "timestamp": payload.get("timestamp") or datetime.now().isoformat(),
+            "event_type": event_type,
+            "card_id": payload.get("card_id"),
+            "gate": self.gate_id,
+            "details": payload
+        }
+        self._next_seq += 1
+        self._entries.append(entry)
+        return entry
+
+    def page(self, limit: int = 50, before: Optional[int] = None, event_type: Optional[str] = None,
+             card_id: Optional[str] = None) -> dict:
+        """Satu halaman event terbaru lebih dulu, dengan seq < before; next_before = None jika habis"""
+        entries = self._entries
+        end = len(entries) if before is None else bisect.bisect_left(_SeqView(entries), before)
+
+        logs: List[dict] = []
+        index = end - 1
+        while index >= 0 and len(logs) < limit:
+            entry = entries[index]
+            if (event_type is None or entry["event_type"] == event_type) and \
+                    (card_id is None or entry["card_id"] == card_id):
+                logs.append(entry)
+            index -= 1
+
+        return {
+            "logs": logs,
+            "limit": limit,
+            "gate": self.gate_id,
+            "next_before": logs[-1]["seq"] if logs and index >= 0 else None
+        }
+
+class _SeqView:
+    """Pandangan seq dari deque untuk bisect (tanpa menyalin)"""
+
+    def __init__(self, entries):
+        self._entries = entries
+
+    def __len__(self):
+        return len(self._entries)
+
+    def __getitem__(self, index):
+        return self._entries[index]["seq"]
@@ -11,6 +11,8 @@ import serial
 import time
 import json
 
+from .gate_state import GateStateMachine
+
 logger = logging.getLogger(__name__)
 
 class ArduinoController:
@@ -22,6 +24,31 @@ class ArduinoController:
         self.baudrate = baudrate
         self.gate_status = "closed" # Status default
         self.sensors_data = {}
+        self._gates: Dict[str, GateStateMachine] = {}  # State machine per port
+        self._transition_listeners: List = []
+
+    def gate_machine(self, target_port: Optional[str] = None) -> GateStateMachine:
+        """Ambil (atau buat) state machine untuk gate di port tertentu"""
+        port = target_port or self.port
+        machine = self._gates.get(port)
+        if machine is None:
+            machine = GateStateMachine(port, initial_state=self.gate_status if self.gate_status in GateStateMachine.STATES else GateStateMachine.CLOSED)
+            machine.add_listener(self._on_gate_transition)
+            self._gates[port] = machine
+        return machine
+
+    def add_transition_listener(self, listener):
+        """Daftarkan callback untuk event transisi gate (dipanggil di event loop)"""
+        self._transition_listeners.append(listener)
+
+    def _on_gate_transition(self, event: Dict):
+        """Sinkronkan gate_status lama dan teruskan event ke listener"""
+        self.gate_status = event["to"]
+        for listener in self._transition_listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Error in gate transition listener: {e}")
 
     async def initialize(self):
         """Inisialisasi 'kosong'. Koneksi tidak dibuat di sini."""
@@ -32,7 +59,9 @@ class ArduinoController:
     async def cleanup(self):
         """Cleanup 'kosong'. Tidak ada koneksi persisten untuk ditutup."""
         logger.info("ArduinoController cleanup.")
-        # Tidak perlu melakukan apa-apa.
+        # Batalkan deadline auto-close yang masih menunggu
+        for machine in self._gates.values():
+            machine.cancel_deadline()
 
     async def _send_command(self, command: str, target_port: Optional[str] = None, wait_response: bool = True) -> Optional[str]:
         """
@@ -70,37 +99,50 @@ class ArduinoController:
             return None
 
     async def open_gate(self, duration: int = 10, target_port: Optional[str] = None) -> Dict:
-        """Membuka gerbang parkir."""
-        logger.info(f"Request to open gate on port {target_port or self.port}")
-        response = await self._send_command("GATE_OPEN", target_port=target_port)
+        """Membuka gerbang parkir. Jika gerbang sudah terbuka, deadline auto-close diperpanjang."""
+        port = target_port or self.port
+        machine = self.gate_machine(port)
+
+        if machine.state in (GateStateMachine.OPEN, GateStateMachine.OPENING):
+            # Gate sudah terbuka (atau sedang membuka): perpanjang deadline tanpa mengirim perintah lagi
+            remaining = machine.extend_deadline(duration)
+            logger.info(f"Gate on port {port} already {machine.state}, auto-close extended to {remaining:.1f}s")
+            return {"status": "success", "action": "open", "extended": True, "auto_close_in": round(remaining, 2)}
+
+        logger.info(f"Request to open gate on port {port}")
+        machine.transition(GateStateMachine.OPENING, reason="open_command")
+        response = await self._send_command("GATE_OPEN", target_port=port)
         
         if response and "OPENED" in response:
-            self.gate_status = "open"
-            asyncio.create_task(self._auto_close_gate(duration))
-            return {"status": "success", "action": "open", "response": response}
+            machine.transition(GateStateMachine.OPEN, reason="firmware_ack")
+            hold = machine.schedule_close(duration, lambda: self._auto_close_gate(port))
+            return {"status": "success", "action": "open", "response": response, "auto_close_in": hold}
         else:
             logger.error(f"Failed to open gate. Response: {response}")
+            machine.transition(GateStateMachine.FAULT, reason="open_failed")
             return {"status": "error", "message": "Failed to open gate", "response": response}
 
     async def close_gate(self, target_port: Optional[str] = None) -> Dict:
         """Menutup gerbang parkir."""
-        logger.info(f"Request to close gate on port {target_port or self.port}")
-        response = await self._send_command("GATE_CLOSE", target_port=target_port)
+        port = target_port or self.port
+        machine = self.gate_machine(port)
+        logger.info(f"Request to close gate on port {port}")
+        machine.transition(GateStateMachine.CLOSING, reason="close_command")
+        response = await self._send_command("GATE_CLOSE", target_port=port)
         
         if response and "CLOSED" in response:
-            self.gate_status = "closed"
+            machine.transition(GateStateMachine.CLOSED, reason="firmware_ack")
             return {"status": "success", "action": "close", "response": response}
         else:
             logger.error(f"Failed to close gate. Response: {response}")
+            machine.transition(GateStateMachine.FAULT, reason="close_failed")
             return {"status": "error", "message": "Failed to close gate", "response": response}
     
-    async def _auto_close_gate(self, delay: int):
-        """Automatically close gate after delay"""
-        await asyncio.sleep(delay)
-        
-        if self.gate_status == "open":
-            logger.info("Auto-closing gate")
-            await self.close_gate()
+    async def _auto_close_gate(self, target_port: str):
+        """Dipanggil oleh deadline state machine saat waktu buka habis"""
+        if self.gate_machine(target_port).state == GateStateMachine.OPEN:
+            logger.info(f"Auto-closing gate on port {target_port}")
+            await self.close_gate(target_port=target_port)
     
     async def get_gate_status(self) -> Dict:
         """Get current gate status"""
@@ -113,10 +155,12 @@ class ArduinoController:
             for part in parts:
                 if part.startswith("GATE:"):
                     status = part.split(':')[1].lower()
-                    self.gate_status = status
+                    if self.gate_machine().sync_from_firmware(status) is None:
+                        self.gate_status = status
         
         return {
             "status": self.gate_status,
+            "machine": self.gate_machine().snapshot(),
             "timestamp": datetime.now().isoformat()
         }
     
@@ -201,7 +245,9 @@ class ArduinoController:
         logger.warning("Emergency stop activated")
         
         response = await self._send_command("EMERGENCY_STOP")
-        self.gate_status = "closed"
+        # Semua gate ke FAULT; gate_status lama ikut lewat _on_gate_transition
+        for machine in list(self._gates.values()) or [self.gate_machine()]:
+            machine.transition(GateStateMachine.FAULT, reason="emergency_stop")
         
         # Turn on red LED
         await self.control_led("red", True)
@@ -211,7 +257,7 @@ class ArduinoController:
         
         return {
             "status": "emergency_stop_activated",
-            "gate_status": "closed",
+            "gate_status": self.gate_status,
             "timestamp": datetime.now().isoformat(),
             "response": response
         }
@@ -224,6 +270,8 @@ class ArduinoController:
         
         # Wait for reset
         await asyncio.sleep(2)
+        for machine in self._gates.values():
+            machine.transition(GateStateMachine.CLOSED, reason="reset")
         
         # Reinitialize
         await self.initialize()
@@ -5,23 +5,69 @@ Menangani pembacaan kartu RFID/NFC untuk sistem parkir manless
 
 import asyncio
 import logging
+import threading
+from collections import OrderedDict
 from datetime import datetime
-from typing import Optional, Dict
+from typing import Optional, Dict, List, AsyncIterator
 import serial
 import time
 
 logger = logging.getLogger(__name__)
 
+class DuplicateTapFilter:
+    """Menekan tap berulang dari kartu yang sama dalam jendela waktu tertentu.
+
+    Menyimpan card_id -> waktu tap terakhir dalam OrderedDict yang terurut menurut waktu,
+    sehingga entri kedaluwarsa dibuang dari depan dan ukuran tetap sebanding dengan
+    jumlah kartu unik dalam satu jendela.
+    """
+
+    def __init__(self, window: float = 3.0):
+        self.window = window
+        self._last_seen: "OrderedDict[str, float]" = OrderedDict()
+        self.suppressed = 0
+
+    def accept(self, card_id: str, at: float) -> bool:
+        """True jika tap harus diproses, False jika duplikat dalam jendela"""
+        self._expire(at)
+        last = self._last_seen.get(card_id)
+        if last is not None and at - last < self.window:
+            self.suppressed += 1
+            return False
+        self._last_seen[card_id] = at
+        self._last_seen.move_to_end(card_id)
+        return True
+
+    def _expire(self, now: float):
+        """Buang entri yang sudah keluar dari jendela (paling lama ada di depan)"""
+        while self._last_seen:
+            card_id, seen_at = next(iter(self._last_seen.items()))
+            if now - seen_at < self.window:
+                break
+            self._last_seen.popitem(last=False)
+
+    def __len__(self):
+        return len(self._last_seen)
+
 class CardReaderController:
     """Controller untuk menangani pembacaan kartu"""
     
-    def __init__(self, port: str, baudrate: int = 9600):
+    def __init__(self, port: str, baudrate: int = 9600, duplicate_window: float = 3.0, event_queue_size: int = 100):
         self.port = port
         self.baudrate = baudrate
         self.serial_connection: Optional[serial.Serial] = None
         self.is_connected = False
         self.last_card_read = None
-        self.card_timeout = 5  # seconds
+        self.card_timeout = 10  # seconds, default timeout untuk read_card
+        
+        # Event stream kartu (producer thread -> subscriber queue di event loop)
+        self.duplicate_filter = DuplicateTapFilter(duplicate_window)
+        self.event_queue_size = event_queue_size
+        self._subscribers: List[asyncio.Queue] = []
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._reader_thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._pending_response: Optional[asyncio.Future] = None
         
     async def initialize(self):
         """Initialize card reader connection"""
@@ -37,6 +83,7 @@ class CardReaderController:
             if self.serial_connection.is_open:
                 self.is_connected = True
                 logger.info(f"Card reader connected to {self.port}")
+                self.start_event_stream()
                 return True
             else:
                 logger.error(f"Failed to open card reader port: {self.port}")
@@ -46,6 +93,7 @@ class CardReaderController:
             logger.error(f"Serial connection error: {e}")
             # Fallback to simulation mode
             self.is_connected = False
+            self._loop = asyncio.get_running_loop()
             logger.info("Card reader running in simulation mode")
             return True
         except Exception as e:
@@ -54,47 +102,133 @@ class CardReaderController:
     
     async def cleanup(self):
         """Cleanup card reader resources"""
+        self.stop_event_stream()
         if self.serial_connection and self.serial_connection.is_open:
             self.serial_connection.close()
             logger.info("Card reader connection closed")
     
-    async def read_card(self, timeout: int = 10) -> Optional[Dict]:
+    # ========================================
+    # CARD EVENT STREAM
+    # ========================================
+    
+    def start_event_stream(self):
+        """Mulai thread producer yang membaca serial terus-menerus"""
+        if self._reader_thread and self._reader_thread.is_alive():
+            return
+        self._loop = asyncio.get_running_loop()
+        self._stop_event.clear()
+        self._reader_thread = threading.Thread(target=self._reader_loop, name="card-reader", daemon=True)
+        self._reader_thread.start()
+        logger.info("Card event stream started")
+    
+    def stop_event_stream(self):
+        """Hentikan thread producer"""
+        self._stop_event.set()
+        if self._reader_thread:
+            self._reader_thread.join(timeout=2.0)
+            self._reader_thread = None
+    
+    async def events(self) -> AsyncIterator[Dict]:
+        """Async iterator event kartu; setiap subscriber mendapat queue sendiri"""
+        queue: asyncio.Queue = asyncio.Queue(maxsize=self.event_queue_size)
+        self._subscribers.append(queue)
+        try:
+            while True:
+                yield await queue.get()
+        finally:
+            self._subscribers.remove(queue)
+    
+    def inject_card(self, card_id: str, card_type: str = "visitor", read_method: str = "injected"):
+        """Masukkan event kartu secara manual (simulasi/tes) ke stream yang sama"""
+        self._publish({"card_id": card_id, "card_type": card_type}, time.time(), time.monotonic(), read_method)
+    
+    def _reader_loop(self):
+        """Thread producer: blok pada serial.read, timestamp saat byte pertama baris tiba"""
+        buffer = b""
+        line_started_at = None  # (wall clock, monotonic) byte pertama baris
+        
+        while not self._stop_event.is_set():
+            try:
+                chunk = self.serial_connection.read(self.serial_connection.in_waiting or 1)
+            except Exception as e:
+                logger.error(f"Card reader stream error: {e}")
+                break
+            if not chunk:
+                continue
+            
+            if not buffer:
+                line_started_at = (time.time(), time.monotonic())
+            buffer += chunk
+            
+            while b"\n" in buffer:
+                raw, buffer = buffer.split(b"\n", 1)
+                arrived_wall, arrived_mono = line_started_at
+                line_started_at = (time.time(), time.monotonic()) if buffer else None
+                
+                data = raw.decode('utf-8', errors='ignore').strip()
+                if data and self._loop:
+                    self._loop.call_soon_threadsafe(self._handle_line, data, arrived_wall, arrived_mono)
+        
+        logger.info("Card event stream stopped")
+    
+    def _handle_line(self, data: str, arrived_wall: float, arrived_mono: float):
+        """Dijalankan di event loop untuk setiap baris yang diterima"""
+        # Balasan perintah (mis. TEST) diteruskan ke pemanggil yang menunggu;
+        # baris berformat kartu tetap diperlakukan sebagai tap
+        is_card_format = data.startswith("CARD:") or data.startswith("{")
+        if not is_card_format and self._pending_response and not self._pending_response.done():
+            self._pending_response.set_result(data)
+            return
+        
+        card_data = self._parse_card_data(data)
+        if card_data and card_data.get("card_id"):
+            self._publish(card_data, arrived_wall, arrived_mono, "hardware")
+    
+    def _publish(self, card_data: Dict, arrived_wall: float, arrived_mono: float, read_method: str):
+        """Terapkan filter duplikat lalu kirim event ke semua subscriber"""
+        if not self.duplicate_filter.accept(card_data["card_id"], arrived_mono):
+            logger.debug(f"Duplicate tap suppressed: {card_data['card_id']}")
+            return
+        
+        event = {
+            **card_data,
+            "timestamp": datetime.fromtimestamp(arrived_wall).isoformat(),
+            "arrived_at": arrived_mono,
+            "read_method": read_method
+        }
+        self.last_card_read = event
+        logger.info(f"Card read: {card_data['card_id']}")
+        
+        for queue in list(self._subscribers):
+            if queue.full():
+                # Buang event terlama agar subscriber lambat tidak menahan producer
+                queue.get_nowait()
+            queue.put_nowait(event)
+    
+    async def read_card(self, timeout: Optional[int] = None) -> Optional[Dict]:
         """Read card data with timeout"""
+        timeout = timeout if timeout is not None else self.card_timeout
         if self.is_connected and self.serial_connection:
             return await self._read_card_hardware(timeout)
         else:
             return await self._read_card_simulation(timeout)
     
     async def _read_card_hardware(self, timeout: int) -> Optional[Dict]:
-        """Read card from actual hardware"""
+        """Tunggu event kartu berikutnya dari stream"""
+        if not (self._reader_thread and self._reader_thread.is_alive()):
+            self.start_event_stream()
+        
+        stream = self.events()
         try:
-            start_time = time.time()
-            
-            while time.time() - start_time < timeout:
-                if self.serial_connection.in_waiting > 0:
-                    # Read data from card reader
-                    data = self.serial_connection.readline().decode('utf-8').strip()
-                    
-                    if data:
-                        # Parse card data (format depends on your card reader)
-                        card_data = self._parse_card_data(data)
-                        if card_data:
-                            self.last_card_read = {
-                                **card_data,
-                                "timestamp": datetime.now().isoformat(),
-                                "read_method": "hardware"
-                            }
-                            logger.info(f"Card read: {card_data['card_id']}")
-                            return self.last_card_read
-                
-                await asyncio.sleep(0.1)  # Small delay to prevent busy waiting
-            
+            return await asyncio.wait_for(stream.__anext__(), timeout)
+        except asyncio.TimeoutError:
             logger.info("Card read timeout")
             return None
-            
         except Exception as e:
             logger.error(f"Error reading card from hardware: {e}")
             return None
+        finally:
+            await stream.aclose()
     
     async def _read_card_simulation(self, timeout: int) -> Optional[Dict]:
         """Simulate card reading for testing"""
@@ -166,6 +300,9 @@ class CardReaderController:
             "port": self.port,
             "baudrate": self.baudrate,
             "last_read": self.last_card_read,
+            "event_stream": bool(self._reader_thread and self._reader_thread.is_alive()),
+            "subscribers": len(self._subscribers),
+            "duplicates_suppressed": self.duplicate_filter.suppressed,
             "status": "connected" if self.is_connected else "simulation"
         }
     
@@ -175,22 +312,24 @@ class CardReaderController:
             return False
             
         try:
+            # Balasan dibaca oleh thread producer dan diteruskan lewat future ini
+            self._pending_response = asyncio.get_running_loop().create_future()
+            
             # Send test command (depends on your card reader)
             self.serial_connection.write(b"TEST\n")
-            await asyncio.sleep(0.5)
             
-            # Check for response
-            if self.serial_connection.in_waiting > 0:
-                response = self.serial_connection.readline().decode('utf-8').strip()
-                logger.info(f"Card reader test response: {response}")
-                return True
-            else:
-                logger.warning("No response from card reader")
-                return False
+            response = await asyncio.wait_for(self._pending_response, 0.5)
+            logger.info(f"Card reader test response: {response}")
+            return True
                 
+        except asyncio.TimeoutError:
+            logger.warning("No response from card reader")
+            return False
         except Exception as e:
             logger.error(f"Card reader test failed: {e}")
             return False
+        finally:
+            self._pending_response = None
     
     async def beep(self, duration: float = 0.1):
         """Make card reader beep (if supported)"""
@@ -0,0 +1,167 @@
+"""
+Gate State Machine untuk Controller Application
+Melacak status palang (closed/opening/open/closing/fault) dan satu deadline auto-close per gate
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Optional, Dict, List, Callable, Awaitable
+
+logger = logging.getLogger(__name__)
+
+class GateStateMachine:
+    """State machine untuk satu gate dengan satu deadline auto-close yang bisa dibatalkan"""
+
+    CLOSED = "closed"
+    OPENING = "opening"
+    OPEN = "open"
+    CLOSING = "closing"
+    FAULT = "fault"
+
+    STATES = (CLOSED, OPENING, OPEN, CLOSING, FAULT)
+
+    # Transisi yang diizinkan; FAULT bisa dicapai dari state mana pun
+    TRANSITIONS = {
+        CLOSED: (OPENING, OPEN, FAULT),
+        OPENING: (OPEN, CLOSING, CLOSED, FAULT),
+        OPEN: (CLOSING, CLOSED, FAULT),
+        CLOSING: (CLOSED, OPENING, OPEN, FAULT),
+        FAULT: (OPENING, CLOSING, CLOSED, OPEN),
+    }
+
+    # Pemetaan status dari firmware ("GATE:OPEN", "GATE:ERROR", ...)
+    FIRMWARE_STATES = {
+        "closed": CLOSED,
+        "opening": OPENING,
+        "open": OPEN,
+        "closing": CLOSING,
+        "error": FAULT,
+    }
+
+    def __init__(self, gate_id: str, initial_state: str = CLOSED):
+        self.gate_id = gate_id
+        self.state = initial_state
+        self.entered_at = time.monotonic()
+        self.last_event: Optional[Dict] = None
+        self._listeners: List[Callable[[Dict], None]] = []
+        self._deadline_handle: Optional[asyncio.TimerHandle] = None
+        self._deadline_at: Optional[float] = None
+        self._deadline_callback: Optional[Callable[[], Awaitable]] = None
+        self._pending_hold = 0.0
+
+    def add_listener(self, listener: Callable[[Dict], None]):
+        """Daftarkan callback yang dipanggil pada setiap transisi"""
+        self._listeners.append(listener)
+
+    def transition(self, new_state: str, reason: str = "") -> Optional[Dict]:
+        """Pindah ke state baru dan kirim event transisi beserta durasinya"""
+        if new_state == self.state:
+            return None
+        if new_state not in self.TRANSITIONS.get(self.state, ()):
+            logger.warning(f"Gate {self.gate_id}: unexpected transition {self.state} -> {new_state} ({reason})")
+
+        now = time.monotonic()
+        event = {
+            "gate": self.gate_id,
+            "from": self.state,
+            "to": new_state,
+            "reason": reason,
+            "elapsed_ms": round((now - self.entered_at) * 1000, 1),
+            "timestamp": datetime.now().isoformat()
+        }
+
+        self.state = new_state
+        self.entered_at = now
+        self.last_event = event
+
+        if new_state != self.OPEN:
+            self.cancel_deadline()
+        if new_state not in (self.OPENING, self.OPEN):
+            self._pending_hold = 0.0
+
+        logger.info(f"Gate {self.gate_id}: {event['from']} -> {new_state} after {event['elapsed_ms']}ms ({reason})")
+
+        for listener in self._listeners:
+            try:
+                listener(event)
+            except Exception as e:
+                logger.error(f"Error in gate transition listener: {e}")
+
+        return event
+
+    def sync_from_firmware(self, firmware_status: str) -> Optional[Dict]:
+        """Samakan state dengan status yang dilaporkan firmware"""
+        state = self.FIRMWARE_STATES.get(firmware_status.lower())
+        if state is None:
+            return None
+        return self.transition(state, reason="firmware_status")
+
+    def request_hold(self, duration: float):
+        """Catat durasi buka yang diminta saat gate masih OPENING"""
+        self._pending_hold = max(self._pending_hold, duration)
+
+    def schedule_close(self, duration: float, callback: Callable[[], Awaitable]) -> float:
+        """Pasang deadline auto-close; deadline lama diganti, bukan ditumpuk"""
+        duration = max(duration, self._pending_hold)
+        self._pending_hold = 0.0
+        self.cancel_deadline()
+
+        loop = asyncio.get_running_loop()
+        self._deadline_at = loop.time() + duration
+        self._deadline_callback = callback
+        self._deadline_handle = loop.call_at(self._deadline_at, self._fire_deadline)
+        return duration
+
+    def extend_deadline(self, duration: float) -> float:
+        """Perpanjang deadline auto-close; tidak pernah memperpendek deadline yang ada"""
+        if self._deadline_handle is None or self._deadline_callback is None:
+            self.request_hold(duration)
+            return duration
+
+        loop = asyncio.get_running_loop()
+        new_deadline = loop.time() + duration
+        if new_deadline > self._deadline_at:
+            self._deadline_handle.cancel()
+            self._deadline_at = new_deadline
+            self._deadline_handle = loop.call_at(new_deadline, self._fire_deadline)
+        return self._deadline_at - loop.time()
+
+    def cancel_deadline(self):
+        """Batalkan deadline auto-close yang aktif"""
+        if self._deadline_handle:
+            self._deadline_handle.cancel()
+        self._deadline_handle = None
+        self._deadline_at = None
+        self._deadline_callback = None
+
+    def deadline_remaining(self) -> Optional[float]:
+        """Sisa waktu (detik) sebelum auto-close, None jika tidak ada deadline"""
+        if self._deadline_at is None:
+            return None
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        return max(0.0, self._deadline_at - loop.time())
+
+    def _fire_deadline(self):
+        """Dipanggil event loop saat deadline tercapai"""
+        callback = self._deadline_callback
+        self._deadline_handle = None
+        self._deadline_at = None
+        self._deadline_callback = None
+        if callback and self.state == self.OPEN:
+            asyncio.ensure_future(callback())
+
+    def snapshot(self) -> Dict:
+        """Status state machine untuk API/status"""
+        remaining = self.deadline_remaining()
+        return {
+            "gate": self.gate_id,
+            "state": self.state,
+            "in_state_ms": round((time.monotonic() - self.entered_at) * 1000, 1),
+            "auto_close_in": round(remaining, 2) if remaining is not None else None,
+            "last_transition": self.last_event
+        }
@@ -4,6 +4,7 @@ Hardware Detector untuk Arduino dan Card Reader
 Mendeteksi status koneksi hardware secara real-time
 """
 
+import os
 import serial
 import serial.tools.list_ports
 import time
@@ -20,6 +21,7 @@ STATUS_COMMAND = b"STATUS\n"
 CONNECTION_TEST_TIMEOUT = 2.0  # Waktu tunggu untuk membaca balasan
 POST_CONNECTION_DELAY = 2.0    # Waktu tunggu setelah port dibuka agar Arduino siap
 DETECTION_INTERVAL = 5.0       # Diubah sesuai permintaan pengguna (5 detik)
+VIRTUAL_PORTS_ENV = "SKY_PARKING_VIRTUAL_PORTS"  # Port tambahan (mis. PTY dari virtual_hardware.py), dipisah os.pathsep
 
 class HardwareDetector:
     """Mendeteksi koneksi hardware seperti Arduino secara real-time di thread terpisah."""
@@ -54,6 +56,11 @@ class HardwareDetector:
             
         return any(desc in description or desc in manufacturer for desc in ARDUINO_DESCRIPTORS)
 
+    def _virtual_ports(self) -> list:
+        """Port virtual dari environment; tidak muncul di list_ports.comports()"""
+        value = os.getenv(VIRTUAL_PORTS_ENV, "")
+        return [port for port in value.split(os.pathsep) if port]
+
     def _test_and_get_arduino_status(self, port: str, baudrate: int = 9600) -> Tuple[bool, Optional[str]]:
         """
         Menguji koneksi dengan PING, dan jika berhasil, mengambil status gerbang.
@@ -122,6 +129,7 @@ class HardwareDetector:
         while not self._stop_event.is_set():
             detected_ports = serial.tools.list_ports.comports()
             potential_arduino_ports = [p.device for p in detected_ports if self._is_potential_arduino_port(p)]
+            potential_arduino_ports.extend(self._virtual_ports())
             
             arduino_found = False
             active_arduino_port = None
@@ -0,0 +1,122 @@
+"""
+Hub Link untuk Controller Application
+Satu koneksi WebSocket persisten dari central hub ke gate controller (endpoint /ws/hub).
+
+Frame dari hub : {"type": "request", "id": "...", "path": "/api/parking/entry", "payload": {...}}
+Balasan        : {"type": "response", "id": "...", "status": 200, "payload": {...}}
+Event push     : {"type": "event", "payload": {...}}
+
+Setiap request dijalankan sebagai task sendiri sehingga beberapa request bisa berjalan
+bersamaan di satu koneksi; balasan dicocokkan oleh hub lewat id.
+"""
+
+import asyncio
+import json
+import logging
+from typing import Awaitable, Callable, Dict, List
+from urllib.parse import parse_qsl, urlsplit
+
+from fastapi import HTTPException, WebSocket, WebSocketDisconnect
+from pydantic import ValidationError
+
+from json_encoder import encode_message
+
+logger = logging.getLogger(__name__)
+
+Handler = Callable[[dict], Awaitable]
+
+class HubLink:
+    """Dispatcher request/response dan push event untuk koneksi hub"""
+
+    def __init__(self, gate_id: str):
+        self.gate_id = gate_id
+        self._handlers: Dict[str, Handler] = {}
+        self._connections: List[WebSocket] = []
+        self._send_locks: Dict[int, asyncio.Lock] = {}
+        self.stats = {"requests": 0, "errors": 0, "events": 0}
+
+    def register(self, path: str, handler: Handler):
+        """Daftarkan handler(payload) untuk satu path API"""
+        self._handlers[path] = handler
+
+    @property
+    def connected(self) -> bool:
+        return bool(self._connections)
+
+    async def serve(self, websocket: WebSocket):
+        """Layani satu koneksi hub sampai terputus"""
+        await websocket.accept()
+        self._connections.append(websocket)
+        self._send_locks[id(websocket)] = asyncio.Lock()
+        logger.info(f"Hub link connected to {self.gate_id}")
+
+        tasks = set()
+        try:
+            while True:
+                frame = json.loads(await websocket.receive_text())
+                if frame.get("type") == "ping":
+                    await self._send(websocket, {"type": "pong", "id": frame.get("id")})
+                elif frame.get("type") == "request":
+                    task = asyncio.create_task(self._handle_request(websocket, frame))
+                    tasks.add(task)
+                    task.add_done_callback(tasks.discard)
+        except WebSocketDisconnect:
+            logger.info(f"Hub link disconnected from {self.gate_id}")
+        except Exception as e:
+            logger.error(f"Hub link error: {e}")
+        finally:
+            for task in tasks:
+                task.cancel()
+            if websocket in self._connections:
+                self._connections.remove(websocket)
+            self._send_locks.pop(id(websocket), None)
+
+    async def _handle_request(self, websocket: WebSocket, frame: dict):
+        """Jalankan handler untuk satu request dan kirim balasannya"""
+        self.stats["requests"] += 1
+        split = urlsplit(frame.get("path", ""))
+        payload = {**dict(parse_qsl(split.query)), **(frame.get("payload") or {})}
+
+        handler = self._handlers.get(split.path)
+        if handler is None:
+            status, result = 404, {"detail": f"Not found: {split.path}"}
+        else:
+            try:
+                status, result = 200, await handler(payload)
+            except HTTPException as e:
+                status, result = e.status_code, {"detail": e.detail}
+            except ValidationError as e:
+                status, result = 422, {"detail": e.errors()}
+            except Exception as e:
+                logger.error(f"Hub link handler error for {split.path}: {e}")
+                status, result = 500, {"detail": str(e)}
+
+        if status != 200:
+            self.stats["errors"] += 1
+        await self._send(websocket, {"type": "response", "id": frame.get("id"), "status": status, "payload": result})
+
+    async def _send(self, websocket: WebSocket, message):
+        """Kirim frame (dict, atau teks JSON yang sudah di-encode)"""
+        lock = self._send_locks.get(id(websocket))
+        if lock is None:
+            return
+        if isinstance(message, str):
+            data = message
+        else:
+            data = encode_message(message, strict=False)  # Tipe tak dikenal di hasil handler
+        async with lock:
+            await websocket.send_text(data)
+
+    async def push_event(self, message: dict):
+        """Push event (status, transisi gate, kartu) ke semua hub yang terhubung"""
+        # Sekali untuk semua hub; tipe tak dikenal dijadikan string agar event tetap terkirim
+        data = encode_message({"type": "event", "payload": message}, strict=False)
+        for websocket in list(self._connections):
+            try:
+                await self._send(websocket, data)
+                self.stats["events"] += 1
+            except Exception as e:
+                logger.warning(f"Failed to push event to hub: {e}")
+
+    def get_status(self) -> dict:
+        return {"connections": len(self._connections), **self.stats}
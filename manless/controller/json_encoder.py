@@ -0,0 +1,96 @@
+"""
+Custom JSON Encoder untuk menangani datetime objects
+Mengatasi error "Object of type datetime is not JSON serializable"
+
+encode_message() adalah jalur serialisasi untuk broadcast: pesan di-encode tepat satu kali
+dengan encoder C bawaan json, dan tipe yang dikenal (datetime/date/time, Decimal, UUID, Enum,
+set, model pydantic) dikonversi lewat hook default tanpa menelusuri seluruh objek terlebih dahulu.
+"""
+
+import json
+from datetime import datetime, date, time
+from decimal import Decimal
+from enum import Enum
+from typing import Any
+from uuid import UUID
+
+def _isoformat(obj) -> str:
+    return obj.isoformat()
+
+# Lookup per tipe persis (jalur cepat); subclass ditangani lewat isinstance di _default
+_CONVERTERS = {
+    datetime: _isoformat,
+    date: _isoformat,
+    time: _isoformat,
+    Decimal: float,
+    UUID: str,
+    set: list,
+    frozenset: list,
+}
+
+def _default(obj: Any) -> Any:
+    """Konversi tipe non-JSON yang dikenal; selain itu TypeError seperti json biasa"""
+    converter = _CONVERTERS.get(type(obj))
+    if converter is not None:
+        return converter(obj)
+    if isinstance(obj, (datetime, date, time)):
+        return obj.isoformat()
+    if isinstance(obj, Enum):
+        return obj.value
+    if hasattr(obj, "model_dump"):  # pydantic v2
+        return obj.model_dump(mode="json")
+    if hasattr(obj, "dict") and hasattr(obj, "__fields__"):  # pydantic v1
+        return obj.dict()
+    if isinstance(obj, (set, frozenset)):
+        return list(obj)
+    raise TypeError(f"Object of type {type(obj).__name__} is not JSON serializable")
+
+# Satu encoder dipakai ulang (format sama dengan WebSocket.send_json milik Starlette)
+_MESSAGE_ENCODER = json.JSONEncoder(default=_default, ensure_ascii=False, separators=(",", ":"))
+
+def _default_or_str(obj: Any) -> Any:
+    try:
+        return _default(obj)
+    except TypeError:
+        return str(obj)
+
+# Fallback: tipe yang tidak dikenal (mis. numpy scalar, bytes) dijadikan string, pesan tetap terkirim
+_LENIENT_ENCODER = json.JSONEncoder(default=_default_or_str, ensure_ascii=False, separators=(",", ":"))
+
+def encode_message(message: Any, strict: bool = True) -> str:
+    """Serialize pesan WebSocket satu kali; hasilnya dikirim apa adanya ke setiap client
+
+    strict=False: tipe tak dikenal dijadikan string alih-alih TypeError.
+    """
+    try:
+        return _MESSAGE_ENCODER.encode(message)
+    except TypeError:
+        if strict:
+            raise
+        return _LENIENT_ENCODER.encode(message)
+
+class DateTimeEncoder(json.JSONEncoder):
+    """Custom JSON encoder yang bisa handle datetime objects"""
+    
+    def default(self, obj: Any) -> Any:
+        return _default(obj)
+
+def json_serialize(data: Any) -> str:
+    """Serialize data ke JSON dengan custom encoder"""
+    return json.dumps(data, cls=DateTimeEncoder, ensure_ascii=False, indent=2)
+
+def safe_json_response(data: Any) -> Any:
+    """Convert data ke format yang safe untuk JSON response"""
+    def convert_datetime(obj):
+        if isinstance(obj, datetime):
+            return obj.isoformat()
+        elif isinstance(obj, date):
+            return obj.isoformat()
+        elif isinstance(obj, dict):
+            return {k: convert_datetime(v) for k, v in obj.items()}
+        elif isinstance(obj, list):
+            return [convert_datetime(item) for item in obj]
+        else:
+            return obj
+    
+    return convert_datetime(data) 
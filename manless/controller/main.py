@@ -33,6 +33,7 @@ from hardware.camera import CameraController
 from hardware.card_reader import CardReaderController
 from hardware.arduino import ArduinoController
 from hardware_detector import hardware_detector
+from card_cache import CardCache
 
 # Pydantic models
 class ParkingEntryRequest(BaseModel):
@@ -62,6 +63,7 @@ BACKEND_HOST = "localhost"
 BACKEND_PORT = 8000
 BACKEND_WS_URL = f"ws://{BACKEND_HOST}:{BACKEND_PORT}/ws"
 BACKEND_API_URL = f"http://{BACKEND_HOST}:{BACKEND_PORT}/api"
+CARD_CACHE_SYNC_INTERVAL = 30  # seconds, interval sinkronisasi delta index kartu
 
 class BackendClient:
     """Client untuk komunikasi dengan backend"""
@@ -121,6 +123,7 @@ backend_client = BackendClient()
 camera_controller = CameraController("0")  # Default webcam
 card_reader_controller = CardReaderController()
 arduino_controller = ArduinoController()
+card_cache = CardCache(f"http://{BACKEND_HOST}:{BACKEND_PORT}", sync_interval=CARD_CACHE_SYNC_INTERVAL)
 
 # WebSocket connections
 active_connections: List[WebSocket] = []
@@ -132,6 +135,7 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info("🚀 Starting Controller Application...")
     await backend_client.start()
+    await card_cache.start()
     await camera_controller.initialize()
     await card_reader_controller.initialize()
     await arduino_controller.initialize()
@@ -153,6 +157,7 @@ async def lifespan(app: FastAPI):
     logger.info("🔄 Shutting down Controller Application...")
     hardware_detector.stop_detection()
     await backend_client.stop()
+    await card_cache.stop()
     await camera_controller.cleanup()
     await card_reader_controller.cleanup()
     await arduino_controller.cleanup()
@@ -292,6 +297,13 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
 # WEBSOCKET MESSAGE HANDLERS
 # ========================================
 
+async def validate_card(card_id: str) -> bool:
+    """Validasi kartu dari card cache; sebelum cache pernah termuat, tanya backend seperti sebelumnya"""
+    if card_cache.loaded:
+        return (await card_cache.check(card_id))[0]
+    card_data = await backend_client.get_from_backend(f"cards/{card_id}")
+    return "error" not in card_data
+
 async def handle_parking_entry(payload: dict, websocket: WebSocket):
     """Handle parking entry request"""
     card_id = payload.get("card_id")
@@ -303,10 +315,8 @@ async def handle_parking_entry(payload: dict, websocket: WebSocket):
         })
         return
     
-    # Validasi kartu dengan backend
-    card_data = await backend_client.get_from_backend(f"cards/{card_id}")
-    
-    if "error" in card_data:
+    # Validasi kartu dari card cache lokal (tanpa round trip ke backend)
+    if not await validate_card(card_id):
         await websocket.send_json({
             "type": "entry_denied",
             "payload": {
@@ -707,9 +717,7 @@ async def get_system_status():
 async def parking_entry(request: ParkingEntryRequest):
     """Process parking entry via HTTP API"""
     # Similar logic to WebSocket handler
-    card_data = await backend_client.get_from_backend(f"cards/{request.card_id}")
-    
-    if "error" in card_data:
+    if not await validate_card(request.card_id):
         raise HTTPException(status_code=400, detail="Card validation failed")
     
     gate_result = await arduino_controller.open_gate()
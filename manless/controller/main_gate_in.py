@@ -23,7 +23,12 @@ import config_gate_in as config
 from hardware.camera import CameraController
 from hardware.card_reader import CardReaderController  
 from hardware.arduino import ArduinoController
+from hub_link import HubLink
+from event_log import EventLog
+from broadcaster import Broadcaster
+from status_delta import StatusPublisher
 from hardware_detector import hardware_detector
+from card_cache import CardCache
 
 # Setup logging
 logging.basicConfig(
@@ -34,19 +39,11 @@ logger = logging.getLogger(__name__)
 
 # --- Helper Functions ---
 async def broadcast_to_all(message: dict):
-    """Broadcast message to all connected clients"""
-    if not active_connections:
-        return
-    
-    disconnected = []
-    for connection in active_connections:
-        try:
-            await connection.send_json(message)
-        except:
-            disconnected.append(connection)
-    
-    for connection in disconnected:
-        active_connections.remove(connection)
+    """Broadcast message to all connected clients (dan ke central hub lewat hub link)"""
+    event_log.record(message)
+    if hub_link.connected:
+        await hub_link.push_event(message)
+    broadcaster.broadcast(message)  # Antre per client, tidak menunggu client yang lambat
 
 async def get_unified_system_status():
     """Membangun dan mengembalikan objek status sistem yang konsisten dari HardwareDetector."""
@@ -82,18 +79,45 @@ async def get_unified_system_status():
         "gate_name": config.GATE_NAME,
         "timestamp": datetime.now().isoformat(),
         "hardware": unified_hardware_status,
+        "card_cache": card_cache.get_status(),
+        "websocket": {**broadcaster.get_status(), "status_delta": status_publisher.get_status()},
         "status": "ok"
     }
 
 async def broadcast_unified_status():
-    """Builds the unified status and broadcasts it to all WebSocket clients."""
+    """Builds the unified status and publishes it: patch berversi ke client delta, snapshot ke client lama."""
     unified_status = await get_unified_system_status()
-    message = {
-        "type": "hardware_status",
-        "payload": unified_status.get('hardware', {}),
-        "timestamp": datetime.now().isoformat()
-    }
-    await broadcast_to_all(message)
+    hardware = unified_status.get('hardware', {})
+    timestamp = datetime.now().isoformat()
+    if status_publisher.publish(hardware, timestamp=timestamp) is None:
+        return  # Tidak ada field yang berubah
+    if hub_link.connected:
+        await hub_link.push_event({
+            "type": "hardware_status",
+            "payload": hardware,
+            "timestamp": timestamp
+        })
+
+async def card_event_task():
+    """Konsumsi event stream card reader: siarkan tap, dan proses entry lokal jika CARD_AUTO_ENTRY"""
+    async for card_event in card_reader.events():
+        try:
+            await broadcast_to_all({
+                "type": "card_detected",
+                "payload": card_event
+            })
+            if not config.CARD_AUTO_ENTRY:
+                continue  # Hub menerima card_detected lewat hub link dan menjalankan entry
+            result = await process_parking_entry({
+                "card_id": card_event["card_id"],
+                "timestamp": card_event["timestamp"]
+            })
+            await broadcast_to_all({
+                "type": "entry_result",
+                "payload": result
+            })
+        except Exception as e:
+            logger.error(f"Error processing card event: {e}")
 # --- End of Helper Functions ---
 
 @asynccontextmanager
@@ -117,6 +141,15 @@ async def lifespan(app: FastAPI):
     
     hardware_detector.set_status_callback(hardware_status_callback)
     
+    # Siarkan transisi state machine gate ke frontend
+    def gate_transition_callback(event):
+        asyncio.create_task(broadcast_to_all({
+            "type": "gate_transition",
+            "payload": event
+        }))
+    
+    arduino.add_transition_listener(gate_transition_callback)
+    
     # Inisialisasi dan mulai semua komponen
     if config.ARDUINO_ENABLED:
         await arduino.initialize()
@@ -124,9 +157,15 @@ async def lifespan(app: FastAPI):
         await camera.initialize()
     if config.CARD_READER_ENABLED:
         await card_reader.initialize()
+    if not config.SIMULATION_MODE:
+        await card_cache.start()
         
     hardware_detector.start_detection()
     
+    card_events = None
+    if config.CARD_READER_ENABLED:
+        card_events = asyncio.create_task(card_event_task())
+    
     logger.info("System startup complete. All components initialized.")
     
     try:
@@ -134,6 +173,8 @@ async def lifespan(app: FastAPI):
     finally:
         # Shutdown
         logger.info("Shutting down system...")
+        if card_events:
+            card_events.cancel()
         hardware_detector.stop_detection()
         
         if config.ARDUINO_ENABLED:
@@ -142,6 +183,8 @@ async def lifespan(app: FastAPI):
             await camera.cleanup()
         if config.CARD_READER_ENABLED:
             await card_reader.cleanup()
+        if not config.SIMULATION_MODE:
+            await card_cache.stop()
             
         logger.info("System shutdown complete.")
 
@@ -175,19 +218,48 @@ class GateControlRequest(BaseModel):
 class CameraControlRequest(BaseModel):
     command: str  # "capture_image", "start_stream", "stop_stream"
 
+class CardInvalidationRequest(BaseModel):
+    card_ids: List[str]
+
 # Initialize hardware controllers
 camera = CameraController(config.CAMERA_SOURCE)
-card_reader = CardReaderController(config.CARD_READER_PORT)
+card_reader = CardReaderController(
+    config.CARD_READER_PORT,
+    baudrate=config.CARD_READER_BAUDRATE,
+    duplicate_window=config.CARD_DUPLICATE_WINDOW
+)
 arduino = ArduinoController(config.ARDUINO_PORT)
+card_cache = CardCache(
+    config.BACKEND_URL,
+    sync_interval=config.CARD_CACHE_SYNC_INTERVAL,
+    use_revocation_filter=config.CARD_VALIDATION_MODE == "filter"
+)
+
+# WebSocket clients: antrean keluar terbatas + writer per client
+broadcaster = Broadcaster(config.GATE_ID, max_queue=config.WS_SEND_QUEUE, send_timeout=config.WS_SEND_TIMEOUT,
+                          coalesce_window=config.WS_COALESCE_WINDOW)
+
+# Status hardware berversi (snapshot saat status_resync, lalu patch per field)
+status_publisher = StatusPublisher(broadcaster)
 
-# WebSocket connections
-active_connections: List[WebSocket] = []
+# Koneksi persisten dari central hub (request/response + push event)
+hub_link = HubLink(config.GATE_ID)
+
+# Log event gate yang bisa dipaginasi (dibaca hub lewat /api/logs)
+event_log = EventLog(config.GATE_ID, ("entry_event", "card_detected", "gate_transition"))
+
+@app.websocket("/ws/hub")
+async def hub_link_endpoint(websocket: WebSocket):
+    """WebSocket persisten untuk central hub"""
+    await hub_link.serve(websocket)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint untuk real-time communication"""
     await websocket.accept()
-    active_connections.append(websocket)
+    broadcaster.add(websocket)
+    if websocket.query_params.get("batch") in ("1", "true"):
+        broadcaster.set_batching(websocket)  # Frame berupa array pesan per window
     logger.info(f"WebSocket client connected to {config.GATE_NAME}")
     
     try:
@@ -197,8 +269,8 @@ async def websocket_endpoint(websocket: WebSocket):
     except WebSocketDisconnect:
         logger.info(f"WebSocket client disconnected from {config.GATE_NAME}")
     finally:
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+        broadcaster.remove(websocket)
+        status_publisher.remove(websocket)
 
 async def handle_websocket_message(message: str, websocket: WebSocket):
     """Handle incoming WebSocket messages"""
@@ -207,7 +279,11 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
         message_type = data.get("type")
         payload = data.get("payload", {})
         
-        if message_type == "card_scan":
+        if message_type == "status_resync":
+            # Client delta: snapshot penuh + versi, setelah itu hanya patch
+            status_publisher.resync(websocket)
+            
+        elif message_type == "card_scan":
             # Handle card scan simulation
             card_id = payload.get("card_id", "TEST_CARD_001")
             
@@ -261,9 +337,8 @@ async def process_parking_entry(request_data: dict) -> dict:
             card_type = "visitor"
             vehicle_type = "car"
         else:
-            # Real card validation would go here
-            card_valid = await validate_card(card_id)
-            card_type = await get_card_type(card_id)
+            # Validasi lokal dari card cache (satu lookup, tanpa round trip ke hub)
+            card_valid, card_type = await lookup_card(card_id)
             vehicle_type = await detect_vehicle_type()
         
         if not card_valid:
@@ -322,18 +397,34 @@ async def process_parking_entry(request_data: dict) -> dict:
             "timestamp": datetime.now().isoformat()
         }
 
+async def lookup_card(card_id: str) -> tuple:
+    """Validasi kartu dan ambil tipenya dalam satu lookup ke card cache"""
+    if card_cache.loaded:
+        card_valid, card_type = await card_cache.check(card_id)
+        return card_valid, card_type or guess_card_type(card_id)
+    
+    # Cache belum pernah termuat (hub tidak terjangkau sejak start): perilaku lama
+    return await validate_card(card_id), guess_card_type(card_id)
+
 async def validate_card(card_id: str) -> bool:
     """Validate parking card"""
     # In simulation mode, accept most cards
     if config.SIMULATION_MODE:
         return card_id not in ["BLOCKED_001", "EXPIRED_001"]
     
-    # Real validation logic would go here
+    if card_cache.loaded:
+        return (await card_cache.check(card_id))[0]
     return True
 
 async def get_card_type(card_id: str) -> str:
     """Get card type"""
-    # Simulate card type detection
+    entry = card_cache.lookup(card_id) if card_cache.loaded else None
+    if entry:
+        return entry["card_type"]
+    return guess_card_type(card_id)
+
+def guess_card_type(card_id: str) -> str:
+    """Tebak tipe kartu dari prefix ID"""
     if card_id.startswith("EMP"):
         return "employee"
     elif card_id.startswith("VIP"):
@@ -430,19 +521,26 @@ async def get_camera_stream():
     return f"http://{config.HOST}:{config.PORT}/api/camera/stream"
 
 @app.get("/api/logs")
-async def get_logs(limit: int = 50):
-    """Get recent logs"""
-    # This would read from log file in production
-    return {
-        "logs": [],
-        "limit": limit,
-        "gate": config.GATE_ID
-    }
+async def get_logs(limit: int = 50, before: Optional[int] = None, event_type: Optional[str] = None,
+                   card_id: Optional[str] = None):
+    """Get recent logs (terbaru lebih dulu; before=<seq> untuk halaman berikutnya)"""
+    return event_log.page(limit, before, event_type, card_id)
 
 # ========================================
 # BACKEND API ENDPOINTS
 # ========================================
 
+@app.post("/api/cards/invalidate")
+async def invalidate_cards(request: CardInvalidationRequest):
+    """Push invalidasi kartu (revoke) dari central hub ke card cache lokal"""
+    count = card_cache.invalidate(request.card_ids)
+    return {
+        "status": "ok",
+        "invalidated": count,
+        "gate": config.GATE_ID,
+        "timestamp": datetime.now().isoformat()
+    }
+
 @app.post("/api/backend/gate/control")
 async def backend_gate_control(request: GateControlRequest):
     """API endpoint untuk menerima perintah gate control dari backend"""
@@ -517,6 +615,19 @@ async def backend_parking_entry(request: ParkingEntryRequest):
         logger.error(f"Error in backend parking entry: {e}")
         raise HTTPException(status_code=500, detail=str(e))
 
+# Endpoint yang juga dilayani lewat hub link (path sama dengan HTTP API)
+hub_link.register("/api/status", lambda payload: get_status())
+hub_link.register("/api/parking/entry", lambda payload: parking_entry(ParkingEntryRequest(**payload)))
+hub_link.register("/api/gate/control", lambda payload: gate_control(GateControlRequest(**payload)))
+hub_link.register("/api/camera/control", lambda payload: camera_control(CameraControlRequest(**payload)))
+hub_link.register("/api/logs", lambda payload: get_logs(
+    int(payload.get("limit", 50)),
+    int(payload["before"]) if payload.get("before") else None,
+    payload.get("event_type"),
+    payload.get("card_id")
+))
+hub_link.register("/api/cards/invalidate", lambda payload: invalidate_cards(CardInvalidationRequest(**payload)))
+
 # Startup and shutdown events now handled by lifespan context manager
 
 if __name__ == "__main__":
@@ -23,6 +23,9 @@ import config_gate_out as config
 from hardware.camera import CameraController
 from hardware.card_reader import CardReaderController  
 from hardware.arduino import ArduinoController
+from hub_link import HubLink
+from event_log import EventLog
+from broadcaster import Broadcaster
 
 # Setup logging
 logging.basicConfig(
@@ -37,6 +40,15 @@ async def lifespan(app: FastAPI):
     # Startup
     logger.info(f"Starting {config.GATE_NAME} Controller...")
     
+    # Siarkan transisi state machine gate ke frontend
+    def gate_transition_callback(event):
+        asyncio.create_task(broadcast_to_all({
+            "type": "gate_transition",
+            "payload": event
+        }))
+    
+    arduino.add_transition_listener(gate_transition_callback)
+    
     # Initialize hardware
     if config.CAMERA_ENABLED:
         await camera.initialize()
@@ -116,14 +128,28 @@ camera = CameraController(config.CAMERA_SOURCE)
 card_reader = CardReaderController(config.CARD_READER_PORT, config.SIMULATION_MODE)
 arduino = ArduinoController(config.ARDUINO_PORT, config.SIMULATION_MODE)
 
-# WebSocket connections
-active_connections: List[WebSocket] = []
+# WebSocket clients: antrean keluar terbatas + writer per client
+broadcaster = Broadcaster(config.GATE_ID, max_queue=config.WS_SEND_QUEUE, send_timeout=config.WS_SEND_TIMEOUT,
+                          coalesce_window=config.WS_COALESCE_WINDOW)
+
+# Koneksi persisten dari central hub (request/response + push event)
+hub_link = HubLink(config.GATE_ID)
+
+# Log event gate yang bisa dipaginasi (dibaca hub lewat /api/logs)
+event_log = EventLog(config.GATE_ID, ("exit_event", "payment_result", "gate_transition"))
+
+@app.websocket("/ws/hub")
+async def hub_link_endpoint(websocket: WebSocket):
+    """WebSocket persisten untuk central hub"""
+    await hub_link.serve(websocket)
 
 @app.websocket("/ws")
 async def websocket_endpoint(websocket: WebSocket):
     """WebSocket endpoint untuk real-time communication"""
     await websocket.accept()
-    active_connections.append(websocket)
+    broadcaster.add(websocket)
+    if websocket.query_params.get("batch") in ("1", "true"):
+        broadcaster.set_batching(websocket)  # Frame berupa array pesan per window
     logger.info(f"WebSocket client connected to {config.GATE_NAME}")
     
     try:
@@ -133,8 +159,7 @@ async def websocket_endpoint(websocket: WebSocket):
     except WebSocketDisconnect:
         logger.info(f"WebSocket client disconnected from {config.GATE_NAME}")
     finally:
-        if websocket in active_connections:
-            active_connections.remove(websocket)
+        broadcaster.remove(websocket)
 
 async def handle_websocket_message(message: str, websocket: WebSocket):
     """Handle incoming WebSocket messages"""
@@ -189,19 +214,11 @@ async def handle_websocket_message(message: str, websocket: WebSocket):
         })
 
 async def broadcast_to_all(message: dict):
-    """Broadcast message to all connected clients"""
-    if not active_connections:
-        return
-    
-    disconnected = []
-    for connection in active_connections:
-        try:
-            await connection.send_json(message)
-        except:
-            disconnected.append(connection)
-    
-    for connection in disconnected:
-        active_connections.remove(connection)
+    """Broadcast message to all connected clients (dan ke central hub lewat hub link)"""
+    event_log.record(message)
+    if hub_link.connected:
+        await hub_link.push_event(message)
+    broadcaster.broadcast(message)  # Antre per client, tidak menunggu client yang lambat
 
 async def process_parking_exit(request_data: dict) -> dict:
     """Process parking exit request"""
@@ -497,6 +514,7 @@ async def get_status():
             "fee_calculation": True
         },
         "simulation_mode": config.SIMULATION_MODE,
+        "websocket": broadcaster.get_status(),
         "timestamp": datetime.now().isoformat()
     }
 
@@ -590,14 +608,24 @@ async def get_camera_stream():
     return f"http://{config.HOST}:{config.PORT}/api/camera/stream"
 
 @app.get("/api/logs")
-async def get_logs(limit: int = 50):
-    """Get recent logs"""
-    # This would read from log file in production
-    return {
-        "logs": [],
-        "limit": limit,
-        "gate": config.GATE_ID
-    }
+async def get_logs(limit: int = 50, before: Optional[int] = None, event_type: Optional[str] = None,
+                   card_id: Optional[str] = None):
+    """Get recent logs (terbaru lebih dulu; before=<seq> untuk halaman berikutnya)"""
+    return event_log.page(limit, before, event_type, card_id)
+
+# Endpoint yang juga dilayani lewat hub link (path sama dengan HTTP API)
+hub_link.register("/api/status", lambda payload: get_status())
+hub_link.register("/api/parking/exit", lambda payload: parking_exit(ParkingExitRequest(**payload)))
+hub_link.register("/api/payment/process", lambda payload: payment_process(PaymentRequest(**payload)))
+hub_link.register("/api/receipt/print", lambda payload: receipt_print(ReceiptRequest(**payload)))
+hub_link.register("/api/gate/control", lambda payload: gate_control(GateControlRequest(**payload)))
+hub_link.register("/api/camera/control", lambda payload: camera_control(CameraControlRequest(**payload)))
+hub_link.register("/api/logs", lambda payload: get_logs(
+    int(payload.get("limit", 50)),
+    int(payload["before"]) if payload.get("before") else None,
+    payload.get("event_type"),
+    payload.get("card_id")
+))
 
 # Startup and shutdown events now handled by lifespan context manager
 
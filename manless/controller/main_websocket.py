@@ -163,6 +163,7 @@ class ControllerApplication:
                 "gate_id": self.gate_id,
                 "controller_status": "running",
                 "websocket_connected": self.ws_manager.is_connected(),
+                "outbox": self.ws_manager.client.outbox.get_status(),
                 "hardware": self.last_hardware_status,
                 "timestamp": datetime.now().isoformat()
             }
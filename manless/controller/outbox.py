@@ -0,0 +1,310 @@
+"""
+Outbox untuk WebSocket Client Controller
+Antrean keluar terbatas ke backend yang tahan restart controller dan backend yang mati.
+
+Prioritas pengiriman (batch berikutnya selalu diisi dari kelas tertinggi dulu):
+- control : event parkir, kartu, error, dll. Ditulis ke journal di disk (fsync) sebelum
+            dianggap masuk dan dikirim ulang sampai backend mengirim ack
+- status  : hardware_status, system_status, gate_status; hanya yang terbaru per tipe disimpan
+- camera  : camera_frame; hanya beberapa frame terbaru, tidak pernah dikirim ulang
+
+Sequence link: setiap pesan yang dikirim diberi "seq" naik (urutan kirim) dan "epoch" outbox;
+pesan control juga membawa "id" tetap dari journal. Backend menyimpan seq terakhir yang
+diproses per gate dan membalas ack kumulatif {"type": "ack", "payload": {"seq": N}}.
+Pesan yang sudah dikirim (kecuali camera) disimpan di replay buffer terbatas sampai di-ack.
+
+Resume: saat koneksi baru backend mengirim {"type": "resume", "payload": {"epoch", "seq"}}.
+- epoch sama dan seq masih di dalam replay buffer : hanya pesan setelah seq dikirim ulang,
+  dengan seq aslinya
+- selain itu (gap terlalu besar, backend restart)  : resync; status terbaru per tipe dikirim
+  sebagai frame {"type": "resync"} lalu semua control yang belum di-ack
+
+Journal berupa JSON per baris: {"epoch"} (header), {"id", "message"}, {"ack": id} dan
+{"reserve": seq}. Blok seq dicadangkan di journal agar seq tetap naik setelah controller
+restart dalam epoch yang sama. Journal dipadatkan setelah compact_after pesan di-ack.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import uuid
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+STATUS_TYPES = frozenset({"hardware_status", "system_status", "gate_status"})
+CAMERA_TYPES = frozenset({"camera_frame"})
+
+CONTROL = "control"
+STATUS = "status"
+CAMERA = "camera"
+
+SEQ_RESERVE_BLOCK = 1000
+
+class Outbox:
+    """Antrean keluar berprioritas dengan journal untuk pesan control dan replay buffer"""
+
+    def __init__(self, path: str, max_messages: int = 1000, camera_keep: int = 2, compact_after: int = 200,
+                 replay_size: int = 500):
+        self.path = path
+        self.max_messages = max_messages
+        self.compact_after = compact_after
+        self.replay_size = replay_size
+        self.epoch: Optional[str] = None
+        self.ready = asyncio.Event()
+        self._control: "OrderedDict[int, dict]" = OrderedDict()  # id -> pesan yang belum di-ack
+        self._control_seq: Dict[int, int] = {}                    # id -> seq saat terakhir dikirim
+        self._status: "OrderedDict[str, dict]" = OrderedDict()    # tipe -> pesan terbaru yang belum dikirim
+        self._latest: Dict[str, dict] = {}                        # tipe -> status terbaru (untuk resync)
+        self._camera: deque = deque(maxlen=camera_keep)
+        self._replay: "OrderedDict[int, dict]" = OrderedDict()   # seq -> pesan terkirim, belum di-ack
+        self._resend: deque = deque()                            # pesan replay yang menunggu dikirim ulang
+        self._evicted_seq = 0      # seq tertinggi yang sudah keluar dari replay buffer tanpa ack
+        self._next_id = 1
+        self._acked_id = 0
+        self._next_seq = 1
+        self._reserved_seq = 0
+        self._acked_since_compact = 0
+        self._file = None
+        self._lock = asyncio.Lock()
+        self.stats = {"queued": 0, "sent": 0, "acked": 0, "superseded": 0, "dropped": 0, "compactions": 0,
+                      "replayed": 0, "resyncs": 0}
+
+    def classify(self, message: dict) -> str:
+        message_type = message.get("type")
+        if message_type in STATUS_TYPES:
+            return STATUS
+        if message_type in CAMERA_TYPES:
+            return CAMERA
+        return CONTROL
+
+    async def open(self):
+        """Muat journal (pesan control yang belum di-ack dari run sebelumnya)"""
+        async with self._lock:
+            if self._file is None:
+                await asyncio.to_thread(self._load)
+
+    def _load(self):
+        directory = os.path.dirname(self.path)
+        if directory:
+            os.makedirs(directory, exist_ok=True)
+        pending: Dict[int, dict] = {}
+        torn = False
+        if os.path.exists(self.path):
+            with open(self.path, "r", encoding="utf-8") as f:
+                for line in f:
+                    # Baris terakhir tanpa newline = crash saat menulis; sisanya harus dibuang
+                    # sebelum append berikutnya, kalau tidak record baru menempel di baris rusak
+                    torn = not line.endswith("\n")
+                    try:
+                        record = json.loads(line)
+                    except ValueError:
+                        torn = True
+                        break
+                    if "epoch" in record:
+                        self.epoch = record["epoch"]
+                    elif "ack" in record:
+                        self._acked_id = max(self._acked_id, record["ack"])
+                    elif "reserve" in record:
+                        self._reserved_seq = max(self._reserved_seq, record["reserve"])
+                    elif "id" in record:
+                        pending[record["id"]] = record["message"]
+                        self._next_id = max(self._next_id, record["id"] + 1)
+        self._next_id = max(self._next_id, self._acked_id + 1)
+        # Seq yang mungkin sudah terpakai sebelum restart tidak dipakai ulang (dan tidak bisa di-replay)
+        self._next_seq = self._reserved_seq + 1
+        self._evicted_seq = self._reserved_seq
+        for message_id in sorted(pending):
+            if message_id > self._acked_id:
+                self._control[message_id] = pending[message_id]
+        self._acked_since_compact = len(pending) - len(self._control)
+        if self.epoch is None or self._acked_since_compact or torn:
+            self._rewrite()
+        else:
+            self._file = open(self.path, "a", encoding="utf-8")
+        if self._control:
+            logger.info(f"Outbox {self.path}: {len(self._control)} unacknowledged messages restored")
+            self.ready.set()
+
+    def _rewrite(self):
+        """Tulis ulang journal hanya dengan pesan yang belum di-ack (atomic)"""
+        if self._file:
+            self._file.close()
+        self.epoch = self.epoch or uuid.uuid4().hex
+        self._reserved_seq = max(self._reserved_seq, self._next_seq - 1 + SEQ_RESERVE_BLOCK)
+        temp_path = f"{self.path}.tmp"
+        with open(temp_path, "w", encoding="utf-8") as f:
+            f.write(json.dumps({"epoch": self.epoch}) + "\n")
+            f.write(json.dumps({"reserve": self._reserved_seq}) + "\n")
+            if self._acked_id:
+                f.write(json.dumps({"ack": self._acked_id}) + "\n")
+            for message_id, message in self._control.items():
+                f.write(json.dumps({"id": message_id, "message": message}, default=str) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, self.path)
+        self._file = open(self.path, "a", encoding="utf-8")
+        self._acked_since_compact = 0
+
+    def _append(self, record: dict, sync: bool):
+        self._file.write(json.dumps(record, default=str) + "\n")
+        self._file.flush()
+        if sync:
+            os.fsync(self._file.fileno())
+
+    async def put(self, message: dict) -> Optional[int]:
+        """Masukkan pesan; untuk control kembalikan id setelah tersimpan di disk"""
+        message_class = self.classify(message)
+        self.stats["queued"] += 1
+        if message_class == STATUS:
+            if self._status.pop(message.get("type"), None) is not None:
+                self.stats["superseded"] += 1
+            self._status[message.get("type")] = message
+            self._latest[message.get("type")] = message
+        elif message_class == CAMERA:
+            if len(self._camera) == self._camera.maxlen:
+                self.stats["superseded"] += 1
+            self._camera.append(message)
+        else:
+            await self.open()
+            async with self._lock:
+                message_id = self._next_id
+                self._next_id += 1
+                message = {**message, "id": message_id}
+                await asyncio.to_thread(self._append, {"id": message_id, "message": message}, True)
+                self._control[message_id] = message
+                if len(self._control) > self.max_messages:
+                    # Outbox penuh: pesan control tertua dibuang (dicatat sebagai ack lokal)
+                    dropped, _ = self._control.popitem(last=False)
+                    self._control_seq.pop(dropped, None)
+                    self.stats["dropped"] += 1
+                    logger.warning(f"Outbox full ({self.max_messages}), dropped message id {dropped}")
+                    await self._ack_ids(dropped)
+            self.ready.set()
+            return message_id
+        self.ready.set()
+        return None
+
+    async def take(self, limit: int) -> List[dict]:
+        """Ambil batch berikutnya: kiriman ulang, control baru, status, lalu camera"""
+        batch = []
+        while self._resend and len(batch) < limit:
+            batch.append(self._resend.popleft())  # seq asli dipertahankan
+        fresh = []
+        for message_id, message in self._control.items():
+            if len(batch) + len(fresh) >= limit:
+                break
+            if message_id not in self._control_seq:
+                fresh.append(message)
+        while self._status and len(batch) + len(fresh) < limit:
+            fresh.append(self._status.popitem(last=False)[1])
+        while self._camera and len(batch) + len(fresh) < limit:
+            fresh.append(self._camera.popleft())
+        if fresh:
+            batch.extend(await self._stamp(fresh))
+        if not self.has_unsent():
+            self.ready.clear()
+        self.stats["sent"] += len(batch)
+        return batch
+
+    async def _stamp(self, messages: List[dict]) -> List[dict]:
+        """Beri seq link dan simpan di replay buffer"""
+        if self._next_seq + len(messages) - 1 > self._reserved_seq:
+            await self.open()
+            async with self._lock:
+                self._reserved_seq = self._next_seq + len(messages) - 1 + SEQ_RESERVE_BLOCK
+                await asyncio.to_thread(self._append, {"reserve": self._reserved_seq}, True)
+        stamped = []
+        for message in messages:
+            seq = self._next_seq
+            self._next_seq += 1
+            message = {**message, "seq": seq, "epoch": self.epoch}
+            if "id" in message:
+                self._control_seq[message["id"]] = seq
+            if self.classify(message) != CAMERA:
+                self._replay[seq] = message
+            stamped.append(message)
+        while len(self._replay) > self.replay_size:
+            self._evicted_seq, _ = self._replay.popitem(last=False)
+        return stamped
+
+    def has_unsent(self) -> bool:
+        return bool(self._resend or self._status or self._camera or
+                    len(self._control_seq) < len(self._control))
+
+    async def resume(self, epoch: Optional[str], seq: int) -> Optional[dict]:
+        """Posisi backend saat koneksi baru; kembalikan frame resync jika replay tidak cukup"""
+        self._resend.clear()
+        if epoch == self.epoch and seq >= self._evicted_seq:
+            await self.ack(seq)
+            # Backend melewatkan pesan setelah seq: kirim ulang dari replay buffer
+            self._resend.extend(message for sent_seq, message in self._replay.items() if sent_seq > seq)
+            self.stats["replayed"] += len(self._resend)
+            if self._resend:
+                logger.info(f"Outbox resume at seq {seq}: replaying {len(self._resend)} messages")
+            self.ready.set()
+            return None
+
+        # Gap terlalu besar atau backend tidak mengenal epoch ini: snapshot + semua control
+        self.stats["resyncs"] += 1
+        logger.info(f"Outbox resync (backend at {epoch}:{seq}, replay from seq {self._evicted_seq})")
+        self._replay.clear()
+        self._control_seq.clear()
+        self._status.clear()
+        snapshot = await self._stamp(list(self._latest.values()))
+        self.ready.set()
+        return {"type": "resync", "payload": {"messages": snapshot}}
+
+    async def ack(self, seq: int):
+        """Ack kumulatif dari backend: semua pesan sampai seq sudah diproses"""
+        while self._replay and next(iter(self._replay)) <= seq:
+            self._replay.popitem(last=False)
+        acked_id = 0
+        for message_id in self._control:
+            sent_seq = self._control_seq.get(message_id)
+            if sent_seq is None or sent_seq > seq:
+                break
+            acked_id = message_id
+        if acked_id:
+            async with self._lock:
+                await self._ack_ids(acked_id)
+
+    async def _ack_ids(self, message_id: int):
+        """Buang pesan control sampai id (dipanggil dengan lock)"""
+        if message_id <= self._acked_id or self._file is None:
+            return
+        self._acked_id = message_id
+        removed = 0
+        while self._control and next(iter(self._control)) <= message_id:
+            acked, _ = self._control.popitem(last=False)
+            self._control_seq.pop(acked, None)
+            removed += 1
+        self.stats["acked"] += removed
+        self._acked_since_compact += removed
+        if self._acked_since_compact >= self.compact_after:
+            await asyncio.to_thread(self._rewrite)
+            self.stats["compactions"] += 1
+        else:
+            # Ack yang hilang saat crash hanya menyebabkan kirim ulang, tidak perlu fsync
+            await asyncio.to_thread(self._append, {"ack": message_id}, False)
+
+    async def close(self):
+        async with self._lock:
+            if self._file:
+                self._file.close()
+                self._file = None
+
+    def get_status(self) -> dict:
+        return {
+            "path": self.path,
+            "epoch": self.epoch,
+            "next_seq": self._next_seq,
+            "pending_control": len(self._control),
+            "pending_status": len(self._status),
+            "pending_camera": len(self._camera),
+            "replay_buffer": len(self._replay),
+            "acked_id": self._acked_id,
+            **self.stats
+        }
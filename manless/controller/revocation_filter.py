@@ -0,0 +1,102 @@
+"""
+Revocation Filter - Sistem Parkir Manless
+Bloom filter ringkas untuk kartu yang dicabut/diblokir, ditambah overflow set kecil yang exact.
+
+Backend membangun filter dari Card.is_active == False dan mengirimnya sebagai satu blob
+berversi; controller memuat blob dan menukarnya secara atomik. Lookup O(k) konstan;
+hasil positif hanya berarti "mungkin dicabut" dan perlu dikonfirmasi secara exact.
+
+Catatan: file ini identik di backend/ dan controller/ (backend membangun, controller memuat).
+"""
+
+import hashlib
+import math
+import struct
+from typing import Iterable, Set
+
+# Format blob: magic, format, version, num_bits, num_hashes, num_items, lalu bit array
+BLOB_MAGIC = b"SKRF"
+BLOB_FORMAT = 1
+_HEADER = struct.Struct(">4sBQIBI")
+
+class RevocationFilter:
+    """Bloom filter untuk card_id yang dicabut dengan overflow set exact"""
+
+    def __init__(self, num_bits: int, num_hashes: int, version: int = 0):
+        self.num_bits = max(8, num_bits)
+        self.num_hashes = max(1, num_hashes)
+        self.version = version
+        self.num_items = 0
+        self._bits = bytearray((self.num_bits + 7) // 8)
+        # Revocation yang terjadi setelah blob dibangun (push dari hub) disimpan exact
+        self.overflow: Set[str] = set()
+
+    @classmethod
+    def for_capacity(cls, capacity: int, false_positive_rate: float = 0.001, version: int = 0) -> "RevocationFilter":
+        """Buat filter dengan ukuran optimal untuk jumlah item dan false positive rate"""
+        capacity = max(1, capacity)
+        num_bits = int(math.ceil(-capacity * math.log(false_positive_rate) / (math.log(2) ** 2)))
+        num_hashes = int(round((num_bits / capacity) * math.log(2)))
+        return cls(num_bits, num_hashes, version)
+
+    @classmethod
+    def build(cls, card_ids: Iterable[str], false_positive_rate: float = 0.001, version: int = 0) -> "RevocationFilter":
+        """Bangun filter dari daftar card_id yang dicabut"""
+        card_ids = list(card_ids)
+        revocation_filter = cls.for_capacity(len(card_ids), false_positive_rate, version)
+        for card_id in card_ids:
+            revocation_filter.add(card_id)
+        return revocation_filter
+
+    def _positions(self, card_id: str):
+        """Double hashing: posisi bit ke-i = h1 + i*h2 (mod m)"""
+        digest = hashlib.blake2b(card_id.encode("utf-8"), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "big")
+        h2 = int.from_bytes(digest[8:], "big") | 1
+        for i in range(self.num_hashes):
+            yield (h1 + i * h2) % self.num_bits
+
+    def add(self, card_id: str):
+        """Tambahkan card_id ke bit array"""
+        for position in self._positions(card_id):
+            self._bits[position >> 3] |= 1 << (position & 7)
+        self.num_items += 1
+
+    def might_contain(self, card_id: str) -> bool:
+        """False = pasti tidak dicabut; True = mungkin dicabut (perlu konfirmasi)"""
+        if card_id in self.overflow:
+            return True
+        bits = self._bits
+        return all(bits[position >> 3] & (1 << (position & 7)) for position in self._positions(card_id))
+
+    def to_blob(self) -> bytes:
+        """Serialisasi ke satu blob biner"""
+        header = _HEADER.pack(BLOB_MAGIC, BLOB_FORMAT, self.version, self.num_bits, self.num_hashes, self.num_items)
+        return header + bytes(self._bits)
+
+    @classmethod
+    def from_blob(cls, blob: bytes) -> "RevocationFilter":
+        """Muat filter dari blob; ValueError jika blob tidak valid"""
+        if len(blob) < _HEADER.size:
+            raise ValueError("Revocation filter blob too short")
+        magic, blob_format, version, num_bits, num_hashes, num_items = _HEADER.unpack_from(blob)
+        if magic != BLOB_MAGIC or blob_format != BLOB_FORMAT:
+            raise ValueError("Unsupported revocation filter blob")
+
+        revocation_filter = cls(num_bits, num_hashes, version)
+        bits = blob[_HEADER.size:]
+        if len(bits) != len(revocation_filter._bits):
+            raise ValueError("Revocation filter blob size mismatch")
+        revocation_filter._bits = bytearray(bits)
+        revocation_filter.num_items = num_items
+        return revocation_filter
+
+    def get_status(self) -> dict:
+        """Ringkasan filter untuk API/status"""
+        return {
+            "version": self.version,
+            "items": self.num_items,
+            "overflow": len(self.overflow),
+            "bytes": len(self._bits),
+            "hashes": self.num_hashes
+        }
@@ -0,0 +1,156 @@
+"""
+Status Delta - Sistem Parkir Manless
+Dokumen status berversi dengan patch per field untuk broadcast hardware_status.
+
+Pesan ke client:
+- Snapshot : {"type": "hardware_status", "payload": {...status lengkap}, "version": N}
+- Patch    : {"type": "hardware_status_patch",
+              "payload": {"version": N, "base_version": N-1, "set": [[path, value], ...], "unset": [path, ...]}}
+  path adalah list key, mis. ["arduino", "connected"].
+
+Client delta mengirim {"type": "status_resync"} untuk meminta snapshot; sejak itu ia menerima
+patch. Jika base_version patch tidak sama dengan versi lokalnya (ada patch yang hilang atau
+dibuang karena antrean penuh), client mengirim status_resync lagi.
+Client yang tidak pernah mengirim status_resync tetap menerima snapshot penuh setiap perubahan.
+"""
+
+import copy
+from typing import Any, List, Optional, Tuple
+
+from fastapi import WebSocket
+
+from broadcaster import STATUS, Broadcaster
+
+def diff(old: Any, new: Any, path: Tuple = ()) -> Tuple[List[list], List[list]]:
+    """Perbedaan per field: (set, unset); dict ditelusuri, nilai lain diganti utuh"""
+    changed, removed = [], []
+    if isinstance(old, dict) and isinstance(new, dict):
+        for key, value in new.items():
+            if key not in old:
+                changed.append([list(path + (key,)), value])
+            elif old[key] != value:
+                sub_changed, sub_removed = diff(old[key], value, path + (key,))
+                changed.extend(sub_changed)
+                removed.extend(sub_removed)
+        removed.extend(list(path + (key,)) for key in old if key not in new)
+    elif old != new:
+        changed.append([list(path), new])
+    return changed, removed
+
+def apply_patch(state: dict, patch: dict) -> dict:
+    """Terapkan patch ke state (in place) dan kembalikan state"""
+    for path, value in patch.get("set", []):
+        if not path:
+            return copy.deepcopy(value)
+        node = state
+        for key in path[:-1]:
+            if not isinstance(node.get(key), dict):
+                node[key] = {}
+            node = node[key]
+        node[path[-1]] = value
+    for path in patch.get("unset", []):
+        node = state
+        for key in path[:-1]:
+            node = node.get(key) if isinstance(node, dict) else None
+            if node is None:
+                break
+        if isinstance(node, dict):
+            node.pop(path[-1], None)
+    return state
+
+class StatusDocument:
+    """Status terbaru beserta nomor versi; setiap perubahan menghasilkan satu patch"""
+
+    def __init__(self, message_type: str = "hardware_status"):
+        self.message_type = message_type
+        self.version = 0
+        self.state: dict = {}
+
+    def update(self, new_state: dict) -> Optional[dict]:
+        """Simpan state baru; kembalikan patch, atau None jika tidak ada perubahan"""
+        changed, removed = diff(self.state, new_state)
+        if not changed and not removed and self.version:
+            return None
+        self.version += 1
+        self.state = copy.deepcopy(new_state)
+        patch = {"version": self.version, "base_version": self.version - 1}
+        if changed:
+            patch["set"] = changed
+        if removed:
+            patch["unset"] = removed
+        return patch
+
+    def snapshot_message(self, **extra) -> dict:
+        return {"type": self.message_type, "payload": self.state, "version": self.version, **extra}
+
+    def patch_message(self, patch: dict) -> dict:
+        return {"type": f"{self.message_type}_patch", "payload": patch}
+
+class StatusReplica:
+    """Salinan status di sisi penerima; apply() False = ada versi yang terlewat, perlu resync"""
+
+    def __init__(self, message_type: str = "hardware_status"):
+        self.message_type = message_type
+        self.version: Optional[int] = None
+        self.state: dict = {}
+        self._resync_requested = False
+
+    def apply(self, message: dict) -> bool:
+        message_type = message.get("type")
+        if message_type == self.message_type:
+            self.state = message.get("payload") or {}
+            self.version = message.get("version")
+            self._resync_requested = False
+            return True
+        patch = message.get("payload") or {}
+        if self.version is None or patch.get("base_version") != self.version:
+            return False
+        self.state = apply_patch(self.state, patch)
+        self.version = patch["version"]
+        return True
+
+    def request_resync(self) -> bool:
+        """True jika status_resync perlu dikirim (sekali per gap, sampai snapshot berikutnya tiba)"""
+        if self._resync_requested:
+            return False
+        self._resync_requested = True
+        return True
+
+class StatusPublisher:
+    """Broadcast dokumen status: patch ke client delta, snapshot penuh ke client lama"""
+
+    def __init__(self, broadcaster: Broadcaster, message_type: str = "hardware_status"):
+        self.broadcaster = broadcaster
+        self.document = StatusDocument(message_type)
+        self.delta_clients = set()
+        self.stats = {"patches": 0, "snapshots": 0, "resyncs": 0, "unchanged": 0}
+
+    def publish(self, new_state: dict, **extra) -> Optional[dict]:
+        """Terbitkan state baru (tanpa broadcast jika tidak ada perubahan)"""
+        patch = self.document.update(new_state)
+        if patch is None:
+            self.stats["unchanged"] += 1
+            return None
+        delta_clients = [ws for ws in self.delta_clients if ws in self.broadcaster]
+        self.delta_clients = set(delta_clients)
+        if delta_clients:
+            self.broadcaster.broadcast(self.document.patch_message(patch), STATUS, targets=delta_clients)
+            self.stats["patches"] += 1
+        legacy_clients = [ws for ws in self.broadcaster if ws not in self.delta_clients]
+        if legacy_clients:
+            self.broadcaster.broadcast(self.document.snapshot_message(**extra), STATUS, targets=legacy_clients)
+            self.stats["snapshots"] += 1
+        return patch
+
+    def resync(self, websocket: WebSocket):
+        """Client meminta snapshot (awal atau setelah gap); sejak itu ia menerima patch"""
+        self.delta_clients.add(websocket)
+        self.stats["resyncs"] += 1
+        # Kelas critical: snapshot tidak boleh dibuang demi patch yang bergantung padanya
+        self.broadcaster.send(websocket, self.document.snapshot_message())
+
+    def remove(self, websocket: WebSocket):
+        self.delta_clients.discard(websocket)
+
+    def get_status(self) -> dict:
+        return {"version": self.document.version, "delta_clients": len(self.delta_clients), **self.stats}
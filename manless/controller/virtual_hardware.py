@@ -0,0 +1,318 @@
+#!/usr/bin/env python3
+"""
+Virtual Hardware untuk Arduino dan Card Reader
+Membuat pseudo-terminal (PTY) yang berbicara dengan protokol firmware yang sama,
+sehingga ArduinoController, CardReaderController dan HardwareDetector bisa diuji tanpa hardware.
+
+Contoh:
+    python virtual_hardware.py                      # Jalankan perangkat virtual, cetak path port
+    python virtual_hardware.py --bench 20 --latency 0.02 --jitter 0.005
+"""
+
+import argparse
+import asyncio
+import logging
+import os
+import pty
+import random
+import select
+import statistics
+import threading
+import time
+import tty
+from typing import Dict, List, Optional
+
+# Fault mode yang didukung
+FAULT_DROP = "drop"        # Tidak membalas sama sekali
+FAULT_GARBLE = "garble"    # Membalas dengan data rusak
+FAULT_DELAY = "delay"      # Membalas sangat terlambat (melewati timeout driver)
+FAULT_MODES = (FAULT_DROP, FAULT_GARBLE, FAULT_DELAY)
+
+PING_TOKEN = "SKY_PARKING_AJIB"
+
+class VirtualSerialDevice:
+    """Perangkat serial virtual berbasis PTY dengan latency, jitter dan fault injection"""
+
+    def __init__(self, name: str, latency: float = 0.0, jitter: float = 0.0,
+                 fault_rate: float = 0.0, fault_mode: str = FAULT_DROP,
+                 fault_delay: float = 5.0, seed: Optional[int] = None):
+        self.logger = logging.getLogger(f"{__name__}.{name}")
+        self.name = name
+        self.latency = latency
+        self.jitter = jitter
+        self.fault_rate = fault_rate
+        self.fault_mode = fault_mode
+        self.fault_delay = fault_delay
+        self.port: Optional[str] = None
+
+        self._random = random.Random(seed)
+        self._master_fd: Optional[int] = None
+        self._slave_fd: Optional[int] = None
+        self._thread: Optional[threading.Thread] = None
+        self._stop_event = threading.Event()
+        self._write_lock = threading.Lock()
+
+        self.stats = {"commands": 0, "responses": 0, "faults": 0, "unsolicited": 0}
+
+    def start(self) -> str:
+        """Buat PTY dan mulai thread yang melayani perintah. Mengembalikan path port."""
+        self._master_fd, self._slave_fd = pty.openpty()
+        tty.setraw(self._master_fd)
+        tty.setraw(self._slave_fd)
+        self.port = os.ttyname(self._slave_fd)
+
+        self._stop_event.clear()
+        self._thread = threading.Thread(target=self._serve, name=f"virtual-{self.name}", daemon=True)
+        self._thread.start()
+        self.logger.info(f"Virtual {self.name} listening on {self.port}")
+        return self.port
+
+    def stop(self):
+        """Hentikan thread dan tutup PTY"""
+        self._stop_event.set()
+        if self._thread:
+            self._thread.join(timeout=2.0)
+        for fd in (self._master_fd, self._slave_fd):
+            if fd is not None:
+                try:
+                    os.close(fd)
+                except OSError:
+                    pass
+        self._master_fd = self._slave_fd = None
+        self.logger.info(f"Virtual {self.name} stopped")
+
+    def set_faults(self, rate: float, mode: str = FAULT_DROP):
+        """Ubah fault injection saat runtime"""
+        if mode not in FAULT_MODES:
+            raise ValueError(f"Unknown fault mode: {mode}")
+        self.fault_rate = rate
+        self.fault_mode = mode
+
+    def handle_command(self, command: str) -> List[str]:
+        """Override: kembalikan baris balasan untuk satu perintah"""
+        return []
+
+    def write_line(self, line: str, unsolicited: bool = False):
+        """Tulis satu baris ke sisi driver (thread-safe)"""
+        if self._master_fd is None:
+            return
+        with self._write_lock:
+            os.write(self._master_fd, f"{line}\r\n".encode("utf-8"))
+        if unsolicited:
+            self.stats["unsolicited"] += 1
+
+    def _response_delay(self) -> float:
+        """Latency + jitter acak untuk satu balasan"""
+        delay = self.latency
+        if self.jitter:
+            delay += self._random.uniform(-self.jitter, self.jitter)
+        return max(0.0, delay)
+
+    def _serve(self):
+        """Loop utama thread: baca perintah per baris dan kirim balasan"""
+        buffer = b""
+        while not self._stop_event.is_set():
+            try:
+                readable, _, _ = select.select([self._master_fd], [], [], 0.1)
+                if not readable:
+                    continue
+                data = os.read(self._master_fd, 1024)
+            except OSError:
+                break
+            if not data:
+                continue
+
+            buffer += data
+            while b"\n" in buffer:
+                raw, buffer = buffer.split(b"\n", 1)
+                command = raw.decode("utf-8", errors="ignore").strip()
+                if not command:
+                    continue
+                self.stats["commands"] += 1
+                self._reply(command)
+
+    def _reply(self, command: str):
+        """Kirim balasan untuk satu perintah dengan latency dan fault injection"""
+        responses = self.handle_command(command)
+        if not responses:
+            return
+
+        delay = self._response_delay()
+        if self.fault_rate and self._random.random() < self.fault_rate:
+            self.stats["faults"] += 1
+            self.logger.debug(f"Injecting '{self.fault_mode}' fault for '{command}'")
+            if self.fault_mode == FAULT_DROP:
+                return
+            if self.fault_mode == FAULT_GARBLE:
+                responses = ["".join(self._random.choice("#?!~%") for _ in range(8))]
+            elif self.fault_mode == FAULT_DELAY:
+                delay += self.fault_delay
+
+        if delay:
+            time.sleep(delay)
+        for response in responses:
+            self.write_line(response)
+            self.stats["responses"] += 1
+
+class VirtualArduino(VirtualSerialDevice):
+    """Arduino gate controller virtual sesuai arduino_gate_controller.ino"""
+
+    def __init__(self, operation_time: float = 0.0, **kwargs):
+        super().__init__("arduino", **kwargs)
+        self.operation_time = operation_time  # Waktu gerak palang sebelum GATE_OPENED/GATE_CLOSED
+        self.gate_state = "CLOSED"
+        self.vehicle_present = False
+
+    def handle_command(self, command: str) -> List[str]:
+        if command == "PING":
+            return ["PONG"]
+        if command == PING_TOKEN:
+            return [PING_TOKEN]
+        if command == "STATUS":
+            return [f"GATE:{self.gate_state},VEHICLE:{int(self.vehicle_present)},POSITION:0,SENSORS:OK"]
+        if command == "GATE_OPEN":
+            return self._move_gate("OPENING", "OPEN", "GATE_OPENED")
+        if command == "GATE_CLOSE":
+            return self._move_gate("CLOSING", "CLOSED", "GATE_CLOSED")
+        if command.startswith("LED_"):
+            return ["LED_OK"]
+        if command.startswith("BUZZER_"):
+            return ["BUZZER_OK"]
+        if command == "RESET":
+            self.gate_state = "CLOSED"
+            return ["SYSTEM_RESET"]
+        if command == "EMERGENCY_STOP":
+            self.gate_state = "ERROR"
+            return ["EMERGENCY_STOP_ACTIVATED"]
+        if command == "SENSORS":
+            return [f"TEMP:{round(self._random.uniform(20, 35), 1)},HUMIDITY:{round(self._random.uniform(40, 80), 1)},MOTION:{int(self.vehicle_present)}"]
+        if command == "INFO":
+            return ["VERSION:1.0-virtual,MODEL:VIRTUAL,ID:VIRT001"]
+        return ["UNKNOWN_COMMAND"]
+
+    def _move_gate(self, moving_state: str, final_state: str, ack: str) -> List[str]:
+        """Simulasikan gerakan palang seperti state machine di firmware"""
+        self.gate_state = moving_state
+        if self.operation_time:
+            time.sleep(self.operation_time)
+        self.gate_state = final_state
+        return [ack]
+
+class VirtualCardReader(VirtualSerialDevice):
+    """Card reader virtual yang mengirim baris CARD:ID:TYPE saat kartu di-tap"""
+
+    def __init__(self, **kwargs):
+        super().__init__("card_reader", **kwargs)
+
+    def handle_command(self, command: str) -> List[str]:
+        if command == "TEST":
+            return ["READER_OK"]
+        # BEEP dan LED:... tidak dibalas oleh reader
+        return []
+
+    def tap(self, card_id: str, card_type: str = "visitor"):
+        """Simulasikan kartu yang di-tap (dengan latency dan jitter yang sama)"""
+        delay = self._response_delay()
+        if delay:
+            time.sleep(delay)
+        self.write_line(f"CARD:{card_id}:{card_type.upper()}", unsolicited=True)
+
+def _percentiles(samples: List[float]) -> Dict:
+    """Ringkasan latency dalam milidetik"""
+    if not samples:
+        return {"count": 0}
+    ordered = sorted(samples)
+    return {
+        "count": len(ordered),
+        "p50_ms": round(statistics.median(ordered) * 1000, 2),
+        "p95_ms": round(ordered[min(len(ordered) - 1, int(len(ordered) * 0.95))] * 1000, 2),
+        "max_ms": round(ordered[-1] * 1000, 2),
+    }
+
+async def run_benchmark(arduino_port: str, card_reader: VirtualCardReader, iterations: int) -> Dict:
+    """Benchmark end-to-end lane memakai driver asli terhadap perangkat virtual"""
+    from hardware.arduino import ArduinoController
+    from hardware.card_reader import CardReaderController
+
+    arduino = ArduinoController(arduino_port)
+    reader = CardReaderController(card_reader.port)
+    await arduino.initialize()
+    await reader.initialize()
+
+    gate_samples, card_samples = [], []
+    failures = 0
+    try:
+        for i in range(iterations):
+            threading.Timer(0.05, card_reader.tap, args=(f"BENCH{i:04d}",)).start()
+            start = time.perf_counter()
+            card = await reader.read_card(timeout=5)
+            if card:
+                card_samples.append(time.perf_counter() - start - 0.05)
+
+            start = time.perf_counter()
+            result = await arduino.open_gate(duration=60)
+            if result["status"] == "success":
+                gate_samples.append(time.perf_counter() - start)
+            else:
+                failures += 1
+            await arduino.close_gate()
+    finally:
+        await reader.cleanup()
+        await arduino.cleanup()
+
+    return {
+        "iterations": iterations,
+        "gate_open": _percentiles(gate_samples),
+        "card_read": _percentiles(card_samples),
+        "gate_failures": failures,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Virtual Arduino dan Card Reader berbasis PTY")
+    parser.add_argument("--latency", type=float, default=0.0, help="Latency balasan (detik)")
+    parser.add_argument("--jitter", type=float, default=0.0, help="Jitter +/- (detik)")
+    parser.add_argument("--fault-rate", type=float, default=0.0, help="Probabilitas fault per perintah (0-1)")
+    parser.add_argument("--fault-mode", choices=FAULT_MODES, default=FAULT_DROP)
+    parser.add_argument("--operation-time", type=float, default=0.0, help="Waktu gerak palang (detik)")
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--bench", type=int, default=0, help="Jalankan N iterasi benchmark lalu keluar")
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+    logger = logging.getLogger(__name__)
+
+    device_options = {
+        "latency": args.latency,
+        "jitter": args.jitter,
+        "fault_rate": args.fault_rate,
+        "fault_mode": args.fault_mode,
+        "seed": args.seed,
+    }
+    arduino = VirtualArduino(operation_time=args.operation_time, **device_options)
+    card_reader = VirtualCardReader(**device_options)
+    arduino_port = arduino.start()
+    card_reader_port = card_reader.start()
+
+    try:
+        if args.bench:
+            result = asyncio.run(run_benchmark(arduino_port, card_reader, args.bench))
+            logger.info(f"Benchmark result: {result}")
+            logger.info(f"Arduino stats: {arduino.stats} | Card reader stats: {card_reader.stats}")
+            return
+
+        logger.info(f"Arduino port     : {arduino_port}")
+        logger.info(f"Card reader port : {card_reader_port}")
+        logger.info(f"Set SKY_PARKING_VIRTUAL_PORTS={arduino_port} agar HardwareDetector ikut memindai port ini")
+        logger.info("Ketik ID kartu lalu Enter untuk mensimulasikan tap (Ctrl+C untuk keluar)")
+        while True:
+            card_id = input().strip()
+            if card_id:
+                card_reader.tap(card_id)
+    except (KeyboardInterrupt, EOFError):
+        logger.info("Shutdown requested.")
+    finally:
+        arduino.stop()
+        card_reader.stop()
+
+if __name__ == '__main__':
+    main()
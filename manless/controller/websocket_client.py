@@ -1,65 +1,106 @@
 """
 WebSocket Client untuk Controller
 Mengirim data hardware ke backend WebSocket server
+
+Pesan keluar lewat Outbox (outbox.py): setiap pesan membawa seq link, pesan control disimpan
+di journal sampai backend mengirim ack {"type": "ack", "payload": {"seq": N}}, status hanya
+yang terbaru. Saat tersambung backend mengirim posisi terakhirnya ({"type": "resume"}); outbox
+mengirim ulang yang terlewat atau melakukan resync, lalu isi outbox dikirim per batch
+{"type": "batch", "payload": {"messages": [...]}}.
 """
 
 import asyncio
 import json
 import logging
+import os
 import websockets
 from datetime import datetime
 from typing import Optional, Dict, Any
 
+from outbox import Outbox
+
 # Setup logging
 logger = logging.getLogger(__name__)
 
 class WebSocketClient:
     """WebSocket client untuk controller"""
     
-    def __init__(self, gate_id: str, backend_host: str = "localhost", backend_port: int = 8000):
+    def __init__(self, gate_id: str, backend_host: str = "localhost", backend_port: int = 8000,
+                 outbox_dir: str = None, batch_size: int = 50):
         self.gate_id = gate_id
         self.backend_url = f"ws://{backend_host}:{backend_port}/ws/controller/{gate_id}"
         self.websocket: Optional[websockets.WebSocketServerProtocol] = None
         self.connected = False
         self.should_reconnect = True
         self.reconnect_delay = 5
-        self.max_reconnect_attempts = 10
+        self.max_reconnect_delay = 60
+        self.max_reconnect_attempts = 0  # 0 = terus mencoba; outbox menyimpan pesan selama putus
         self.reconnect_attempts = 0
+        self.batch_size = batch_size
+        self.resume_timeout = 5
         
-        # Message queue untuk pesan yang akan dikirim
-        self.message_queue = asyncio.Queue()
+        # Outbox terbatas untuk pesan yang akan dikirim (control tahan restart)
+        outbox_dir = outbox_dir or os.getenv("CONTROLLER_OUTBOX_DIR", "data/outbox")
+        self.outbox = Outbox(os.path.join(outbox_dir, f"{gate_id}.log"),
+                             max_messages=int(os.getenv("CONTROLLER_OUTBOX_SIZE", "1000")))
         
         # Callback untuk menerima pesan dari backend
         self.message_callback = None
         
     async def connect(self):
-        """Koneksi ke backend WebSocket server"""
-        while self.should_reconnect and self.reconnect_attempts < self.max_reconnect_attempts:
+        """Koneksi ke backend WebSocket server (reconnect dengan backoff selama should_reconnect)"""
+        await self.outbox.open()
+        while self.should_reconnect:
             try:
                 logger.info(f"Connecting to backend WebSocket: {self.backend_url}")
                 self.websocket = await websockets.connect(self.backend_url)
                 self.connected = True
                 self.reconnect_attempts = 0
                 logger.info(f"✅ Controller {self.gate_id} connected to backend")
+                await self.resume_session()
                 
-                # Start message sender dan receiver tasks
-                await asyncio.gather(
-                    self.message_sender(),
-                    self.message_receiver(),
-                    return_exceptions=True
-                )
+                # Sender dan receiver berhenti bersama saat salah satunya selesai
+                tasks = [asyncio.create_task(self.message_sender()), asyncio.create_task(self.message_receiver())]
+                try:
+                    await asyncio.wait(tasks, return_when=asyncio.FIRST_COMPLETED)
+                finally:
+                    for task in tasks:
+                        task.cancel()
+                    self.connected = False
                 
             except Exception as e:
                 logger.error(f"❌ Connection failed: {e}")
                 self.connected = False
-                self.reconnect_attempts += 1
-                
-                if self.should_reconnect and self.reconnect_attempts < self.max_reconnect_attempts:
-                    logger.info(f"Reconnecting in {self.reconnect_delay} seconds... (attempt {self.reconnect_attempts})")
-                    await asyncio.sleep(self.reconnect_delay)
-                else:
-                    logger.error("Max reconnection attempts reached")
-                    break
+            
+            self.reconnect_attempts += 1
+            if not self.should_reconnect:
+                break
+            if self.max_reconnect_attempts and self.reconnect_attempts >= self.max_reconnect_attempts:
+                logger.error("Max reconnection attempts reached")
+                break
+            delay = min(self.reconnect_delay * 2 ** min(self.reconnect_attempts - 1, 6), self.max_reconnect_delay)
+            logger.info(f"Reconnecting in {delay} seconds... (attempt {self.reconnect_attempts}, "
+                        f"{self.outbox.get_status()['pending_control']} messages pending)")
+            await asyncio.sleep(delay)
+    
+    async def resume_session(self):
+        """Lanjutkan dari posisi terakhir backend: replay yang terlewat atau resync snapshot"""
+        try:
+            first = json.loads(await asyncio.wait_for(self.websocket.recv(), timeout=self.resume_timeout))
+        except asyncio.TimeoutError:
+            first = None  # Backend tanpa resume: anggap tidak tahu posisi kita
+        
+        if first is not None and first.get("type") == "resume":
+            position = first.get("payload", {})
+            resync = await self.outbox.resume(position.get("epoch"), position.get("seq", 0))
+        else:
+            resync = await self.outbox.resume(None, 0)
+            if first is not None and self.message_callback:
+                await self.message_callback(first)
+        
+        if resync is not None:
+            resync["gate_id"] = self.gate_id
+            await self.websocket.send(json.dumps(resync, default=str))
     
     async def disconnect(self):
         """Disconnect dari backend"""
@@ -69,6 +110,7 @@ class WebSocketClient:
         if self.websocket:
             await self.websocket.close()
             self.websocket = None
+        await self.outbox.close()
             
         logger.info(f"Controller {self.gate_id} disconnected from backend")
     
@@ -81,23 +123,25 @@ class WebSocketClient:
             "timestamp": datetime.now().isoformat()
         }
         
-        await self.message_queue.put(message)
+        await self.outbox.put(message)
         logger.debug(f"Queued message: {message_type}")
     
     async def message_sender(self):
-        """Task untuk mengirim pesan dari queue"""
+        """Task untuk mengirim isi outbox per batch selama terhubung"""
         while self.connected:
             try:
-                # Ambil pesan dari queue dengan timeout
-                message = await asyncio.wait_for(self.message_queue.get(), timeout=1.0)
+                await self.outbox.ready.wait()
+                batch = await self.outbox.take(self.batch_size)
+                if not batch or not self.websocket or self.websocket.closed:
+                    continue
                 
-                if self.websocket and not self.websocket.closed:
-                    await self.websocket.send(json.dumps(message))
-                    logger.debug(f"Sent message: {message['type']}")
+                if len(batch) == 1:
+                    frame = batch[0]
+                else:
+                    frame = {"type": "batch", "gate_id": self.gate_id, "payload": {"messages": batch}}
+                await self.websocket.send(json.dumps(frame, default=str))
+                logger.debug(f"Sent {len(batch)} message(s)")
                 
-            except asyncio.TimeoutError:
-                # Timeout normal, lanjutkan loop
-                continue
             except Exception as e:
                 logger.error(f"Error sending message: {e}")
                 self.connected = False
@@ -113,9 +157,16 @@ class WebSocketClient:
                     
                     logger.debug(f"Received message: {message.get('type')}")
                     
+                    if message.get("type") == "ack":
+                        await self.outbox.ack(message.get("payload", {}).get("seq", 0))
+                        continue
+                    
                     # Panggil callback jika ada
                     if self.message_callback:
                         await self.message_callback(message)
+                else:
+                    self.connected = False
+                    break
                         
             except websockets.exceptions.ConnectionClosed:
                 logger.warning("Backend connection closed")
@@ -120,9 +120,11 @@ def create_tables():
                   `is_active` BOOLEAN NOT NULL DEFAULT TRUE,
                   `registered_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP,
                   `last_used` DATETIME NULL,
+                  `updated_at` DATETIME NOT NULL DEFAULT CURRENT_TIMESTAMP ON UPDATE CURRENT_TIMESTAMP,
                   PRIMARY KEY (`id`),
                   UNIQUE INDEX `idx_card_id` (`card_id`),
-                  INDEX `idx_is_active` (`is_active`)
+                  INDEX `idx_is_active` (`is_active`),
+                  INDEX `idx_updated_at` (`updated_at`)
                 ) ENGINE=InnoDB DEFAULT CHARSET=utf8mb4 COLLATE=utf8mb4_unicode_ci
             """)
             